@@ -0,0 +1,194 @@
+"""
+Headless runner for lots of Causal Impact analyses at once.
+
+Takes a manifest of jobs and fits them across a pool of processes, using the
+same checks and column handling as the Streamlit app. For each job it writes
+the inferences and the summary/report text to the output folder, and it writes
+a batch_results.csv with the outcome and timing of every job.
+
+The manifest can be a CSV with the columns:
+
+    name, csv, date_col, target_col, regressor_cols, intervention_date
+
+(regressor_cols separated by "|"), or a JSON list of objects with the same
+keys (regressor_cols can be a list). Relative csv paths are read relative
+to the manifest. Despite the column name, data files can be anything the app
+can upload - CSV (optionally .gz/.zst), Parquet or Feather.
+
+Example:
+
+    python batch_runner.py jobs.csv --output-dir batch_output --workers 4
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+import pandas as pd
+
+from core import ingest, validation, periods, fitting
+
+
+JOB_KEYS = ["name", "csv", "date_col", "target_col", "regressor_cols", "intervention_date"]
+
+
+def read_manifest(manifest_path: str) -> list[dict]:
+    if manifest_path.endswith(".json"):
+        with open(manifest_path) as f:
+            jobs = json.load(f)
+    else:
+        jobs = pd.read_csv(manifest_path, dtype=str).fillna("").to_dict(orient="records")
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    for index, job in enumerate(jobs):
+        missing = [k for k in JOB_KEYS if k != "name" and not job.get(k)]
+        if missing:
+            raise ValueError(f"Job {index} in {manifest_path} is missing: {', '.join(missing)}")
+
+        if isinstance(job["regressor_cols"], str):
+            job["regressor_cols"] = [c.strip() for c in job["regressor_cols"].split("|") if c.strip()]
+
+        job["csv"] = os.path.join(manifest_dir, job["csv"])
+        job["name"] = job.get("name") or f"job_{index}"
+
+    names = [job["name"] for job in jobs]
+    if len(names) != len(set(names)):
+        raise ValueError("Every job in the manifest needs a unique name")
+
+    return jobs
+
+
+def run_job(job: dict, output_dir: str, model_args: Optional[dict] = None) -> dict:
+    """
+    Runs one analysis end to end. Never raises - problems are
+    returned in the "error" field so the rest of the batch carries on.
+    """
+    start = time.perf_counter()
+    outcome = {"name": job["name"], "status": "ok", "error": "", "rows": 0}
+
+    try:
+        uploaded_data = ingest.open_upload(job["csv"])
+        validation.check_column_names(uploaded_data.columns)
+
+        outcome["rows"] = uploaded_data.num_rows
+
+        chosen_cols = [job["date_col"], job["target_col"]] + job["regressor_cols"]
+        missing_cols = [c for c in chosen_cols if c not in uploaded_data.columns]
+        if missing_cols:
+            raise ValueError(f"{job['csv']} doesn't have the column(s): {', '.join(missing_cols)}")
+
+        # Only read the columns this job uses
+        data = uploaded_data.to_frame(chosen_cols)
+
+        # Nobody to ask before reordering data that isn't in date
+        # order, so the default is to always reorder it
+        data, _ = validation.convert_and_check_data(
+            df = data,
+            date_col = job["date_col"],
+            target_col = job["target_col"],
+            regressor_cols = job["regressor_cols"]
+            )
+
+        intervention = pd.Timestamp(job["intervention_date"], tz="UTC")
+        data["test_period"] = data["time"] >= intervention
+
+        if data["test_period"].all() or not data["test_period"].any():
+            raise ValueError(f"Intervention date {job['intervention_date']} needs to have data before and after it")
+
+        data_for_ci, pre_dates, post_dates = periods.prepare_data_for_ci(
+            data,
+            regressor_col_list = job["regressor_cols"])
+
+        ci = fitting.fit_impact(
+            data_for_ci = data_for_ci,
+            pre_dates = pre_dates,
+            post_dates = post_dates,
+            model_args = model_args)
+
+        job_dir = os.path.join(output_dir, job["name"])
+        os.makedirs(job_dir, exist_ok=True)
+
+        ci.inferences.to_csv(os.path.join(job_dir, "inferences.csv"))
+        with open(os.path.join(job_dir, "summary.txt"), "w") as f:
+            f.write(ci.summary())
+            f.write("\n\n")
+            f.write(ci.summary("report"))
+
+        cumulative = ci.summary_data["cumulative"]
+        outcome.update({
+            "abs_effect_cumulative": cumulative["abs_effect"],
+            "abs_effect_cumulative_lower": cumulative["abs_effect_lower"],
+            "abs_effect_cumulative_upper": cumulative["abs_effect_upper"],
+            "rel_effect": ci.summary_data["average"]["rel_effect"],
+            "p_value": ci.p_value,
+        })
+
+    except Exception as e:
+        outcome["status"] = "error"
+        outcome["error"] = str(e).strip()
+
+    outcome["wall_time_s"] = round(time.perf_counter() - start, 3)
+    return outcome
+
+
+def run_batch(
+        jobs: list[dict],
+        output_dir: str,
+        workers: Optional[int] = None,
+        model_args: Optional[dict] = None
+    ) -> pd.DataFrame:
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    outcomes = []
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, output_dir, model_args) for job in jobs]
+
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes.append(outcome)
+
+            message = f"[{len(outcomes)}/{len(jobs)}] {outcome['name']}: {outcome['status']} in {outcome['wall_time_s']:.2f}s"
+            if outcome["error"]:
+                message += f" - {outcome['error'].splitlines()[0]}"
+            print(message)
+
+    total_time = time.perf_counter() - start
+
+    results = pd.DataFrame(outcomes)
+    results = results.set_index("name").loc[[job["name"] for job in jobs]].reset_index()
+    results.to_csv(os.path.join(output_dir, "batch_results.csv"), index=False)
+
+    succeeded = (results["status"] == "ok").sum()
+    print(f"""
+Finished {len(jobs)} jobs ({succeeded} ok, {len(jobs) - succeeded} failed) in {total_time:.1f}s
+Throughput: {len(jobs) / total_time * 60:.1f} jobs/minute, {results['rows'].sum() / total_time:,.0f} rows/second
+Total job time: {results['wall_time_s'].sum():.1f}s across {workers or os.cpu_count()} workers
+Results written to {output_dir}
+""")
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="CSV or JSON manifest of jobs")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes (defaults to the number of CPUs)")
+    parser.add_argument("--model-args", default="{}", help="JSON of extra CausalImpact arguments, e.g. '{\"nseasons\": [{\"period\": 7}]}'")
+    args = parser.parse_args()
+
+    run_batch(
+        jobs = read_manifest(args.manifest),
+        output_dir = args.output_dir,
+        workers = args.workers,
+        model_args = json.loads(args.model_args))
+
+
+if __name__ == "__main__":
+    main()
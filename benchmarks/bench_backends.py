@@ -0,0 +1,129 @@
+"""
+Compares the model backends (core.backends) - fit time, memory and whether
+the lean backend gives the same numbers as the Causal Impact library.
+
+Fits the example data (or a synthetic series with more rows/regressors)
+with each backend and prints how far the lean numbers are from the
+library's, next to the library's own run-to-run simulation noise (it's
+fitted twice). The pass/fail checks live in tests/test_backends.py.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_backends
+    python -m benchmarks.bench_backends --rows 2000 --regressors 5
+"""
+import argparse
+import pickle
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core import backends, memory
+from core.result import ImpactResult
+from benchmarks.bench_incremental import example_data
+
+
+EXACT_COLUMNS = [
+    "post_cum_y", "preds", "post_preds", "post_preds_lower", "post_preds_upper",
+    "preds_lower", "preds_upper", "post_cum_pred",
+    "point_effects", "point_effects_lower", "point_effects_upper", "post_cum_effects",
+]
+SIMULATED_COLUMNS = [
+    "post_cum_pred_lower", "post_cum_pred_upper",
+    "post_cum_effects_lower", "post_cum_effects_upper",
+]
+
+
+def synthetic_data(n_rows: int, n_regressors: int):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2015-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, (n_rows, n_regressors)).cumsum(axis=0) / 10 + 500
+    y = x @ rng.uniform(0.5, 1.5, n_regressors) + rng.normal(0, 20, n_rows).cumsum() / 5
+    post_start = index[int(n_rows * 0.8)]
+    y[index >= post_start] += 50
+
+    data = pd.DataFrame(x, index=index, columns=[f"x{i}" for i in range(n_regressors)])
+    data.insert(0, "y", y)
+    return data, [index[0], index[int(n_rows * 0.8) - 1]], [post_start, index[-1]]
+
+
+def fit(backend: str, data, pre_dates, post_dates) -> dict:
+    with memory.PeakMemory() as peak:
+        start = time.perf_counter()
+        fitted = backends.fit(backend, data, pre_dates, post_dates, {})
+        seconds = time.perf_counter() - start
+
+    return {
+        "fitted": fitted,
+        "seconds": seconds,
+        "peak_bytes": peak.increase_bytes,
+        "pickled_bytes": len(pickle.dumps(fitted, protocol=pickle.HIGHEST_PROTOCOL)),
+        "cached_bytes": len(pickle.dumps(ImpactResult.from_fit(fitted, cache_key="bench"), protocol=pickle.HIGHEST_PROTOCOL)),
+    }
+
+
+def max_relative_difference(a: pd.Series, b: pd.Series) -> float:
+    a, b = a.to_numpy(dtype="float64"), b.to_numpy(dtype="float64")
+    scale = np.nanmax(np.abs(b)) or 1.0
+    return float(np.nanmax(np.abs(a - b)) / scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=0, help="Rows of synthetic data (0 for the example data)")
+    parser.add_argument("--regressors", type=int, default=1, help="Regressors in the synthetic data")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+
+    if args.rows:
+        data, pre_dates, post_dates = synthetic_data(args.rows, args.regressors)
+    else:
+        data, pre_dates, post_dates = example_data()
+    print(f"{len(data):,} rows, {data.shape[1] - 1} regressor(s)\n")
+
+    # Get the imports out of the way so they aren't counted in the first fit
+    for backend in ["causalimpact", "lean"]:
+        backends.fit(backend, data, pre_dates, post_dates, {})
+
+    # Fit the library twice to see how much its simulations vary on their own
+    runs = {
+        "causalimpact": fit("causalimpact", data, pre_dates, post_dates),
+        "causalimpact (again)": fit("causalimpact", data, pre_dates, post_dates),
+        "lean": fit("lean", data, pre_dates, post_dates),
+    }
+
+    print(f"{'backend':<22}{'fit':>9}{'peak memory':>14}{'fitted object':>16}{'cached':>10}{'p-value':>10}")
+    for name, run in runs.items():
+        print(f"{name:<22}{run['seconds']:>8.2f}s{run['peak_bytes'] / 1e6:>12.1f}MB"
+              f"{run['pickled_bytes'] / 1e6:>14.2f}MB{run['cached_bytes'] / 1e6:>8.2f}MB{run['fitted'].p_value:>10.4f}")
+
+    library = runs["causalimpact"]["fitted"]
+    library_again = runs["causalimpact (again)"]["fitted"]
+    lean = runs["lean"]["fitted"]
+
+    print(f"\nLean is {runs['causalimpact']['seconds'] / runs['lean']['seconds']:.1f}x faster\n")
+
+    print("Columns that should match exactly (max difference relative to the column's size):")
+    for col in EXACT_COLUMNS:
+        difference = max_relative_difference(lean.inferences[col], library.inferences[col])
+        print(f"    {col:<26}{difference:.2e}")
+
+    print("\nSimulated columns (lean vs library, and library vs itself):")
+    for col in SIMULATED_COLUMNS:
+        lean_difference = max_relative_difference(lean.inferences[col], library.inferences[col])
+        noise = max_relative_difference(library_again.inferences[col], library.inferences[col])
+        print(f"    {col:<26}{lean_difference:.2e}   (library run to run: {noise:.2e})")
+
+    summary_difference = max_relative_difference(
+        lean.summary_data.stack(), library.summary_data.stack())
+    summary_noise = max_relative_difference(
+        library_again.summary_data.stack(), library.summary_data.stack())
+    print(f"\nSummary table: {summary_difference:.2e} (library run to run: {summary_noise:.2e})")
+    print(f"p-value: lean {lean.p_value:.4f}, library {library.p_value:.4f} / {library_again.p_value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark for the data block checks run in check_and_convert_data.
+
+Compares the original row-by-row check (df.apply(check_for_data_blocks, axis=1))
+with the column-at-a-time check_data_blocks, and confirms both raise exactly
+the same error for a few broken versions of the data.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_check_data_blocks
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import validation
+
+
+def make_data(n_rows: int, n_regressors: int) -> pd.DataFrame:
+    """
+    Hourly data shaped like it is once it reaches the row checks
+    (parsed "time" column, target renamed to "y")
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "time": pd.date_range("2015-01-01", periods=n_rows, freq="H", tz="UTC"),
+        "y": rng.normal(1000, 50, n_rows),
+    })
+    for i in range(n_regressors):
+        df[f"regressor_{i}"] = rng.normal(500, 20, n_rows)
+    return df
+
+
+def row_wise(df, regressor_cols):
+    list_of_empty_dates: list = []
+    df.apply(lambda x: validation.check_for_data_blocks(
+        row = x,
+        target_column = "y",
+        date_column = "time",
+        list_of_empties = list_of_empty_dates,
+        regressor_column_list=regressor_cols
+        ), axis = 1)
+
+
+def column_wise(df, regressor_cols):
+    validation.check_data_blocks(
+        df = df,
+        target_column = "y",
+        date_column = "time",
+        regressor_column_list=regressor_cols
+        )
+
+
+def error_from(check, df, regressor_cols):
+    try:
+        check(df, regressor_cols)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def broken_versions(df, regressor_cols):
+    """
+    Yields (description, dataframe) pairs with different kinds of blank cells
+    """
+    middle = len(df) // 2
+
+    no_date = df.copy()
+    no_date.loc[middle, "time"] = pd.NaT
+    yield "blank date", no_date
+
+    no_regressor = df.copy()
+    no_regressor.loc[middle, regressor_cols[-1]] = np.nan
+    no_regressor.loc[middle + 5, regressor_cols[0]] = np.nan
+    yield "blank regressor", no_regressor
+
+    text_regressor = df.copy()
+    text_regressor[regressor_cols[0]] = text_regressor[regressor_cols[0]].astype(str)
+    text_regressor.loc[middle, regressor_cols[0]] = ""
+    yield "empty string regressor", text_regressor
+
+    no_target = df.copy()
+    no_target.loc[middle:, "y"] = np.nan
+    yield "blank target block", no_target
+
+    everything = df.copy()
+    everything.loc[middle, ["y", regressor_cols[0]]] = np.nan
+    everything.loc[middle, "time"] = pd.NaT
+    yield "several blanks in one row", everything
+
+
+def time_it(check, df, regressor_cols, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        check(df, regressor_cols)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--regressors", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_data(args.rows, args.regressors)
+    regressor_cols = [c for c in df.columns if c.startswith("regressor")]
+
+    # Both versions need to agree on every error before timings mean anything
+    for description, broken in broken_versions(df, regressor_cols):
+        expected = error_from(row_wise, broken, regressor_cols)
+        actual = error_from(column_wise, broken, regressor_cols)
+        if expected != actual:
+            raise AssertionError(f"Different error for {description}:\n{expected!r}\n!=\n{actual!r}")
+        print(f"Same error for {description}")
+
+    row_time = time_it(row_wise, df, regressor_cols, args.repeats)
+    column_time = time_it(column_wise, df, regressor_cols, args.repeats)
+
+    print(f"""
+{args.rows:,} rows, {args.regressors} regressors (best of {args.repeats})
+Row-by-row (df.apply):  {row_time:.3f}s
+Column-at-a-time:       {column_time:.4f}s
+Speedup:                {row_time / column_time:,.0f}x
+""")
+
+
+if __name__ == "__main__":
+    main()
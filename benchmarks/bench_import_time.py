@@ -0,0 +1,57 @@
+"""
+Measures how long it takes a fresh Python process to import the analysis code.
+
+Compares the Streamlit helpers (which pull in Streamlit, matplotlib, plotly and
+ga4py) with the core package that workers and scripts can use on their own.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_import_time
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+
+MODULE_SETS = {
+    "helpers (Streamlit app)": ["helpers.pandas_helpers", "helpers.ci_helpers"],
+    "core": ["core.validation", "core.periods", "core.fitting", "core.impact_math"],
+}
+
+
+def time_import(modules: list[str]) -> float:
+    """
+    Wall time for a new interpreter to import the modules (minus the
+    time it takes to start an interpreter that imports nothing)
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+    with_imports = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True, capture_output=True)
+    baseline = time.perf_counter() - start
+
+    return max(with_imports - baseline, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    for label, modules in MODULE_SETS.items():
+        results[label] = min(time_import(modules) for _ in range(args.repeats))
+        print(f"{label:<25} {results[label]:.3f}s (best of {args.repeats})")
+
+    helpers_time = results["helpers (Streamlit app)"]
+    core_time = results["core"]
+    print(f"\ncore imports {helpers_time / max(core_time, 1e-9):.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
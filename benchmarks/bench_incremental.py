@@ -0,0 +1,79 @@
+"""
+Benchmark for carrying a fit forward when rows are added to the end of the
+post period (core.incremental) against refitting from scratch.
+
+Fits the example data with the last rows held back, then adds them back a
+few at a time like a daily re-upload would, and checks the deterministic
+columns match a full refit.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_incremental --held-back 60
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from core import cache, fitting, ingest, periods, validation
+
+
+DETERMINISTIC_COLUMNS = ["preds", "post_preds_lower", "post_preds_upper", "post_cum_pred", "post_cum_effects"]
+
+
+def example_data():
+    df, _ = ingest.read_csv("tests/test_files/example_data_for_users.csv")
+    data, _ = validation.convert_and_check_data(df, "Date", "Y", ["X"])
+    data["test_period"] = data["time"] >= pd.Timestamp("2023-06-01", tz="UTC")
+    return periods.prepare_data_for_ci(data, ["X"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--held-back", type=int, default=60, help="Rows held back from the first fit")
+    parser.add_argument("--step", type=int, default=1, help="Rows added per update")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+
+    data_for_ci, pre_dates, post_dates = example_data()
+    impact_cache = cache.ImpactCache(cache_dir=None)
+
+    def fit(rows: int, use_cache: cache.ImpactCache):
+        data = data_for_ci.iloc[:rows]
+        return fitting.fit_impact(data, pre_dates, [post_dates[0], data.index[-1]], impact_cache=use_cache)
+
+    first_rows = len(data_for_ci) - args.held_back
+
+    start = time.perf_counter()
+    fit(first_rows, impact_cache)
+    fit_time = time.perf_counter() - start
+    print(f"First fit ({first_rows:,} rows): {fit_time:.2f}s")
+
+    update_times = []
+    for rows in range(first_rows + args.step, len(data_for_ci) + 1, args.step):
+        start = time.perf_counter()
+        extended = fit(rows, impact_cache)
+        update_times.append(time.perf_counter() - start)
+
+    print(f"{len(update_times)} updates of {args.step} row(s): {np.mean(update_times) * 1000:.1f}ms each on average "
+          f"({fit_time / np.mean(update_times):,.0f}x faster than refitting)")
+
+    start = time.perf_counter()
+    refit = fit(len(data_for_ci), cache.ImpactCache(cache_dir=None))
+    print(f"Full refit for comparison: {time.perf_counter() - start:.2f}s")
+
+    for col in DETERMINISTIC_COLUMNS:
+        difference = np.nanmax(np.abs(extended.inferences[col] - refit.inferences[col]))
+        print(f"    {col:<20} max difference from refit: {difference:.3g}")
+
+    for label, result in [("extended", extended), ("refit", refit)]:
+        cumulative = result.summary_data["cumulative"]
+        print(f"    {label:<9} cumulative effect {cumulative['abs_effect']:,.0f} "
+              f"[{cumulative['abs_effect_lower']:,.0f}, {cumulative['abs_effect_upper']:,.0f}], p = {result.p_value:.3f}")
+
+
+if __name__ == "__main__":
+    main()
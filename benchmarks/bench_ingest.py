@@ -0,0 +1,117 @@
+"""
+Benchmark for reading uploads - plain pd.read_csv followed by the app's
+conversions, against core.ingest.read_csv.
+
+Writes a synthetic daily CSV (with some numbers using thousands separators),
+reads it both ways and runs the usual date/number conversions on the result.
+Then saves the same data as gzip/zstd CSV, Parquet and Feather and times
+opening each one and reading just the columns an analysis needs.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_ingest --rows 500000 --regressors 20
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from core import ingest, validation
+
+
+def write_csv(path: str, n_rows: int, n_regressors: int) -> list[str]:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        # Dates repeat for very long files - we're only timing the reading here
+        "Date": np.resize(pd.date_range("1700-01-01", "2200-01-01", freq="D").strftime("%Y-%m-%d"), n_rows),
+        # Big numbers exported with thousands separators
+        "Y": [f"{v:,.0f}" for v in rng.normal(100_000, 5_000, n_rows)],
+    })
+    regressor_cols = []
+    for i in range(n_regressors):
+        df[f"regressor_{i}"] = rng.normal(500, 20, n_rows).round(2)
+        regressor_cols.append(f"regressor_{i}")
+    df["channel"] = rng.choice(["organic", "paid", "email"], n_rows)
+    df.to_csv(path, index=False)
+    return regressor_cols
+
+
+def convert(df: pd.DataFrame, regressor_cols: list[str]) -> pd.DataFrame:
+    df = validation.date_col_conversion(df, "Date")
+    validation.columns_to_numbers(df, "Y", "Y")
+    for col in regressor_cols:
+        validation.columns_to_numbers(df, col, col)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--regressors", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload.csv")
+        regressor_cols = write_csv(path, args.rows, args.regressors)
+        print(f"{args.rows:,} rows, {args.regressors} regressors, {os.path.getsize(path) / 1024**2:,.0f} MB CSV\n")
+
+        start = time.perf_counter()
+        df = pd.read_csv(path)
+        df = convert(df, regressor_cols)
+        pandas_time = time.perf_counter() - start
+        pandas_bytes = df.memory_usage(deep=True).sum()
+        print(f"pd.read_csv + conversions:   {pandas_time:.2f}s, {pandas_bytes / 1024**2:,.1f} MB in memory")
+
+        for float32 in [False, True]:
+            start = time.perf_counter()
+            df, report = ingest.read_csv(path, float32=float32)
+            df = convert(df, regressor_cols)
+            ingest_time = time.perf_counter() - start
+            print(f"ingest.read_csv{' (float32)' if float32 else '':<11} + conversions: "
+                  f"{ingest_time:.2f}s, {df.memory_usage(deep=True).sum() / 1024**2:,.1f} MB in memory "
+                  f"({pandas_time / ingest_time:.1f}x faster)")
+            print(f"    {report.describe()}")
+
+        # Same data in the other formats
+        table = pa_csv.read_csv(path)
+        paths = {
+            "csv.gz": os.path.join(tmp, "upload.csv.gz"),
+            "csv.zst": os.path.join(tmp, "upload.csv.zst"),
+            "parquet": os.path.join(tmp, "upload.parquet"),
+            "feather": os.path.join(tmp, "upload.feather"),
+        }
+        for compression in ["gzip", "zstd"]:
+            with pa.CompressedOutputStream(paths["csv.gz" if compression == "gzip" else "csv.zst"], compression) as out:
+                pa_csv.write_csv(table, out)
+        pq.write_table(table, paths["parquet"])
+        feather.write_feather(table, paths["feather"], compression="uncompressed")
+        del table
+        gc.collect()
+
+        # An analysis only needs the date, target and a couple of regressors
+        chosen_cols = ["Date", "Y"] + regressor_cols[:2]
+        print(f"\nOpening each format and reading {len(chosen_cols)} of {args.regressors + 3} columns:")
+
+        for label, format_path in [("csv", path)] + list(paths.items()):
+            start = time.perf_counter()
+            uploaded = ingest.open_upload(format_path)
+            open_time = time.perf_counter() - start
+            df = convert(uploaded.to_frame(chosen_cols), chosen_cols[2:])
+            total_time = time.perf_counter() - start
+            print(f"{label:<8} {os.path.getsize(format_path) / 1024**2:>7,.1f} MB on disk: opened in {open_time:.3f}s, "
+                  f"chosen columns ready in {total_time:.3f}s, {df.memory_usage(deep=True).sum() / 1024**2:,.1f} MB in memory")
+            print(f"    {uploaded.report.describe()}")
+            del uploaded, df
+            gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Benchmark for every stage between an upload and the impact charts.
+
+Synthesises uploads of increasing size (a year of daily data up to three
+years of hourly data, with 1 to 200 regressors), writes each one as a CSV
+(with the target exported with thousands separators, like most analytics
+tools do) and times each stage the app runs on it separately:
+
+    read_csv             pd.read_csv of the uploaded bytes
+    date_col_conversion  validation.date_col_conversion
+    check_ordering       validation.check_ordering
+    row_checks           validation.check_data_blocks
+    columns_to_numbers   validation.columns_to_numbers for the target and regressors
+    clean_columns        periods.clean_columns
+    fit                  the CausalImpact fit (no caches)
+    charts               building both Plotly charts from the fitted result
+
+Each stage's time is the best of --repeats runs (the fit is only run once
+per scenario). Results are written as JSON along with the library versions
+and the regression thresholds, so a later run can be compared against them:
+
+    python -m benchmarks.bench_pipeline                      # quick suite
+    python -m benchmarks.bench_pipeline --suite full         # every size (slow - big fits)
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/pipeline-abc1234.json
+
+A stage counts as a regression when it's more than its threshold times
+slower than the baseline (stages faster than the noise floor both times are
+ignored). --compare exits with 1 if anything regressed. Only compare runs
+from the same machine.
+
+Run from the repo root.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime, timezone
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+
+from core import backends, periods, validation
+from core.result import ImpactResult
+from helpers import charting_helpers as ch
+
+
+# Bump if the layout of the results file changes
+RESULTS_FORMAT = 1
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+STAGES = [
+    "read_csv",
+    "date_col_conversion",
+    "check_ordering",
+    "row_checks",
+    "columns_to_numbers",
+    "clean_columns",
+    "fit",
+    "charts",
+]
+
+# Name: (frequency, rows, regressors)
+SCENARIOS = {
+    "daily-1y-1": ("D", 365, 1),
+    "daily-3y-10": ("D", 3 * 365, 10),
+    "hourly-1y-10": ("H", 365 * 24, 10),
+    "hourly-3y-50": ("H", 3 * 365 * 24, 50),
+    "hourly-3y-200": ("H", 3 * 365 * 24, 200),
+}
+
+SUITES = {
+    "quick": ["daily-1y-1", "daily-3y-10", "hourly-1y-10"],
+    "full": list(SCENARIOS),
+}
+
+# How many times slower than the baseline a stage can get before it counts
+# as a regression. Fits and charts vary more from run to run
+THRESHOLDS = {
+    "default_slowdown": 1.25,
+    "stage_slowdown": {"fit": 1.5, "charts": 1.5},
+    "noise_floor_seconds": 0.005,
+}
+
+
+def synthetic_csv(freq: str, n_rows: int, n_regressors: int) -> bytes:
+    """
+    An upload as users send them - dates as text, the target with
+    thousands separators and plain numbers for the regressors
+    """
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2015-01-01", periods=n_rows, freq=freq)
+
+    x = rng.normal(100, 10, (n_rows, n_regressors)).cumsum(axis=0) / 10 + 500
+    y = x @ rng.uniform(0.5, 1.5, n_regressors) * 100 + rng.normal(0, 2000, n_rows).cumsum() / 5
+    y[int(n_rows * 0.8):] *= 1.05
+
+    df = pd.DataFrame(x.round(2), columns=[f"regressor_{i}" for i in range(n_regressors)])
+    df.insert(0, "Date", dates.strftime("%Y-%m-%d" if freq == "D" else "%Y-%m-%d %H:%M:%S"))
+    df.insert(1, "Sessions", [f"{v:,.0f}" for v in y])
+
+    return df.to_csv(index=False).encode()
+
+
+class StageTimer:
+    """
+    Keeps the best time seen for each stage
+    """
+    def __init__(self):
+        self.seconds: dict = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.seconds[name] = min(seconds, self.seconds.get(name, seconds))
+
+
+def run_checks(timer: StageTimer, csv_bytes: bytes, regressor_cols: list):
+    """
+    Upload to data ready for CausalImpact, the way the app does it
+    """
+    with timer.stage("read_csv"):
+        df = pd.read_csv(io.BytesIO(csv_bytes))
+
+    with timer.stage("date_col_conversion"):
+        df = validation.date_col_conversion(df, "Date")
+
+    with timer.stage("check_ordering"):
+        df, _ = validation.check_ordering(df)
+
+    df = df.rename(columns={"Sessions": "y"})
+
+    with timer.stage("row_checks"):
+        validation.check_data_blocks(
+            df = df,
+            target_column = "y",
+            date_column = "time",
+            regressor_column_list = regressor_cols)
+
+    with timer.stage("columns_to_numbers"):
+        validation.columns_to_numbers(df, "y", "Sessions")
+        for col in regressor_cols:
+            validation.columns_to_numbers(df, col, col)
+
+    # Not timed - cheap shaping the app does between the checks and the fit
+    data = periods.split_test_period(df, df["time"].iloc[int(len(df) * 0.8)])
+    data_for_ci = data.copy(deep = True)
+    data_for_ci.set_index("time", inplace=True)
+    data_for_ci.sort_index(inplace=True)
+    pre_dates, post_dates = periods.extract_start_and_end(data_for_ci)
+
+    with timer.stage("clean_columns"):
+        data_for_ci = periods.clean_columns(data_for_ci, regressor_col_list = regressor_cols)
+
+    return data_for_ci, pre_dates, post_dates
+
+
+def build_charts(result: ImpactResult):
+    width, method, webgl = ch.DEFAULT_CHART_WIDTH, list(ch.DOWNSAMPLING_OPTIONS.values())[0], False
+
+    # Time building them, not reading them back from the memo
+    ch.impact_comparison_chart.clear()
+    ch.cumulative_difference_chart.clear()
+
+    ch.impact_comparison_chart(result.cache_key, width, method, webgl, _ci = result)
+    ch.cumulative_difference_chart(result.cache_key, width, method, webgl, _ci = result)
+
+
+def run_scenario(name: str, repeats: int, backend: str, skip_fit: bool) -> dict:
+    freq, n_rows, n_regressors = SCENARIOS[name]
+    csv_bytes = synthetic_csv(freq, n_rows, n_regressors)
+    regressor_cols = [f"regressor_{i}" for i in range(n_regressors)]
+
+    timer = StageTimer()
+    for _ in range(repeats):
+        data_for_ci, pre_dates, post_dates = run_checks(timer, csv_bytes, regressor_cols)
+
+    if not skip_fit:
+        with timer.stage("fit"):
+            fitted = backends.fit(backend, data_for_ci, pre_dates, post_dates, {})
+
+        result = ImpactResult.from_fit(fitted, cache_key=f"bench-{name}", backend=backend)
+        for _ in range(repeats):
+            with timer.stage("charts"):
+                build_charts(result)
+
+    return {
+        "freq": freq,
+        "rows": n_rows,
+        "regressors": n_regressors,
+        "csv_bytes": len(csv_bytes),
+        "stages": {stage: round(timer.seconds[stage], 6) for stage in STAGES if stage in timer.seconds},
+    }
+
+
+def _version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "not installed"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> dict:
+    return {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "packages": {package: _version(package) for package in ["pandas", "numpy", "pycausalimpact", "statsmodels", "plotly", "streamlit"]},
+    }
+
+
+def compare(results: dict, baseline: dict, thresholds: dict) -> list:
+    """
+    Rows of (scenario, stage, baseline seconds, seconds, slowdown, limit, regressed)
+    for every stage both runs timed
+    """
+    rows = []
+    for name, scenario in results["scenarios"].items():
+        baseline_stages = baseline["scenarios"].get(name, {}).get("stages", {})
+        for stage, seconds in scenario["stages"].items():
+            if stage not in baseline_stages:
+                continue
+            before = baseline_stages[stage]
+            limit = thresholds["stage_slowdown"].get(stage, thresholds["default_slowdown"])
+            slowdown = seconds / before if before > 0 else float("inf")
+            regressed = slowdown > limit and max(seconds, before) >= thresholds["noise_floor_seconds"]
+            rows.append((name, stage, before, seconds, slowdown, limit, regressed))
+    return rows
+
+
+def print_results(results: dict) -> None:
+    print(f"\n{'scenario':<16}{'rows':>8}{'regs':>6}" + "".join(f"{stage[:12]:>14}" for stage in STAGES))
+    for name, scenario in results["scenarios"].items():
+        timings = "".join(
+            f"{scenario['stages'][stage]:>13.4f}s" if stage in scenario["stages"] else f"{'-':>14}"
+            for stage in STAGES)
+        print(f"{name:<16}{scenario['rows']:>8,}{scenario['regressors']:>6}{timings}")
+
+
+def print_comparison(rows: list) -> None:
+    print(f"\n{'scenario':<16}{'stage':<22}{'baseline':>10}{'now':>10}{'slowdown':>10}{'limit':>8}")
+    for name, stage, before, seconds, slowdown, limit, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{name:<16}{stage:<22}{before:>9.4f}s{seconds:>9.4f}s{slowdown:>9.2f}x{limit:>7.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", default="quick", choices=list(SUITES))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), help="Run these instead of a suite")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs of each stage to take the best of (the fit runs once)")
+    parser.add_argument("--backend", default="causalimpact", choices=list(backends.BACKENDS))
+    parser.add_argument("--skip-fit", action="store_true", help="Only time the stages before the fit")
+    parser.add_argument("--label", help="Name for this run (defaults to the git commit)")
+    parser.add_argument("--output", help="Where to write the JSON (defaults to benchmarks/results/pipeline-<label>.json)")
+    parser.add_argument("--compare", help="Results JSON from an earlier run to check for regressions against")
+    parser.add_argument("--slowdown", type=float, help="Override every stage's regression threshold")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+
+    env = environment()
+    label = args.label or env["git_commit"]
+    names = args.scenarios or SUITES[args.suite]
+
+    scenarios = {}
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        # The checks print as they go - keep the output to the timings
+        with contextlib.redirect_stdout(io.StringIO()):
+            scenarios[name] = run_scenario(name, args.repeats, args.backend, args.skip_fit)
+
+    results = {
+        "format": RESULTS_FORMAT,
+        "label": label,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": env,
+        "settings": {"repeats": args.repeats, "backend": args.backend, "skip_fit": args.skip_fit},
+        "thresholds": THRESHOLDS,
+        "scenarios": scenarios,
+    }
+
+    print_results(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{label}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if not args.compare:
+        return
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline.get("format") != RESULTS_FORMAT:
+        print(f"{args.compare} is from a different version of this benchmark - can't compare")
+        sys.exit(1)
+
+    # The baseline's thresholds are what it was agreed against
+    thresholds = baseline.get("thresholds", THRESHOLDS)
+    if args.slowdown:
+        thresholds = {**thresholds, "default_slowdown": args.slowdown, "stage_slowdown": {}}
+
+    if baseline["environment"].get("machine") != env["machine"] or baseline["environment"].get("cpus") != env["cpus"]:
+        print("\nThe baseline was run on a different machine - timings may not be comparable")
+
+    rows = compare(results, baseline, thresholds)
+    print_comparison(rows)
+
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) slower than {baseline.get('label', args.compare)} by more than their threshold")
+        sys.exit(1)
+
+    print(f"\nNo regressions against {baseline.get('label', args.compare)}")
+
+
+if __name__ == "__main__":
+    main()
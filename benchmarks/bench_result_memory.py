@@ -0,0 +1,106 @@
+"""
+How much memory a session holds on to for one fit, and how quickly results
+can be written and read back.
+
+Compares, for the same fit:
+
+- the fitted CausalImpact object (what the app used to keep)
+- the separate DataFrames a result used to hold (data, pre_data, post_data,
+    inferences), before ImpactResult
+- ImpactResult - two float arrays sharing one index
+
+and times pickle, Arrow and NPZ serialisation of an ImpactResult (checking
+each reads back to the same numbers).
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_result_memory
+    python -m benchmarks.bench_result_memory --rows 20000 --regressors 10
+"""
+import argparse
+import pickle
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from core import backends, memory
+from core.result import ImpactResult
+from benchmarks.bench_backends import synthetic_data
+from benchmarks.bench_incremental import example_data
+
+
+def frames_bytes(ci) -> int:
+    # Every frame counted separately, the way the old result held them
+    return sum(memory.object_bytes(frame) for frame in [ci.data, ci.pre_data, ci.post_data, ci.inferences, ci.summary_data])
+
+
+def timed(function, repeats: int = 5):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        value = function()
+    return value, (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=0, help="Rows of synthetic data (0 for the example data)")
+    parser.add_argument("--regressors", type=int, default=1, help="Regressors in the synthetic data")
+    parser.add_argument("--backend", default="causalimpact", choices=list(backends.BACKENDS))
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+
+    if args.rows:
+        data, pre_dates, post_dates = synthetic_data(args.rows, args.regressors)
+    else:
+        data, pre_dates, post_dates = example_data()
+    print(f"{len(data):,} rows, {data.shape[1] - 1} regressor(s), {args.backend} backend\n")
+
+    fitted = backends.fit(args.backend, data, pre_dates, post_dates, {})
+    result = ImpactResult.from_fit(fitted, cache_key="bench")
+
+    mb = 1024**2
+    fitted_pickle = len(pickle.dumps(fitted, protocol=pickle.HIGHEST_PROTOCOL))
+    print(f"{'kept per session':<36}{'in memory':>12}{'pickled':>12}")
+    print(f"{'fitted CausalImpact object':<36}{'':>12}{fitted_pickle / mb:>10.2f}MB")
+    print(f"{'separate DataFrames (before)':<36}{frames_bytes(fitted) / mb:>10.2f}MB")
+    result_pickle = len(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+    print(f"{'ImpactResult':<36}{result.nbytes / mb:>10.2f}MB{result_pickle / mb:>10.2f}MB")
+    print(f"\nImpactResult holds {frames_bytes(fitted) / result.nbytes:.1f}x less than the separate frames "
+          f"and pickles {fitted_pickle / result_pickle:.1f}x smaller than the fitted object\n")
+
+    formats = {
+        "pickle": (lambda: pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        "arrow": (result.to_arrow, ImpactResult.from_arrow),
+        "npz": (result.to_npz, ImpactResult.from_npz),
+    }
+
+    failures = []
+    print(f"{'format':<10}{'size':>10}{'write':>10}{'read':>10}")
+    for name, (write, read) in formats.items():
+        payload, write_seconds = timed(write)
+        back, read_seconds = timed(lambda: read(payload))
+        print(f"{name:<10}{len(payload) / mb:>8.2f}MB{write_seconds * 1000:>8.1f}ms{read_seconds * 1000:>8.1f}ms")
+
+        same = (
+            np.array_equal(back.inferences.to_numpy(), result.inferences.to_numpy(), equal_nan=True)
+            and back.data.equals(result.data)
+            and back.summary_data.equals(result.summary_data)
+            and back.summary() == result.summary()
+            and back.p_value == result.p_value
+            and back.post_period == result.post_period
+        )
+        if not same:
+            failures.append(name)
+
+    if failures:
+        print(f"\nDidn't read back the same result: {', '.join(failures)}")
+        sys.exit(1)
+
+    print("\nEvery format reads back the same result")
+
+
+if __name__ == "__main__":
+    main()
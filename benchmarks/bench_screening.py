@@ -0,0 +1,104 @@
+"""
+Benchmark for regressor screening (core.screening).
+
+Screens a synthetic wide export - by default 500 candidate columns of five
+years of daily data - the way the column chooser does (screen_frame on the
+upload's columns, only using rows before the change) and checks it finishes
+inside the one second target. A few of the columns are made from the target,
+so it also checks they come out on top.
+
+Exits with 1 if it's slower than --target, so it can run in CI.
+
+Run from the repo root with:
+
+    python -m benchmarks.bench_screening
+    python -m benchmarks.bench_screening --columns 2000 --years 10
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import screening
+
+
+TARGET_SECONDS = 1.0
+
+# Columns made to follow the target - they should be the ones suggested
+RELATED_COLUMNS = 3
+
+
+def make_export(n_columns: int, n_rows: int) -> pd.DataFrame:
+    """
+    Daily target plus n_columns candidates, a few of which lead the target
+    by a couple of days. Stored as float32 like the app reads them.
+    """
+    rng = np.random.default_rng(0)
+    driver = rng.normal(0, 1, n_rows + 2).cumsum()
+
+    columns = {
+        "date": pd.date_range("2018-01-01", periods=n_rows, freq="D").strftime("%Y-%m-%d"),
+        "target": (driver[:n_rows] * 10 + 1000 + rng.normal(0, 2, n_rows)).astype("float32"),
+    }
+    for i in range(RELATED_COLUMNS):
+        # Moves 2 days ahead of the target
+        columns[f"related_{i}"] = (driver[2:] * (i + 1) + rng.normal(0, 1, n_rows)).astype("float32")
+
+    noise = rng.normal(0, 1, (n_rows, n_columns - RELATED_COLUMNS)).cumsum(axis=0).astype("float32")
+    # Gaps, like a real export
+    noise[rng.random(noise.shape) < 0.02] = np.nan
+    for i in range(noise.shape[1]):
+        columns[f"column_{i}"] = noise[:, i]
+
+    return pd.DataFrame(columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--columns", type=int, default=500)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--target", type=float, default=TARGET_SECONDS, help="Seconds it has to finish in")
+    args = parser.parse_args()
+
+    n_rows = args.years * 365
+    df = make_export(args.columns, n_rows)
+    candidate_cols = [col for col in df.columns if col not in ("date", "target")]
+    # Screen up to a change most of the way through, like the app would
+    before = pd.Timestamp(df["date"].iloc[int(n_rows * 0.8)])
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        results = screening.screen_frame(
+            df,
+            date_col = "date",
+            target_col = "target",
+            candidate_cols = candidate_cols,
+            before = before)
+        timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+    suggested = screening.suggest_regressors(results, top_k = RELATED_COLUMNS)
+
+    print(f"""
+{len(candidate_cols):,} columns x {n_rows:,} rows (best of {args.repeats})
+Screening:  {seconds:.3f}s (target {args.target:.1f}s)
+Suggested:  {', '.join(suggested)}
+""")
+
+    failures = []
+    if sorted(suggested) != [f"related_{i}" for i in range(RELATED_COLUMNS)]:
+        failures.append("didn't suggest the related columns")
+    if seconds > args.target:
+        failures.append(f"took longer than {args.target:.1f}s")
+
+    if failures:
+        print(f"Screening {' and '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Startup profile for the app - how long each module takes to import.
+
+Runs a fresh interpreter with `python -X importtime`, imports the modules the
+app needs for a given step and reports the import time per top level package
+(e.g. streamlit, pandas, plotly), along with the slowest individual modules.
+
+Steps:
+    upload   - what's needed to show the upload page (main.py)
+    columns  - + the column chooser
+    dates    - + the date chooser and its chart (plotly)
+    impact   - + the impact estimate (causalimpact, statsmodels, matplotlib)
+
+Run from the repo root with:
+
+    python -m benchmarks.profile_startup --step upload
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+
+
+STEP_MODULES = {
+    "upload": ["main"],
+    "columns": ["main", "content_blocks.choose_columns"],
+    "dates": ["main", "content_blocks.choose_columns", "content_blocks.choose_dates",
+              "plotly.graph_objects"],
+    "impact": ["main", "content_blocks.choose_columns", "content_blocks.choose_dates",
+               "plotly.graph_objects", "content_blocks.show_impact_estimate",
+               "causalimpact", "matplotlib.pyplot"],
+}
+
+# Modules that should only be loaded once the step that needs them is reached
+HEAVY_MODULES = ["plotly", "causalimpact", "statsmodels", "matplotlib", "holidays"]
+
+
+def import_times(modules: list[str]) -> list[tuple[str, int, int]]:
+    """
+    Returns (module, self microseconds, cumulative microseconds) for every
+    module imported, as reported by -X importtime
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    code += "; import sys; print(','.join(m for m in " + repr(HEAVY_MODULES) + " if m in sys.modules))"
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True)
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+
+    loaded_heavy = [m for m in completed.stdout.strip().splitlines()[-1].split(",") if m]
+    return rows, loaded_heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--step", choices=STEP_MODULES.keys(), default="upload")
+    parser.add_argument("--top", type=int, default=15, help="How many packages/modules to list")
+    args = parser.parse_args()
+
+    rows, loaded_heavy = import_times(STEP_MODULES[args.step])
+
+    by_package: dict = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    total_us = sum(by_package.values())
+
+    print(f"Import time for the '{args.step}' step: {total_us / 1e6:.2f}s across {len(rows)} modules\n")
+
+    print(f"{'Package':<30}{'Seconds':>10}{'Share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{package:<30}{self_us / 1e6:>10.3f}{self_us / total_us:>8.0%}")
+
+    print("\nSlowest individual modules (self time):")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[1])[:args.top]:
+        print(f"{name:<50}{self_us / 1e6:>8.3f}s  (cumulative {cumulative_us / 1e6:.3f}s)")
+
+    print(f"\nHeavy modules loaded: {', '.join(loaded_heavy) if loaded_heavy else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Soak test for the "More detail" section - draws the library's charts over and
+over like reruns would, and checks memory stays flat.
+
+Compares:
+- legacy: ci.plot() through pyplot and never closing the figure, like the app used to
+- uncached: ci.plot_png() every rerun (own Figure, closed each time)
+- cached: the app's memoised charting_helpers.legacy_impact_plot
+
+Run from the repo root with:
+
+    python -m benchmarks.soak_more_detail --reruns 1000
+"""
+import argparse
+import gc
+import time
+import warnings
+
+import pandas as pd
+
+from core import fitting, ingest, memory, periods, validation
+
+
+def fit_example():
+    df, _ = ingest.read_csv("tests/test_files/example_data_for_users.csv")
+    data, _ = validation.convert_and_check_data(df, "Date", "Y", ["X"])
+    data["test_period"] = data["time"] >= pd.Timestamp("2023-06-01", tz="UTC")
+    return fitting.fit_impact(*periods.prepare_data_for_ci(data, ["X"]))
+
+
+def soak(label: str, render, reruns: int) -> None:
+    # First render warms up imports, fonts and caches
+    render()
+    gc.collect()
+    start_bytes = memory.current_rss_bytes()
+
+    start = time.perf_counter()
+    checkpoints = []
+    for rerun in range(1, reruns + 1):
+        render()
+        if rerun % max(reruns // 4, 1) == 0:
+            gc.collect()
+            checkpoints.append(f"{(memory.current_rss_bytes() - start_bytes) / 1024**2:+,.1f}")
+    total_time = time.perf_counter() - start
+
+    print(f"{label:<10} {reruns:>5} reruns in {total_time:6.1f}s ({total_time / reruns * 1000:7.1f}ms each), "
+          f"memory change at each quarter (MB): {', '.join(checkpoints)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=1000, help="Reruns for the cached version")
+    parser.add_argument("--uncached-reruns", type=int, default=50)
+    parser.add_argument("--legacy-reruns", type=int, default=100)
+    args = parser.parse_args()
+
+    # Streamlit's memo warns about running outside of "streamlit run"
+    warnings.filterwarnings("ignore")
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from helpers import charting_helpers as ch
+
+    ci = fit_example()
+
+    def legacy():
+        ci.plot()
+        plt.gcf()
+
+    soak("legacy", legacy, args.legacy_reruns)
+    print(f"{'':<10} {len(plt.get_fignums())} pyplot figures left open")
+    plt.close("all")
+
+    soak("uncached", ci.plot_png, args.uncached_reruns)
+    soak("cached", lambda: ch.legacy_impact_plot(cache_key=ci.cache_key, _ci=ci), args.reruns)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,80 @@
 import streamlit as st
-from helpers import pandas_helpers as pdh, st_helpers as sth
+import pandas as pd
+from helpers import pandas_helpers as pdh, st_helpers as sth, debug_helpers as dh
+from core import screening
+
+
+def show_regressor_screening(data, date_col: str, target_metric_col: str, regressor_options: list):
+    """
+    Ranks the numeric columns by how well they track the target and
+    offers the best few as the regressors
+    """
+    st.markdown("""
+#### Not sure which regressors to use?
+
+We can rank your columns by how closely they follow your target metric before your change
+(on the same day or a few days ahead of it) and pick the best ones for you. Have a look at
+them before you carry on - a column that was *also* affected by your change isn't a good regressor
+however well it matches.
+                """)
+
+    candidate_cols = [col for col in data.numeric_columns if col in regressor_options]
+
+    # Rows after the change would leak its effect into the ranking, so there's
+    # no default that could include them - start at the first date in the
+    # file (or the change date if one's been picked already) and make the
+    # user choose
+    first_date = _first_date(data, date_col)
+    if first_date is None:
+        st.write("Couldn't read any dates from the date column to screen with.")
+        return
+    if st.session_state.get("screen_before") is None or st.session_state.screen_before < first_date:
+        st.session_state.screen_before = max(st.session_state.get("chosen_date") or first_date, first_date)
+
+    before, top_k = st.columns(2)
+    screen_before = before.date_input("Only use data before (the date of your change)", min_value = first_date, key = "screen_before")
+    suggest_count = top_k.number_input("How many to suggest", min_value = 1, max_value = 50, value = screening.DEFAULT_TOP_K)
+
+    date_picked = screen_before > first_date
+    if not date_picked:
+        st.caption("Pick the date of your change first - only rows before it are used.")
+
+    if st.button("Suggest regressors", disabled = not candidate_cols or not date_picked):
+        with dh.record_peak_memory("screening"):
+            df = data.to_frame([date_col, target_metric_col] + candidate_cols, float32 = True, compact = True)
+            results = screening.screen_frame(
+                df,
+                date_col = date_col,
+                target_col = target_metric_col,
+                candidate_cols = candidate_cols,
+                before = screen_before)
+            del df
+
+        st.session_state.regressor_screening = results
+        st.session_state.regressor_col_list = screening.suggest_regressors(results, top_k = int(suggest_count))
+        # Start again so the regressor chooser picks up the suggestions
+        st.experimental_rerun()
+
+    results = st.session_state.regressor_screening
+    if results is not None:
+        st.dataframe(results)
+
+
+def _first_date(data, date_col: str):
+    """
+    Earliest date in the date column (None if none of it reads as a date).
+    Only worked out again when the file or date column changes.
+    """
+    key = (st.session_state.file_hash, date_col)
+    if st.session_state.get("first_date_key") != key:
+        dates = pd.to_datetime(data.to_frame([date_col], categorical_text=False)[date_col], errors="coerce", utc=True)
+        st.session_state.first_date = None if dates.isna().all() else dates.min().date()
+        st.session_state.first_date_key = key
+    return st.session_state.first_date
+
 
 def show_column_choosers():
-    data = st.session_state.file_data
+    data = st.session_state.uploaded_data
 
 
     # Logic for choosing columns
@@ -16,7 +88,7 @@ def show_column_choosers():
             target_metric_col_index,
             regressor_options, 
             default_regressor_cols,
-            ) = pdh.choose_columns(df = st.session_state.file_data) 
+            ) = pdh.choose_columns(df = data) 
         
 
     # Show column choosers
@@ -41,6 +113,9 @@ def show_column_choosers():
         
         target_metric_col = st.session_state.target_metric_col
 
+        if st.session_state.step == "columns":
+            show_regressor_screening(data, date_col, target_metric_col, regressor_options)
+
         # Selection for Regressor columns
         st.session_state.regressor_col_list = st.multiselect("Select Regressor columns:", 
                                         options=regressor_options,
@@ -50,6 +125,23 @@ def show_column_choosers():
         
         regressor_cols = st.session_state.regressor_col_list
 
+        # Optional column for long format data with several series in it
+        # (e.g. one per market) - each one gets its own model
+        group_options = ["None"] + [
+            col for col in data.columns
+            if col not in [date_col, target_metric_col] + regressor_cols]
+        default_group_col = st.session_state.group_col or "None"
+        st.session_state.group_col = st.selectbox(
+            "Group column (optional - if your file has several series, e.g. one per market or site):",
+            options=group_options,
+            index=group_options.index(default_group_col) if default_group_col in group_options else 0,
+            disabled=st.session_state.step != "columns"
+            )
+        if st.session_state.group_col == "None":
+            st.session_state.group_col = None
+
+        group_col = st.session_state.group_col
+
         
         # Could include holidays here but not going to worry about that level of complexity right now
 
@@ -62,6 +154,8 @@ def show_column_choosers():
             st.session_state.target_metric_col != default_target_metric_col
             or 
             st.session_state.regressor_col_list != default_regressor_cols
+            or
+            (st.session_state.group_col or "None") != default_group_col
             ):
 
             print(f"""
@@ -77,6 +171,8 @@ st.session_state.regressor_col_list != default_regressor_cols: {st.session_state
         st.write(f"Date column: {date_col}")
         st.write(f"Target Metric column: {target_metric_col}")
         st.write(f"Regressor columns: {', '.join(regressor_cols) if regressor_cols else 'None'}")
+        if group_col is not None:
+            st.write(f"Group column: {group_col}")
 
         # Display button to submit data
         user_clicks_submit = st.button("Submit")
@@ -84,6 +180,19 @@ st.session_state.regressor_col_list != default_regressor_cols: {st.session_state
             if regressor_cols ==[]:
                 st.warning('You need to include at least one regressor column. Please add one and try again', icon="⚠️")
             else: 
+                # Only now read the data itself, and only the chosen columns,
+                # with numbers stored as float32 where no values change
+                with dh.record_peak_memory("columns"):
+                    st.session_state.file_data = data.to_frame(
+                        [date_col, target_metric_col] + regressor_cols + ([group_col] if group_col else []),
+                        float32 = st.session_state.compact_numbers,
+                        compact = True)
+
+                # Then let go of the rest of the file (and the uploaded bytes)
+                # so they aren't kept for the rest of the session
+                data.release()
+                st.session_state.uploaded_file = data.name
+
                 st.session_state.columns_chosen=True
                 sth.update_step_state(previous_step = "columns", new_step = "dates")
         
@@ -1,5 +1,6 @@
 import streamlit as st
-from helpers import pandas_helpers as pdh, st_helpers as sth, charting_helpers as ch
+from helpers import pandas_helpers as pdh, st_helpers as sth, charting_helpers as ch, debug_helpers as dh
+from core import periods
 import datetime
 import pandas as pd
 import pytz
@@ -12,19 +13,42 @@ def handle_dates_checks():
         regressor_cols = st.session_state.regressor_col_list
 
 
-        # Handle date column
-        data = pdh.check_and_convert_data(
-            df = data, 
-            date_col=date_col,
-            target_col=target_metric_col,
-            regressor_cols=regressor_cols
-            )
+        # Parsing, checking and converting the data only depends on the file
+        # and the chosen columns, so only redo it when one of those changes
+        # (not every time the date picker reruns the page). This session's
+        # checked data is tried first, then anything checked in other sessions
+        checked_data_key = (st.session_state.file_hash, date_col, target_metric_col, tuple(regressor_cols))
+
+        if st.session_state.checked_data_key != checked_data_key:
+            with dh.record_peak_memory("checks"):
+                data = pdh.check_and_convert_data(
+                    df = data, 
+                    date_col=date_col,
+                    target_col=target_metric_col,
+                    regressor_cols=regressor_cols,
+                    file_hash=st.session_state.file_hash,
+                    float32=st.session_state.compact_numbers
+                    )
+
+            if st.session_state.data_checked:
+                st.session_state.checked_data = data
+                st.session_state.checked_data_key = checked_data_key
+
+                # Checked data is all we use from here on
+                st.session_state.file_data = None
+        else:
+            data = st.session_state.checked_data
         
-        default_date = st.session_state.default_last_date_to_show-datetime.timedelta(days = 7)
+        first_date = pd.Timestamp(st.session_state.default_first_date_to_show).date()
+        last_date = pd.Timestamp(st.session_state.default_last_date_to_show).date()
+
+        # The date picker keeps its own value under "chosen_date", so a change
+        # shows up in this same run - no need to rerun the page for the chart.
+        # Only set it here when there isn't one yet (or it's outside this data)
+        chosen_date = st.session_state.get("chosen_date")
+        if chosen_date is None or not first_date <= chosen_date <= last_date:
+            st.session_state.chosen_date = last_date - datetime.timedelta(days = 7)
 
-        if "chosen_date" in st.session_state:
-             default_date = st.session_state.chosen_date
-        
         if st.session_state.data_checked:
             # Only continue if all the data checks are fine
 
@@ -32,20 +56,13 @@ def handle_dates_checks():
 
             with dates_expander:
 
-                st.session_state.chosen_date = st.date_input(
+                st.date_input(
                         "Date when you made the change",
-                        value = default_date,
-                        min_value=st.session_state.default_first_date_to_show,
-                        max_value=st.session_state.default_last_date_to_show,
-                        disabled=st.session_state.step != "dates",   
+                        key="chosen_date",
+                        min_value=first_date,
+                        max_value=last_date,
+                        disabled=st.session_state.step != "dates",
                         )
-                
-                if st.session_state.chosen_date!=default_date:
-                    #  Forcing rerun so that chart always updates if date changed
-                    st.experimental_rerun()
-
-                    
-
 
                 # Combining chosen date with midnight time to create a datetime object
                 chosen_datetime = datetime.datetime.combine(
@@ -59,17 +76,22 @@ def handle_dates_checks():
                 chosen_timestamp = pd.Timestamp(chosen_timestamp_unix, unit='s', tz='UTC')
 
 
-                data["test_period"] = data["time"]>=chosen_timestamp
+                data = periods.split_test_period(data, chosen_timestamp)
 
                 pre_data = data[~data['test_period']]
                 post_data = data[data['test_period']]
                 
 
+                width, method, webgl = ch.current_chart_settings()
+
                 fig = ch.line_plot_highlighting_missing_sections(
                     df = pre_data,
                     future_df=post_data,
                     date_col = date_col,
-                    target_col = target_metric_col)
+                    target_col = target_metric_col,
+                    width = width,
+                    method = method,
+                    webgl = webgl)
                 
                 st.plotly_chart(fig)
                 
@@ -77,4 +99,10 @@ def handle_dates_checks():
 
                 if continue_with_dates:
                     st.session_state.cleaned_data = data
-                    sth.update_step_state(previous_step = "dates", new_step = "impact")
\ No newline at end of file
+                    sth.update_step_state(previous_step = "dates", new_step = "impact")
+
+            if st.session_state.step == "dates":
+                from content_blocks import scan_dates
+                scan_dates.show_date_scanner(
+                    data = st.session_state.checked_data,
+                    regressor_cols = regressor_cols)
\ No newline at end of file
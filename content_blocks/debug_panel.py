@@ -0,0 +1,96 @@
+import streamlit as st
+import pandas as pd
+from helpers import debug_helpers as dh
+from core import memory, validation, jobs, instrument
+
+
+def show_debug_panel():
+    if not dh.debug_enabled():
+        return
+
+    debug_expander = st.expander(label = "Debug", expanded=False)
+    with debug_expander:
+        mb = 1024**2
+
+        sizes = dh.session_memory()
+        sizes_table = pd.DataFrame({
+            "item": list(sizes.keys()),
+            "MB": [size / mb for size in sizes.values()]})
+
+        st.markdown(f"""
+### Session memory
+
+Steady state (what this session is holding on to now): **{sum(sizes.values()) / mb:,.1f} MB**
+""")
+        st.dataframe(sizes_table[sizes_table["MB"] > 0.01].round(2))
+
+        st.markdown("""
+### Peak memory by step
+
+How far process memory rose while this session ran each step. If other sessions
+were busy at the same time, their work is included too.
+""")
+        peaks = st.session_state.memory_peaks
+        if peaks:
+            st.dataframe(pd.DataFrame({
+                "step": list(peaks.keys()),
+                "peak increase MB": [peak / mb for peak in peaks.values()]}).round(2))
+        else:
+            st.write("Nothing run yet.")
+
+        memo = validation.validation_memo.stats()
+        st.markdown(f"""
+### Data checks memo
+
+Checked uploads reused instead of checking them again (shared by every session):
+{memo['hits']} hit(s), {memo['misses']} miss(es), holding {memo['entries']} of up to {memo['max_entries']}
+""")
+
+        fits = jobs.job_manager.stats()
+        st.markdown(f"""
+### Background fits
+
+Shared by every session: {', '.join(f"{count} {status}" for status, count in fits.items())}
+""")
+
+        show_stage_timings()
+
+        st.markdown(f"""
+### Process
+
+Memory now: {memory.current_rss_bytes() / mb:,.1f} MB, most used since starting: {memory.peak_rss_bytes() / mb:,.1f} MB
+""")
+
+
+def show_stage_timings():
+    mb = 1024**2
+
+    st.markdown("""
+### Stage timings
+
+Wall time, CPU time and peak allocation for each stage this session has run
+(see core.instrument).
+""")
+    # Recording is for the whole process, so it's only ever switched on
+    # when the app's started (CI_INSTRUMENT=1) - not from here
+    if not instrument.enabled():
+        st.write("Recording is off - start the app with CI_INSTRUMENT=1 to turn it on.")
+        return
+
+    spans = instrument.recorder.recent_spans(session = st.session_state.session_id)
+    if not spans:
+        st.write("Nothing recorded yet.")
+    else:
+        st.dataframe(pd.DataFrame({
+            "stage": [span.stage for span in spans],
+            "seconds": [span.seconds for span in spans],
+            "CPU seconds": [span.cpu_seconds for span in spans],
+            "peak MB": [None if span.peak_bytes is None else span.peak_bytes / mb for span in spans],
+            "error": [span.error or "" for span in spans],
+            "details": [", ".join(f"{key}={value}" for key, value in span.fields.items()) for span in spans],
+            }).round(3))
+
+    # Totals cover everyone's sessions, so ?debug=1 alone isn't enough to see them
+    if dh.debug_enabled_by_env():
+        st.markdown("Totals for every session (Prometheus format):")
+        st.code(instrument.recorder.prometheus_text(), language="text")
@@ -1,13 +1,17 @@
 import streamlit as st
-from helpers import pandas_helpers as pdh
-import pandas as pd
+from core import validation, ingest
 
 def add_accordion():
     # File uploader
     upload_expander = st.expander(label = "Upload file", expanded=st.session_state.step == "upload")
     with upload_expander:
         if st.session_state.uploaded_file == None:
-            st.session_state.uploaded_file = st.file_uploader("Choose a CSV file", type="csv")
+            st.session_state.uploaded_file = st.file_uploader(
+                "Choose a file (CSV, compressed CSV, Parquet or Feather)",
+                type=ingest.SUPPORTED_UPLOAD_TYPES)
+            st.session_state.compact_numbers = st.checkbox(
+                "Store numbers at lower precision (halves memory use for very large files)",
+                value=False)
             st.session_state.data_checked = False
         else:
             st.write(f"Uploaded file: {st.session_state.uploaded_file}")
@@ -21,13 +25,23 @@ def display_uploaded_file():
         st.session_state.step = "columns"
 
     
-        # Read file
-        data = pd.read_csv(st.session_state.uploaded_file)
+        # Open file - only the column names and a preview are read
+        # for now, the columns we need are read once they're chosen
+        uploaded_data = ingest.open_upload(st.session_state.uploaded_file)
+        print(uploaded_data.report.describe())
+        st.session_state.ingest_report = uploaded_data.report
+        st.session_state.memory_peaks["upload"] = uploaded_data.report.peak_memory_bytes
 
         # Check it has the right columns
-        pdh.check_columns(data)
+        validation.check_column_names(uploaded_data.columns)
 
-        st.session_state.file_data = data
+        st.session_state.uploaded_data = uploaded_data
+        # Lets checks done on this file be reused (see validation.ValidationMemo)
+        st.session_state.file_hash = ingest.content_hash(st.session_state.uploaded_file)
+        st.session_state.file_data = None
+
+        # New file so any checks we've already done are out of date
+        st.session_state.checked_data_key = None
 
         print(st.session_state)
 
@@ -36,12 +50,14 @@ def display_uploaded_file():
     data_display_expander = st.expander(label = "Data preview", expanded=st.session_state.step == "columns")
     with data_display_expander:
         # Read and display the data
-        data = st.session_state.file_data
-        st.write("""### Example top and bottom rows of your CSV:
+        data = st.session_state.uploaded_data
+        st.write("""### Example top and bottom rows of your file:
     Use these to make sure everything looks right.             
 
     *First 5rows:*
                 """)
         st.write(data.head())
         st.write("*Last 5 rows:*")
-        st.write(data.tail())
\ No newline at end of file
+        st.write(data.tail())
+
+        st.caption(st.session_state.ingest_report.describe())
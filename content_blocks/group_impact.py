@@ -0,0 +1,87 @@
+import streamlit as st
+import datetime
+import pandas as pd
+from helpers import st_helpers as sth, debug_helpers as dh
+from core import groups, backends
+
+
+def show_group_impact():
+    data = st.session_state.file_data
+    group_col = st.session_state.group_col
+    date_col = st.session_state.date_col
+    target_metric_col = st.session_state.target_metric_col
+    regressor_cols = st.session_state.regressor_col_list
+
+    group_expander = st.expander(label = f"Measure impact for every {group_col}", expanded=True)
+
+    with group_expander:
+        st.markdown(f"""
+## Measure impact for every {group_col}
+
+Your data has {data[group_col].nunique():,} different values in {group_col}, so we'll run Causal Impact
+separately for each one (they're run at the same time, so this is much quicker than uploading them one by one).
+
+Each {group_col} needs a row for every date between its first and last date, with its target and regressors
+filled in. Any that don't are listed below with what's wrong, and the rest still run.
+                    """)
+
+        times = pd.to_datetime(data[date_col], format="%Y-%m-%d", errors="coerce")
+        first_date, last_date = times.min().date(), times.max().date()
+
+        chosen_date = st.date_input(
+            "Date when you made the change",
+            value = last_date - datetime.timedelta(days = 7),
+            min_value = first_date,
+            max_value = last_date,
+            )
+        intervention = pd.Timestamp(chosen_date, tz="UTC")
+
+        backend = st.selectbox(
+            "Model",
+            options = list(backends.BACKENDS),
+            format_func = lambda name: backends.BACKEND_LABELS[name],
+            key = "group_backend")
+
+        if st.button(f"Run for every {group_col}"):
+            progress_bar = st.progress(0)
+
+            with dh.record_peak_memory("groups"):
+                st.session_state.group_results = groups.fit_groups(
+                    data,
+                    group_col = group_col,
+                    date_col = date_col,
+                    target_col = target_metric_col,
+                    regressor_cols = regressor_cols,
+                    intervention = intervention,
+                    backend = backend,
+                    progress = lambda done, total: progress_bar.progress(done / total))
+
+        results = st.session_state.group_results
+        if results is None:
+            return
+
+        st.write(results.describe())
+
+        failed = results.failed
+        if len(failed):
+            st.warning(f"{len(failed)} {group_col} value(s) couldn't be measured - see the error column below", icon="⚠️")
+
+        st.dataframe(results.results)
+
+        sth.lazy_download(
+            results.results,
+            "Download results",
+            "causal impact results by group",
+            key = "download-group-results")
+
+        if len(results.inferences):
+            sth.lazy_download(
+                results.inferences,
+                "Download data for every group",
+                "causal impact data by group",
+                key = "download-group-inferences",
+                index = True)
+
+        # Expanders can't go inside expanders
+        if st.checkbox("Show the data checks for every group", value=False):
+            st.dataframe(results.checks)
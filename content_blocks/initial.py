@@ -1,4 +1,5 @@
 
+import uuid
 import streamlit as st
 import pandas as pd
 from helpers import st_helpers as sth
@@ -11,17 +12,57 @@ def set_variables():
         # Step defaults
         st.session_state.step = "upload"
 
+        # Identifies this session to things shared between sessions
+        st.session_state.session_id = uuid.uuid4().hex
+
         # Flag for if file uploaded
         st.session_state.uploaded_file = None
+        # Opened file (column names and preview), and the DataFrame of
+        # the chosen columns read from it
+        st.session_state.uploaded_data = None
         st.session_state.file_data = None
+        st.session_state.compact_numbers = False
+        st.session_state.ingest_report = None
+        # Hash of the uploaded file's bytes
+        st.session_state.file_hash = None
+
+        # How far memory rose at each step, for the debug panel
+        st.session_state.memory_peaks = {}
+
+        # Checked and converted version of file_data, and the
+        # column choices it was made with
+        st.session_state.checked_data = None
+        st.session_state.checked_data_key = None
 
         # Column defaults
         st.session_state.date_col = None
         st.session_state.target_metric_col = None
         st.session_state.regressor_col_list = None
+        # Ranking of candidate regressors, if the user asked for suggestions
+        st.session_state.regressor_screening = None
+        # Column splitting the data into several series, if there is one
+        st.session_state.group_col = None
         st.holiday_country = "None"
 
         st.session_state.ci = None
+        # Settings the current fit was made with (for models that have any)
+        st.session_state.ci_model_args = None
+        # Fit running in the background (see core.jobs), the last one cancelled
+        # and the last one that failed (its job id and error)
+        st.session_state.fit_job_id = None
+        st.session_state.cancelled_fit_job_id = None
+        st.session_state.failed_fit = None
+        # Data for the fit and its job id, kept so polling doesn't hash it again
+        st.session_state.fit_inputs = None
+
+        # Results of scanning a range of test dates
+        st.session_state.date_sweep = None
+
+        # Placebo test results, with the fit they were run against
+        st.session_state.placebo_test = None
+
+        # Results of fitting every group, when there's a group column
+        st.session_state.group_results = None
 
         # Add tracking arguments to be referenced throughout the script
         basic_tracking_info: MeasurementArguments = {
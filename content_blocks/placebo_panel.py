@@ -0,0 +1,78 @@
+import streamlit as st
+from helpers import st_helpers as sth, charting_helpers as ch
+from core import placebo
+
+
+def show_placebo_test(ci):
+    placebo_expander = st.expander(label = "Placebo test (how unusual is this effect?)", expanded=False)
+
+    with placebo_expander:
+        st.markdown("""
+## Placebo test
+
+Causal Impact's p-value assumes the model is right about how your data behaves. A placebo test is a
+more down-to-earth check: we pretend the change happened at lots of random dates *before* you really
+made it, when nothing should have changed, and see how big an "effect" the model finds each time.
+
+If the model regularly finds effects as big as your real one when nothing happened, you should be
+wary of the real one too. The placebo p-value is the share of placebos with an effect at least as big as yours.
+
+This runs a model for every placebo date so it can take a while. We stop early if enough placebos beat
+your real effect, and placebos we've already run are remembered.
+                    """)
+
+        n_placebos = st.number_input(
+            "Number of placebo dates",
+            min_value = 20,
+            max_value = 1000,
+            value = placebo.DEFAULT_PLACEBOS,
+            step = 20)
+
+        # Hundreds of Bayesian fits would take far too long, so placebos for
+        # those use the fast model (a similar model, fitted without sampling)
+        backend = None
+        if getattr(ci, "backend", None) == "bayesian":
+            st.info("Placebo tests for the Bayesian model use the fast model - sampling hundreds of times would take hours.")
+            backend = "lean"
+
+        if st.button("Run placebo test"):
+            progress_bar = st.progress(0)
+
+            try:
+                result = placebo.run_placebo_test(
+                    ci,
+                    n_placebos = int(n_placebos),
+                    progress = lambda done, total: progress_bar.progress(done / total),
+                    backend = backend)
+            except ValueError as e:
+                st.error(e)
+                return
+
+            progress_bar.progress(1.0)
+            st.session_state.placebo_test = (ci.cache_key, result)
+
+        # Only show results for the fit they were run against
+        if st.session_state.placebo_test is None or st.session_state.placebo_test[0] != ci.cache_key:
+            return
+        result = st.session_state.placebo_test[1]
+
+        library_p, placebo_p = st.columns(2)
+        library_p.metric("Causal Impact p-value", f"{ci.p_value:.3f}")
+        placebo_p.metric("Placebo p-value", f"{result.p_value:.3f}", help = result.describe())
+
+        failed = result.placebos[result.placebos["error"] != ""]
+        if len(failed):
+            st.warning(f"{len(failed)} placebo(s) couldn't be fitted - see the error column below", icon="⚠️")
+
+        st.plotly_chart(ch.placebo_histogram(result.placebos, result.real_effect))
+
+        st.markdown("### Summary generated by Causal Impact")
+        st.text(ci.summary())
+
+        st.dataframe(result.placebos)
+
+        sth.lazy_download(
+            result.placebos,
+            "Download placebo results",
+            "causal impact placebo test",
+            key = "download-placebo-test")
@@ -0,0 +1,67 @@
+import streamlit as st
+import datetime
+import pandas as pd
+from helpers import st_helpers as sth, charting_helpers as ch
+from core import sweep
+
+
+def show_date_scanner(data: pd.DataFrame, regressor_cols: list):
+    scan_expander = st.expander(label = "Scan dates (not sure exactly when the change happened?)", expanded=False)
+
+    with scan_expander:
+        st.markdown("""
+## Scan dates
+
+Rather than trying dates one at a time, you can check a whole range. We'll run Causal Impact as if the change
+happened on each date and show you how big the estimated impact is for each one.
+
+If the change really happened on a particular date you'd normally expect the estimated impact to jump around that date.
+
+This runs a model for every date so it can take a while - checking every few days makes it quicker.
+                    """)
+
+        first_date = st.session_state.default_first_date_to_show
+        last_date = st.session_state.default_last_date_to_show
+
+        scan_range = st.date_input(
+            "Dates to scan",
+            value = (max(first_date, last_date - datetime.timedelta(days = 60)), last_date - datetime.timedelta(days = 7)),
+            min_value = first_date,
+            max_value = last_date,
+            )
+
+        check_every = st.number_input("Check every nth day", min_value = 1, max_value = 365, value = 1)
+
+        if len(scan_range) != 2:
+            st.write("Choose the first and last date to scan.")
+            return
+
+        dates = sweep.candidate_dates(data, scan_range[0], scan_range[1], every = int(check_every))
+        st.write(f"{len(dates)} dates to check")
+
+        if st.button("Scan dates"):
+            progress_bar = st.progress(0)
+
+            st.session_state.date_sweep = sweep.sweep_dates(
+                data,
+                regressor_col_list = regressor_cols,
+                dates = dates,
+                progress = lambda done, total: progress_bar.progress(done / total))
+
+        results = st.session_state.date_sweep
+        if results is None:
+            return
+
+        failed = results[results["error"] != ""]
+        if len(failed):
+            st.warning(f"{len(failed)} date(s) couldn't be checked - see the error column below", icon="⚠️")
+
+        st.plotly_chart(ch.date_sweep_heatmap(results))
+
+        st.dataframe(results)
+
+        sth.lazy_download(
+            results,
+            "Download scan results",
+            "causal impact date scan",
+            key = "download-date-scan")
@@ -1,4 +1,8 @@
 from helpers import ci_helpers as cih
+from content_blocks import placebo_panel
 
 def display_impact_estimate():
-    cih.run_causal_impact()
\ No newline at end of file
+    ci = cih.run_causal_impact()
+    # Nothing to test if the fit was cancelled or failed
+    if ci is not None:
+        placebo_panel.show_placebo_test(ci)
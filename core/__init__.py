@@ -0,0 +1,15 @@
+"""
+The analysis behind the app, with no Streamlit (or charting) in it.
+
+- validation: checking and converting uploaded data
+- periods: splitting data into pre/post periods and shaping it for Causal Impact
+- fitting: fitting Causal Impact (with caching)
+- impact_math: the numbers we chart from a fitted model
+- result: what we keep from a fitted model (ImpactResult)
+- cache: the fitted result cache used by fitting
+- export: writing results out as CSV, compressed CSV or Parquet
+- instrument: timing and memory use of each stage (switched on with CI_INSTRUMENT=1)
+
+Heavy libraries (causalimpact/statsmodels) are only imported when a fit runs,
+so importing this package from a worker process is cheap.
+"""
@@ -0,0 +1,70 @@
+"""
+What actually fits the model.
+
+Each backend is a function taking (data_for_ci, pre_dates, post_dates,
+model_args, progress) and returning a fitted result with the attributes
+ImpactResult.from_fit reads (data, periods, inferences, summary_data,
+p_value, summary() and the statsmodels trained_model). progress is only used by
+backends slow enough to need it.
+"""
+import importlib.util
+from typing import Callable, Optional
+
+import pandas as pd
+
+
+DEFAULT_BACKEND = "causalimpact"
+
+
+def _fit_causalimpact(data_for_ci: pd.DataFrame, pre_dates: list, post_dates: list, model_args: dict, progress = None):
+    # Only pay for importing the library (and statsmodels) when we fit
+    from causalimpact import CausalImpact
+    return CausalImpact(data_for_ci, pre_dates, post_dates, **model_args)
+
+
+def _fit_lean(data_for_ci: pd.DataFrame, pre_dates: list, post_dates: list, model_args: dict, progress = None):
+    from core.lean_impact import LeanImpact
+    return LeanImpact(data_for_ci, pre_dates, post_dates, **model_args)
+
+
+def _fit_bayesian(data_for_ci: pd.DataFrame, pre_dates: list, post_dates: list, model_args: dict, progress = None):
+    # pymc is heavy, so only check it's there - bayesian_impact imports it
+    if importlib.util.find_spec("pymc") is None:
+        raise ValueError("""
+The Bayesian model needs pymc, which isn't installed here.
+
+Install the packages in requirements.txt or choose another model.
+""")
+    from core.bayesian_impact import BayesianImpact
+    return BayesianImpact(data_for_ci, pre_dates, post_dates, progress = progress, **model_args)
+
+
+BACKENDS = {
+    "causalimpact": _fit_causalimpact,
+    "lean": _fit_lean,
+    "bayesian": _fit_bayesian,
+}
+
+# What to call them in the app
+BACKEND_LABELS = {
+    "causalimpact": "Causal Impact library (simulated intervals)",
+    "lean": "Fast (same model, exact intervals)",
+    "bayesian": "Bayesian (pymc - slower, includes parameter uncertainty)",
+}
+
+
+def fit(
+        backend: str,
+        data_for_ci: pd.DataFrame,
+        pre_dates: list,
+        post_dates: list,
+        model_args: dict,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ):
+    if backend not in BACKENDS:
+        raise ValueError(f"""
+Unknown model backend "{backend}".
+
+Choose one of: {', '.join(BACKENDS)}
+""")
+    return BACKENDS[backend](data_for_ci, pre_dates, post_dates, dict(model_args), progress)
@@ -0,0 +1,291 @@
+"""
+Bayesian structural time series backend, with pymc.
+
+The same kind of model as the Causal Impact library's (a local level plus
+regressors), but fitted by sampling its posterior with NUTS rather than by
+maximum likelihood - closer to Google's original R package. Intervals come
+from the posterior, so they include the uncertainty in the model's
+parameters as well as the noise.
+
+Building and compiling the pytensor graph takes a while, so compiled models
+are kept and reused. The data goes in through pm.MutableData, with a mask
+for which rows are in the pre-period, so one compiled model works for any
+data with the same number of rows and regressors.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core import impact_math
+
+
+DEFAULT_DRAWS = 1000
+DEFAULT_TUNE = 1000
+DEFAULT_CHAINS = 4
+
+# Compiled models kept (across every shape)
+MAX_COMPILED_MODELS = 4
+
+
+class _CompiledModel:
+    """
+    A compiled model and its NUTS step. Its data containers are swapped for
+    each fit, so only one fit can use it at a time - lock is held while it does.
+    """
+    def __init__(self, model, step):
+        self.model = model
+        self.step = step
+        self.lock = threading.Lock()
+
+
+# (rows, regressors) -> compiled models of that shape, least recently used first
+_compiled_models: OrderedDict = OrderedDict()
+_compiled_models_lock = threading.Lock()
+
+
+def _build_model(n_rows: int, n_regressors: int):
+    """
+    Local level model over all n_rows, only learning from the rows the
+    "observed" mask marks as pre-period (everything's standardised)
+    """
+    import pymc as pm
+    import pytensor.tensor as pt
+
+    with pm.Model() as model:
+        y = pm.MutableData("y", np.zeros(n_rows))
+        observed = pm.MutableData("observed", np.zeros(n_rows))
+        x = pm.MutableData("x", np.zeros((n_rows, n_regressors)))
+        prior_level_sd = pm.MutableData("prior_level_sd", 0.01)
+
+        # Prior on how far the level moves each row - the library fixes its
+        # variance to around prior_level_sd, this centres on it instead
+        sigma_level = pm.HalfNormal("sigma_level", sigma=pt.sqrt(prior_level_sd))
+        initial_level = pm.Normal("initial_level", mu=0, sigma=1)
+        # Non-centred random walk samples much better than GaussianRandomWalk
+        innovations = pm.Normal("innovations", mu=0, sigma=1, shape=n_rows)
+        level = pm.Deterministic("level", initial_level + pt.cumsum(innovations * sigma_level))
+
+        mu = level
+        if n_regressors:
+            beta = pm.Normal("beta", mu=0, sigma=1, shape=n_regressors)
+            mu = mu + pt.dot(x, beta)
+
+        sigma_obs = pm.HalfNormal("sigma_obs", sigma=1)
+
+        # Post period rows contribute nothing, so their level is just the
+        # random walk carrying on - which is the forecast
+        pm.Potential("pre_period_fit", (pm.logp(pm.Normal.dist(mu=mu, sigma=sigma_obs), y) * observed).sum())
+
+    return model
+
+
+@contextmanager
+def _compiled_model(n_rows: int, n_regressors: int):
+    """
+    (model, NUTS step, seconds spent compiling) for this shape, only for
+    this fit while it's open. Reuses a compiled model that isn't being used
+    - if they all are (other sessions fitting the same shape) a new one is
+    compiled rather than waiting for them to finish.
+    """
+    import pymc as pm
+
+    key = (n_rows, n_regressors)
+    compiled = None
+    compile_seconds = 0.0
+
+    with _compiled_models_lock:
+        for candidate in _compiled_models.get(key, []):
+            if candidate.lock.acquire(blocking=False):
+                compiled = candidate
+                _compiled_models.move_to_end(key)
+                break
+
+    if compiled is None:
+        start = time.perf_counter()
+        model = _build_model(n_rows, n_regressors)
+        with model:
+            step = pm.NUTS()
+        compile_seconds = time.perf_counter() - start
+
+        compiled = _CompiledModel(model, step)
+        compiled.lock.acquire()
+        with _compiled_models_lock:
+            _compiled_models.setdefault(key, []).append(compiled)
+            _compiled_models.move_to_end(key)
+            # Forgetting one that's in use is fine - its fit still has it
+            while sum(len(models) for models in _compiled_models.values()) > MAX_COMPILED_MODELS:
+                oldest = next(iter(_compiled_models))
+                _compiled_models[oldest].pop(0)
+                if not _compiled_models[oldest]:
+                    del _compiled_models[oldest]
+
+    try:
+        yield compiled.model, compiled.step, compile_seconds
+    finally:
+        compiled.lock.release()
+
+
+class BayesianImpact:
+    """
+    Same arguments and (the parts the app uses of the) results as
+    causalimpact.CausalImpact, plus sampling settings:
+
+        draws, tune, chains: passed to pm.sample
+        cores: how many chains to run at once (defaults to one per chain, up to the number of CPUs)
+        random_seed: for repeatable results
+        progress: called with (draws done, total draws) while sampling
+
+    fit_info has how long compiling and sampling took.
+    """
+    def __init__(
+            self,
+            data: pd.DataFrame,
+            pre_period: list,
+            post_period: list,
+            alpha: float = 0.05,
+            progress: Optional[Callable[[int, int], None]] = None,
+            **model_args,
+        ):
+        import pymc as pm
+
+        start = time.perf_counter()
+
+        self.data = data
+        self.pre_period = pre_period
+        self.post_period = post_period
+        self.alpha = alpha
+        self.model_args = model_args
+
+        self.pre_data = data.loc[pre_period[0]:pre_period[1]]
+        self.post_data = data.loc[post_period[0]:post_period[1]]
+
+        draws = int(model_args.get("draws", DEFAULT_DRAWS))
+        tune = int(model_args.get("tune", DEFAULT_TUNE))
+        chains = int(model_args.get("chains", DEFAULT_CHAINS))
+        cores = int(model_args.get("cores") or min(chains, os.cpu_count() or 1))
+
+        # Same standardisation as the library - pre-period mean and (population) sd
+        mu = self.pre_data.mean(skipna=True)
+        sig = self.pre_data.std(skipna=True, ddof=0).fillna(1)
+        self.mu_sig = (mu.iloc[0], sig.iloc[0])
+        normed = (pd.concat([self.pre_data, self.post_data]) - mu) / sig
+
+        n_pre = len(self.pre_data)
+        n_rows = len(normed)
+        y = normed.iloc[:, 0].to_numpy(dtype="float64")
+        x = normed.iloc[:, 1:].to_numpy(dtype="float64")
+        # Only learn from pre-period rows that have a value
+        observed = np.zeros(n_rows)
+        observed[:n_pre] = 1
+        observed[np.isnan(y)] = 0
+
+        total_draws = chains * (tune + draws)
+        done = 0
+
+        def callback(trace, draw):
+            nonlocal done
+            done += 1
+            if progress is not None and done % 50 == 0:
+                progress(done, total_draws)
+
+        with _compiled_model(n_rows, x.shape[1]) as (model, step, compile_seconds):
+            sampling_start = time.perf_counter()
+            with model:
+                pm.set_data({
+                    # Rows that aren't observed are masked out - zeros rather
+                    # than their values so a gap can't turn the fit into NaN
+                    "y": np.where(observed == 1, y, 0.0),
+                    "observed": observed,
+                    "x": x,
+                    "prior_level_sd": float(model_args.get("prior_level_sd", 0.01)),
+                })
+                step.reset_tuning()
+                posterior = pm.sample(
+                    draws = draws,
+                    tune = tune,
+                    chains = chains,
+                    cores = cores,
+                    step = step,
+                    random_seed = model_args.get("random_seed", 0),
+                    progressbar = False,
+                    callback = callback,
+                    compute_convergence_checks = False,
+                    ).posterior
+            sampling_seconds = time.perf_counter() - sampling_start
+
+        if progress is not None:
+            progress(total_draws, total_draws)
+
+        self._compile_inferences(posterior, x, y_scale = self.mu_sig[1], y_mean = self.mu_sig[0])
+
+        self.fit_info = {
+            "backend": "bayesian",
+            "compile_seconds": round(compile_seconds, 2),
+            "compiled_model_reused": compile_seconds == 0,
+            "sampling_seconds": round(sampling_seconds, 2),
+            "total_seconds": round(time.perf_counter() - start, 2),
+            "chains": chains,
+            "cores": cores,
+            "draws": draws,
+        }
+
+        # What the app reads from statsmodels' results - no burn in for the
+        # library's chart to skip (and no state space model to carry forward)
+        self.trained_model = SimpleNamespace(filter_results=SimpleNamespace(loglikelihood_burn=0))
+
+    def _compile_inferences(self, posterior, x: np.ndarray, y_scale: float, y_mean: float) -> None:
+        # Posterior samples of every row's value, (samples, rows), in original units
+        level = posterior["level"].values.reshape(-1, x.shape[0])
+        fitted = level.copy()
+        if "beta" in posterior:
+            beta = posterior["beta"].values.reshape(-1, x.shape[1])
+            fitted += beta @ x.T
+        sigma_obs = posterior["sigma_obs"].values.reshape(-1, 1)
+        rng = np.random.default_rng(self.model_args.get("random_seed", 0))
+        samples = (fitted + rng.standard_normal(fitted.shape) * sigma_obs) * y_scale + y_mean
+
+        lower_pct, upper_pct = self.alpha * 100 / 2, 100 - self.alpha * 100 / 2
+        n_pre = len(self.pre_data)
+
+        preds = fitted.mean(axis=0) * y_scale + y_mean
+        preds_lower, preds_upper = np.percentile(samples, [lower_pct, upper_pct], axis=0)
+
+        post_samples = samples[:, n_pre:]
+        cum_samples = np.cumsum(post_samples, axis=1)
+        cum_pred_lower, cum_pred_upper = np.percentile(cum_samples, [lower_pct, upper_pct], axis=0)
+
+        y = np.concatenate([self.pre_data.iloc[:, 0].to_numpy(dtype="float64"), self.post_data.iloc[:, 0].to_numpy(dtype="float64")])
+        post_y = y[n_pre:]
+
+        self.inferences = impact_math.inferences_table(
+            pre_index = self.pre_data.index,
+            post_index = self.post_data.index,
+            y = y,
+            preds = preds,
+            preds_lower = preds_lower,
+            preds_upper = preds_upper,
+            cum_pred_lower = cum_pred_lower,
+            cum_pred_upper = cum_pred_upper)
+
+        self.summary_data = impact_math.summary_table(
+            post_y = post_y,
+            post_preds = preds[n_pre:],
+            sum_pred_lower = cum_pred_lower[-1],
+            sum_pred_upper = cum_pred_upper[-1])
+
+        # Same as the library - how often the posterior's totals land on
+        # the other side of what actually happened
+        sums = cum_samples[:, -1]
+        actual = post_y.sum()
+        self.p_value = min(np.sum(sums > actual), np.sum(sums < actual)) / (len(sums) + 1)
+
+    def summary(self, output: str = "summary", digits: int = 2) -> str:
+        from causalimpact.summary import Summary
+        return Summary.summary(self, output=output, digits=digits)
@@ -0,0 +1,253 @@
+"""
+Cache of fitted Causal Impact results, keyed by a hash of the data and settings.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from importlib import metadata
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.result import ImpactResult
+
+
+# Where fitted results are kept between sessions/ restarts and how big that
+# folder is allowed to get before we start removing the least recently used fits
+DEFAULT_CACHE_DIR = os.getenv(
+    "CI_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "aira_causal_impact")
+    )
+DEFAULT_MAX_DISK_BYTES = int(os.getenv("CI_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+DEFAULT_MAX_MEMORY_ENTRIES = int(os.getenv("CI_CACHE_MEMORY_ENTRIES", 16))
+
+
+def fingerprint(
+        data_for_ci: pd.DataFrame,
+        pre_dates: list,
+        post_dates: list,
+        model_args: Optional[dict] = None,
+        backend: str = "causalimpact",
+    ) -> str:
+    """
+    Content hash of everything that affects a CausalImpact fit - the cleaned
+    data (values, column names and index), the pre/post periods, any model
+    options and the backend that fits it. Two uploads of the same CSV with
+    the same choices get the same key.
+    """
+    hasher = hashlib.sha256()
+
+    values = np.ascontiguousarray(data_for_ci.to_numpy(dtype=np.float64))
+    hasher.update(str(values.shape).encode())
+    hasher.update(values.tobytes())
+
+    hasher.update(json.dumps([str(c) for c in data_for_ci.columns]).encode())
+
+    index = data_for_ci.index
+    if isinstance(index, pd.DatetimeIndex):
+        hasher.update(str(index.tz).encode())
+        hasher.update(np.ascontiguousarray(index.asi8).tobytes())
+    else:
+        hasher.update(json.dumps([str(i) for i in index]).encode())
+
+    settings = {
+        "pre_dates": [str(d) for d in pre_dates],
+        "post_dates": [str(d) for d in post_dates],
+        "model_args": model_args or {},
+        # Different library versions can give different results
+        "causalimpact_version": _causalimpact_version(),
+    }
+    # Only added for other backends so existing cached fits keep their keys
+    if backend != "causalimpact":
+        settings["backend"] = backend
+    hasher.update(json.dumps(settings, sort_keys=True, default=str).encode())
+
+    return hasher.hexdigest()
+
+
+def pre_period_fingerprint(
+        data_for_ci: pd.DataFrame,
+        pre_dates: list,
+        model_args: Optional[dict] = None,
+        backend: str = "causalimpact",
+    ) -> str:
+    """
+    Content hash of everything that affects the fitted model itself - the
+    pre-period rows and model options. Fits that only differ in how much
+    post period they have share this key.
+    """
+    pre_rows = data_for_ci.loc[pre_dates[0]:pre_dates[1]]
+    return "pre_" + fingerprint(pre_rows, pre_dates, ["incremental"], model_args, backend)
+
+
+def _causalimpact_version() -> str:
+    # Read from the installed package metadata so we don't have
+    # to import the library (and statsmodels) just to build a key
+    try:
+        return metadata.version("pycausalimpact")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _result_to_bytes(result: ImpactResult) -> bytes:
+    return result.to_npz(include_forecast_state=True)
+
+
+def outcome_to_bytes(outcome: dict) -> bytes:
+    """
+    For caching the few numbers kept from a placebo or scan fit
+    """
+    return json.dumps(outcome, default=str).encode()
+
+
+def outcome_from_bytes(payload: bytes) -> dict:
+    outcome = json.loads(payload)
+    outcome["date"] = pd.Timestamp(outcome["date"])
+    return outcome
+
+
+class ImpactCache:
+    """
+    Two tier cache of fitted results keyed by fingerprint().
+
+    - In memory: the most recently used fits, shared by every session in
+        this process
+    - On disk: fits that survive restarts, trimmed back to max_disk_bytes
+        by removing the least recently used files
+
+    Files are written with dumps and read with loads - ImpactResult's NPZ
+    format unless something else is being cached. Never pickle: anyone who
+    could write to the folder could then run code in the app.
+    """
+    def __init__(
+            self,
+            cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+            max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+            max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+            dumps: Callable[[object], bytes] = _result_to_bytes,
+            loads: Callable[[bytes], object] = ImpactResult.from_npz,
+            suffix: str = ".npz",
+        ):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.dumps = dumps
+        self.loads = loads
+        self.suffix = suffix
+
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.cache_dir is not None:
+            # Only this user can read or write the cache
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        result = self._read_from_disk(key)
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key: str, result) -> None:
+        self._remember(key, result)
+        self._write_to_disk(key, result)
+
+    def _remember(self, key: str, result) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_from_disk(self, key: str):
+        if self.cache_dir is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = self.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Unreadable (half written, or from an older version of the app)
+            # so get rid of it and refit
+            print(f"Removing unreadable cache file {path}: {e}")
+            self._remove(path)
+            return None
+
+        if result is None:
+            # Written by a different version of the app
+            self._remove(path)
+            return None
+
+        # Mark as recently used so eviction keeps it
+        os.utime(path)
+        return result
+
+    def _write_to_disk(self, key: str, result) -> None:
+        if self.cache_dir is None:
+            return
+
+        try:
+            # Write to a temporary file then move it into place so other
+            # processes never read a half written fit
+            payload = self.dumps(result)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            # The cache is only ever a speed up - never fail a fit because of it
+            print(f"Couldn't write fit to cache: {e}")
+            return
+
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".pkl"):
+                # Pickled by older versions of the app - never read, so tidy them up
+                self._remove(path)
+                continue
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        # Oldest first
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# One cache per process so every session can reuse each other's fits
+impact_cache = ImpactCache()
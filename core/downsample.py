@@ -0,0 +1,134 @@
+"""
+Cutting long series down to what a chart can actually show.
+
+A chart a thousand pixels wide can't show more than a couple of thousand
+points, but multi-year hourly data has tens of thousands. Sending all of them
+to the browser makes for huge pages and slow charts, so we pick a subset that
+keeps the shape of the line:
+
+- "lttb" (Largest Triangle Three Buckets) keeps the points that matter most
+    visually - one per bucket
+- "minmax" keeps the lowest and highest point of every bucket, so spikes
+    are never lost - two per bucket
+
+Functions return the positions of the points to keep, so several series
+(e.g. a prediction and its confidence interval) can be cut down to the same
+x values and still line up.
+"""
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+
+METHODS = ["lttb", "minmax", "none"]
+
+
+def _as_float(values) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.DatetimeIndex(values).asi8.astype("float64")
+    return np.asarray(values, dtype="float64")
+
+
+def _bucket_edges(n_points: int, n_buckets: int) -> np.ndarray:
+    return np.linspace(0, n_points, n_buckets + 1).astype("int64")
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Positions of the n_out points Largest Triangle Three Buckets keeps.
+
+    The first and last points are always kept. The rest are split into
+    n_out - 2 buckets, and from each bucket we keep the point that makes the
+    biggest triangle with the point kept from the bucket before and the
+    average of the bucket after.
+    """
+    x = _as_float(x)
+    y = np.nan_to_num(_as_float(y))
+    n_points = len(y)
+
+    if n_out >= n_points or n_out < 3:
+        return np.arange(n_points)
+
+    # Buckets for everything between the first and last point
+    edges = _bucket_edges(n_points - 2, n_out - 2) + 1
+
+    kept = np.empty(n_out, dtype="int64")
+    kept[0] = 0
+    kept[-1] = n_points - 1
+
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket (or the last point, for the last bucket)
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n_points
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+
+        # Twice the area of the triangle each candidate makes
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+            )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def minmax_indices(y, n_buckets: int) -> np.ndarray:
+    """
+    Positions of the lowest and highest point in each of n_buckets buckets
+    (plus the first and last point), in order.
+    """
+    y = _as_float(y)
+    n_points = len(y)
+
+    if n_buckets * 2 >= n_points or n_buckets < 1:
+        return np.arange(n_points)
+
+    edges = _bucket_edges(n_points, n_buckets)
+    starts = edges[:-1]
+    bucket_of_point = np.repeat(np.arange(n_buckets), np.diff(edges))
+
+    # Gaps shouldn't be picked as the min or max
+    lows = np.where(np.isnan(y), np.inf, y)
+    highs = np.where(np.isnan(y), -np.inf, y)
+
+    # First point in each bucket that matches its bucket's min/max
+    bucket_min = np.minimum.reduceat(lows, starts)
+    bucket_max = np.maximum.reduceat(highs, starts)
+    is_min = lows == bucket_min[bucket_of_point]
+    is_max = highs == bucket_max[bucket_of_point]
+    min_positions = np.flatnonzero(is_min)[np.unique(bucket_of_point[is_min], return_index=True)[1]]
+    max_positions = np.flatnonzero(is_max)[np.unique(bucket_of_point[is_max], return_index=True)[1]]
+
+    return np.unique(np.concatenate([[0, n_points - 1], min_positions, max_positions]))
+
+
+def shared_indices(x, ys: Sequence, n_out: int, method: str = "lttb") -> np.ndarray:
+    """
+    Positions to keep so that every series in ys keeps its shape, for charts
+    where the series have to share x values (e.g. filled confidence intervals).
+
+    Each series gets an equal share of the n_out points, and the positions
+    kept for any of them are kept for all of them.
+    """
+    n_points = len(x)
+    if method == "none" or n_points <= n_out:
+        return np.arange(n_points)
+
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}' - should be one of {', '.join(METHODS)}")
+
+    points_per_series = max(n_out // max(len(ys), 1), 3)
+
+    kept = []
+    for y in ys:
+        if method == "lttb":
+            kept.append(lttb_indices(x, y, points_per_series))
+        else:
+            kept.append(minmax_indices(y, points_per_series // 2))
+
+    return np.unique(np.concatenate(kept))
@@ -0,0 +1,71 @@
+"""
+Turning results into files to download.
+
+The whole file is built in memory (Streamlit's download button and the
+export memo both need the bytes). CSVs are written by pandas straight into
+that buffer (optionally through gzip), rather than rendering the whole frame
+to one big string and then encoding a copy of it. Parquet goes through pyarrow.
+"""
+import gzip
+import hashlib
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core import instrument
+
+
+# Rows per Parquet row group
+ROW_GROUP_ROWS = 100_000
+
+# Label, file extension and mime type for each format
+FORMATS = {
+    "csv": ("CSV", "csv", "text/csv"),
+    "csv.gz": ("Compressed CSV (smaller, opens in most spreadsheet tools after unzipping)", "csv.gz", "application/gzip"),
+    "parquet": ("Parquet (for Python, R, BigQuery etc.)", "parquet", "application/octet-stream"),
+}
+
+
+def frame_key(df: pd.DataFrame, index: bool = False) -> str:
+    """
+    Content hash of a frame, for remembering its exports
+    """
+    hasher = hashlib.sha256()
+    hasher.update(pd.util.hash_pandas_object(df, index=index).to_numpy().tobytes())
+    hasher.update(str(list(df.columns)).encode())
+    return hasher.hexdigest()
+
+
+def write_csv(df: pd.DataFrame, f, index: bool = False) -> None:
+    """
+    Writes df to a binary file object
+    """
+    text = io.TextIOWrapper(f, encoding="utf-8", newline="", write_through=True)
+    # pandas writes to a file a batch of rows at a time
+    df.to_csv(text, index=index)
+    text.flush()
+    # Leave f open for the caller
+    text.detach()
+
+
+@instrument.timed("export")
+def to_bytes(df: pd.DataFrame, file_format: str, index: bool = False) -> bytes:
+    if file_format not in FORMATS:
+        raise ValueError(f"Can't export as {file_format} - choose one of: {', '.join(FORMATS)}")
+
+    buffer = io.BytesIO()
+
+    if file_format == "csv":
+        write_csv(df, buffer, index=index)
+    elif file_format == "csv.gz":
+        # Level 6 is most of the size saving of 9 for much less time
+        with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=6) as compressed:
+            write_csv(df, compressed, index=index)
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=index)
+        pq.write_table(table, buffer, row_group_size=ROW_GROUP_ROWS, compression="zstd")
+
+    # Hands over the buffer's own bytes rather than copying them
+    return buffer.getvalue()
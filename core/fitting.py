@@ -0,0 +1,113 @@
+"""
+Fitting Causal Impact, reusing cached fits where we can.
+"""
+from typing import Callable, Optional
+
+import pandas as pd
+
+from core import backends, cache, incremental, instrument, result_store
+from core.result import ImpactResult
+
+
+def fit_impact(
+        data_for_ci: pd.DataFrame,
+        pre_dates: list,
+        post_dates: list,
+        model_args: Optional[dict] = None,
+        impact_cache: Optional[cache.ImpactCache] = None,
+        backend: str = backends.DEFAULT_BACKEND,
+        progress: Optional[Callable[[int, int], None]] = None,
+        store: Optional[result_store.ResultStore] = None,
+        summary_only: bool = False,
+        cache_key: Optional[str] = None,
+        checkpoint: Optional[Callable[[], None]] = None,
+    ) -> ImpactResult:
+    """
+    Fits Causal Impact to data_for_ci (first column "y", then the regressors),
+    or returns the cached fit of exactly the same data and settings.
+
+    backend is one of backends.BACKENDS - which code does the fitting.
+    progress is passed on to backends that report it.
+
+    Fits are also shared with other copies of the app through the result
+    store (if one's set up) - unless a different impact_cache or store is
+    passed in.
+
+    summary_only is for fits where only summary_data, p_value and the
+    inferences are read (date scans, placebos, groups) - see
+    ImpactResult.from_fit.
+
+    cache_key is cache.fingerprint of these arguments, if the caller has
+    already worked it out (saves hashing all the data again).
+
+    checkpoint is called between the stages (looking in the caches, fitting,
+    keeping the result) - raise from it to stop part way through.
+    """
+    checkpoint = checkpoint or (lambda: None)
+    model_args = model_args or {}
+    if impact_cache is None:
+        impact_cache = cache.impact_cache
+        store = store or result_store.result_store
+
+    # Reuse an earlier fit of exactly the same data and settings if we have one
+    if cache_key is None:
+        cache_key = cache.fingerprint(
+            data_for_ci = data_for_ci,
+            pre_dates = pre_dates,
+            post_dates = post_dates,
+            model_args = model_args,
+            backend = backend)
+
+    ci = impact_cache.get(cache_key)
+
+    if ci is not None:
+        print(f"Using cached CausalImpact fit {cache_key}")
+        return ci
+
+    # Then anything another copy of the app has fitted
+    if store is not None:
+        ci = store.get(cache_key)
+        if ci is not None:
+            print(f"Using stored CausalImpact fit {cache_key}")
+            impact_cache.put(cache_key, ci)
+            return ci
+
+    # Failing that, the latest fit with the same pre-period and settings - if
+    # this data is just that fit's data with more rows on the end we can carry
+    # its forecasts on rather than refitting
+    pre_period_key = cache.pre_period_fingerprint(
+        data_for_ci = data_for_ci,
+        pre_dates = pre_dates,
+        model_args = model_args,
+        backend = backend)
+
+    previous = impact_cache.get(pre_period_key)
+
+    checkpoint()
+
+    if previous is not None and incremental.can_extend(previous, data_for_ci, post_dates):
+        print(f"Extending CausalImpact fit {previous.cache_key} by {len(data_for_ci) - len(previous.data)} rows")
+        with instrument.span("fit", backend=backend, rows=len(data_for_ci), incremental=True):
+            ci = incremental.extend_result(previous, data_for_ci, cache_key = cache_key)
+    else:
+        with instrument.span("fit", backend=backend, rows=len(data_for_ci), columns=data_for_ci.shape[1]):
+            fitted = backends.fit(
+                backend,
+                data_for_ci,
+                pre_dates,
+                post_dates,
+                model_args,
+                progress = progress
+                )
+            checkpoint()
+            ci = ImpactResult.from_fit(fitted, cache_key = cache_key, backend = backend, summary_only = summary_only)
+
+    checkpoint()
+
+    impact_cache.put(cache_key, ci)
+    if store is not None:
+        store.put(cache_key, ci)
+    if getattr(ci, "forecast_state", None) is not None:
+        impact_cache.put(pre_period_key, ci)
+
+    return ci
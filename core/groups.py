@@ -0,0 +1,319 @@
+"""
+Running Causal Impact for lots of series (e.g. one per market or site) from
+one upload.
+
+The data is in long format - a date column, a group column saying which
+series each row belongs to, the target and the regressors. Every group is
+checked at once with grouped, column-at-a-time checks (so a file with
+thousands of groups doesn't mean thousands of passes over the data), then
+each group that passes is fitted separately across a pool of processes.
+
+Groups that fail a check or a fit are reported in the results table's
+"error" column - they don't stop the rest of the groups.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core import cache, fitting, periods, shared_pool, validation
+from core.backends import DEFAULT_BACKEND
+
+
+# Fewer rows than this either side of the change and the fit isn't worth much
+MIN_ROWS_EACH_SIDE = 3
+
+# Per group fits aren't worth caching or sharing through the result store -
+# there can be thousands of them and they'd push real fits out
+_no_cache = cache.ImpactCache(cache_dir=None, max_memory_entries=0)
+
+CHECK_COLUMNS = [
+    "group", "rows", "first_date", "last_date", "pre_rows", "post_rows",
+    "blank_dates", "bad_dates", "duplicate_dates", "missing_dates",
+    "blank_targets", "blank_regressors", "not_numbers", "error",
+]
+
+RESULT_COLUMNS = [
+    "group",
+    "abs_effect", "abs_effect_lower", "abs_effect_upper",
+    "rel_effect", "rel_effect_lower", "rel_effect_upper",
+    "p_value", "pre_rows", "post_rows", "fit_seconds", "error",
+]
+
+
+@dataclass
+class GroupResults:
+    # One row per group, RESULT_COLUMNS
+    results: pd.DataFrame
+    # Every fitted group's inferences, with a "group" column in front
+    inferences: pd.DataFrame
+    # One row per group, CHECK_COLUMNS
+    checks: pd.DataFrame
+    seconds: float
+
+    @property
+    def failed(self) -> pd.DataFrame:
+        return self.results[self.results["error"] != ""]
+
+    def describe(self) -> str:
+        return (
+            f"Ran {len(self.results)} groups in {self.seconds:.1f}s - "
+            f"{len(self.results) - len(self.failed)} fitted, {len(self.failed)} failed"
+        )
+
+
+def _not_number_mask(series: pd.Series, blank: np.ndarray) -> np.ndarray:
+    """
+    Cells that aren't blank but can't be turned into numbers (allowing for
+    thousands separators, like validation.columns_to_numbers)
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return np.zeros(len(series), dtype=bool)
+
+    numbers = pd.to_numeric(series.astype(str).str.replace(",", ""), errors="coerce")
+    return numbers.isna().to_numpy() & ~blank
+
+
+def check_groups(
+        df: pd.DataFrame,
+        group_col: str,
+        date_col: str,
+        target_col: str,
+        regressor_cols: list,
+        intervention: Optional[pd.Timestamp] = None,
+    ) -> pd.DataFrame:
+    """
+    Runs the checks for every group at once and returns one row per group
+    with the count of each kind of problem, and an "error" explaining the
+    first problem that would stop the group being fitted ("" if none).
+
+    Same rules as the single series checks - every row needs a date, a
+    target and all its regressors, and no date can appear twice. Gaps
+    between dates are counted in missing_dates (against the group's usual
+    step, e.g. a week for weekly data) but aren't an error. If intervention
+    is given, each group also needs a few rows before and after it.
+    """
+    if df[group_col].isna().any():
+        raise ValueError(f"""
+Some rows don't have a value in your group column ({group_col}), so we can't tell
+which series they belong to. Please fill them in (or remove them), refresh this page
+and try again.
+""")
+
+    blank_date = validation._blank_mask(df[date_col])
+    times = pd.to_datetime(df[date_col], format="%Y-%m-%d", utc=True, errors="coerce")
+    bad_date = times.isna().to_numpy() & ~blank_date
+
+    target_blank = validation._blank_mask(df[target_col])
+    not_number = _not_number_mask(df[target_col], target_blank)
+
+    regressor_blank = np.zeros(len(df), dtype=bool)
+    for c in regressor_cols:
+        blank = validation._blank_mask(df[c])
+        regressor_blank |= blank
+        not_number |= _not_number_mask(df[c], blank)
+
+    flags = pd.DataFrame({
+        "group": df[group_col].to_numpy(),
+        "time": times.to_numpy(),
+        "blank_dates": blank_date,
+        "bad_dates": bad_date,
+        "blank_targets": target_blank,
+        "blank_regressors": regressor_blank,
+        "not_numbers": not_number,
+    })
+    flags["duplicate_dates"] = flags.duplicated(["group", "time"]).to_numpy() & flags["time"].notna().to_numpy()
+
+    if intervention is not None:
+        flags["post"] = flags["time"] >= intervention
+        flags["pre"] = flags["time"].notna() & ~flags["post"]
+
+    grouped = flags.groupby("group", sort=True, observed=True)
+
+    checks = grouped[["blank_dates", "bad_dates", "duplicate_dates", "blank_targets", "blank_regressors", "not_numbers"]].sum()
+    checks["rows"] = grouped.size()
+    checks["first_date"] = grouped["time"].min()
+    checks["last_date"] = grouped["time"].max()
+
+    # Gaps, going by each group's usual step between dates (so weekly or
+    # business day data isn't counted as missing days). Only reported - like
+    # the single series checks, gaps don't stop a group being fitted
+    ordered = flags.dropna(subset=["time"]).drop_duplicates(["group", "time"]).sort_values(["group", "time"])
+    step = ordered["time"].diff().where(ordered["group"].eq(ordered["group"].shift()))
+    usual_step = step.groupby(ordered["group"], observed=True).median().reindex(checks.index)
+    expected_dates = ((checks["last_date"] - checks["first_date"]) / usual_step).round() + 1
+    checks["missing_dates"] = (expected_dates - grouped["time"].nunique()).fillna(0).clip(lower=0).astype(int)
+
+    if intervention is not None:
+        checks["pre_rows"] = grouped["pre"].sum()
+        checks["post_rows"] = grouped["post"].sum()
+    else:
+        checks["pre_rows"] = np.nan
+        checks["post_rows"] = np.nan
+
+    # First problem in each group, in the same order the single series checks go in
+    problems = [
+        (checks["blank_dates"] > 0, "{blank_dates} row(s) have no date"),
+        (checks["bad_dates"] > 0, "{bad_dates} date(s) aren't in YYYY-MM-DD format"),
+        (checks["duplicate_dates"] > 0, "{duplicate_dates} date(s) appear more than once"),
+        (checks["blank_regressors"] > 0, "{blank_regressors} row(s) have a blank regressor"),
+        (checks["blank_targets"] > 0, "{blank_targets} row(s) have a blank target"),
+        (checks["not_numbers"] > 0, "{not_numbers} row(s) have a target or regressor that isn't a number"),
+        (checks["pre_rows"] < MIN_ROWS_EACH_SIDE, f"Needs at least {MIN_ROWS_EACH_SIDE} rows before the change (has {{pre_rows:.0f}})"),
+        (checks["post_rows"] < MIN_ROWS_EACH_SIDE, f"Needs at least {MIN_ROWS_EACH_SIDE} rows after the change (has {{post_rows:.0f}})"),
+    ]
+    problem_number = np.select([condition.to_numpy() for condition, _ in problems], np.arange(len(problems)), default=-1)
+
+    checks = checks.reset_index()
+    checks["error"] = [
+        problems[number][1].format(**row) if number >= 0 else ""
+        for number, row in zip(problem_number, checks.to_dict(orient="records"))
+    ]
+
+    return checks.reindex(columns=CHECK_COLUMNS)
+
+
+def fit_group(
+        group,
+        frame: pd.DataFrame,
+        date_col: str,
+        target_col: str,
+        regressor_cols: list,
+        intervention: pd.Timestamp,
+        model_args: Optional[dict] = None,
+        backend: str = DEFAULT_BACKEND,
+    ) -> tuple[dict, Optional[pd.DataFrame]]:
+    """
+    Checks, shapes and fits one group's rows the same way as a single upload.
+    Never raises - problems are returned in the "error" field so the rest of
+    the groups carry on. Returns the outcome and the group's inferences (None
+    if it failed).
+    """
+    start = time.perf_counter()
+    outcome = {"group": group, "error": ""}
+    inferences = None
+
+    try:
+        data, _ = validation.convert_and_check_data(
+            df = frame.reset_index(drop=True),
+            date_col = date_col,
+            target_col = target_col,
+            regressor_cols = regressor_cols)
+
+        data = periods.split_test_period(data, intervention)
+        data_for_ci, pre_dates, post_dates = periods.prepare_data_for_ci(
+            data,
+            regressor_col_list = regressor_cols)
+
+        ci = fitting.fit_impact(
+            data_for_ci = data_for_ci,
+            pre_dates = pre_dates,
+            post_dates = post_dates,
+            model_args = model_args,
+            impact_cache = _no_cache,
+            backend = backend,
+            summary_only = True)
+
+        average = ci.summary_data["average"]
+        cumulative = ci.summary_data["cumulative"]
+        outcome.update({
+            "abs_effect": cumulative["abs_effect"],
+            "abs_effect_lower": cumulative["abs_effect_lower"],
+            "abs_effect_upper": cumulative["abs_effect_upper"],
+            "rel_effect": average["rel_effect"],
+            "rel_effect_lower": average["rel_effect_lower"],
+            "rel_effect_upper": average["rel_effect_upper"],
+            "p_value": ci.p_value,
+            "pre_rows": int((~data["test_period"]).sum()),
+            "post_rows": int(data["test_period"].sum()),
+        })
+
+        inferences = ci.inferences.copy()
+        inferences.insert(0, "group", group)
+
+    except Exception as e:
+        outcome["error"] = str(e).strip()
+
+    outcome["fit_seconds"] = round(time.perf_counter() - start, 3)
+    return outcome, inferences
+
+
+def fit_groups(
+        df: pd.DataFrame,
+        group_col: str,
+        date_col: str,
+        target_col: str,
+        regressor_cols: list,
+        intervention: pd.Timestamp,
+        model_args: Optional[dict] = None,
+        backend: str = DEFAULT_BACKEND,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> GroupResults:
+    """
+    Checks every group, fits the ones that pass (in parallel) and returns the
+    combined results.
+
+    Args:
+        df: long format data with a row per group and date
+        group_col (str): column saying which series each row belongs to
+        date_col, target_col, regressor_cols: as chosen for a single series
+        intervention (Timestamp): when the change happened (UTC)
+        model_args (dict): extra arguments for the model
+        backend (str): which of core.backends to fit with
+        workers (int): number of processes (defaults to shared_pool.DEFAULT_WORKERS)
+        progress: called with (number done, total) after each group
+    """
+    start = time.perf_counter()
+
+    checks = check_groups(df, group_col, date_col, target_col, regressor_cols, intervention)
+    to_fit = checks.loc[checks["error"] == "", "group"].tolist()
+
+    outcomes = [
+        {"group": row["group"], "pre_rows": row["pre_rows"], "post_rows": row["post_rows"], "error": row["error"]}
+        for row in checks[checks["error"] != ""].to_dict(orient="records")
+    ]
+    inferences = []
+
+    if to_fit:
+        columns = [date_col, target_col] + list(regressor_cols)
+        # Each group's rows go to a worker once, so there's nothing to gain
+        # from sharing the whole frame with them
+        frames = df.groupby(group_col, sort=False, observed=True)[columns]
+
+        with ProcessPoolExecutor(max_workers=min(workers or shared_pool.DEFAULT_WORKERS, len(to_fit))) as pool:
+            futures = [
+                pool.submit(
+                    fit_group, group, frames.get_group(group), date_col, target_col,
+                    regressor_cols, intervention, model_args, backend)
+                for group in to_fit
+            ]
+
+            for future in as_completed(futures):
+                outcome, group_inferences = future.result()
+                outcomes.append(outcome)
+                if group_inferences is not None:
+                    inferences.append(group_inferences)
+                if progress is not None:
+                    progress(len(outcomes), len(checks))
+
+    results = pd.DataFrame(outcomes).reindex(columns=RESULT_COLUMNS)
+    results["error"] = results["error"].fillna("")
+    # Same order as the checks (sorted by group)
+    order = {group: position for position, group in enumerate(checks["group"])}
+    results = results.sort_values("group", key=lambda groups: groups.map(order)).reset_index(drop=True)
+
+    if inferences:
+        combined = pd.concat(inferences)
+        combined["group"] = combined["group"].astype(str)
+    else:
+        combined = pd.DataFrame(columns=["group"])
+
+    return GroupResults(
+        results = results,
+        inferences = combined,
+        checks = checks,
+        seconds = time.perf_counter() - start)
@@ -0,0 +1,174 @@
+"""
+The numbers we chart from a fitted Causal Impact model.
+"""
+import numpy as np
+import pandas as pd
+
+
+def cumulative_difference(
+        inferences: pd.DataFrame,
+        intervention_start: pd.Timestamp,
+    ) -> pd.DataFrame:
+    """
+    Cumulative difference between actual and predicted values from the
+    intervention onwards, with the matching lower and upper bounds.
+
+    Returns a DataFrame (indexed like inferences) with the columns
+    "cumulative_difference", "lower" and "upper".
+    """
+    # Focus on post-intervention data
+    post_intervention_inferences = inferences.loc[intervention_start:]
+
+    # Calculate the cumulative difference (Impact) starting from the intervention date
+    difference = (post_intervention_inferences['post_cum_y'] - post_intervention_inferences['post_cum_pred'])
+
+    # Calculate adjusted confidence intervals for the cumulative difference
+    lower = difference + post_intervention_inferences['post_cum_pred_lower'] - post_intervention_inferences['post_cum_pred']
+    upper = difference + post_intervention_inferences['post_cum_pred_upper'] - post_intervention_inferences['post_cum_pred']
+
+    return pd.DataFrame({
+        "cumulative_difference": difference,
+        "lower": lower,
+        "upper": upper,
+        })
+
+
+INFERENCES_COLUMNS = [
+    'post_cum_y',
+    'preds',
+    'post_preds',
+    'post_preds_lower',
+    'post_preds_upper',
+    'preds_lower',
+    'preds_upper',
+    'post_cum_pred',
+    'post_cum_pred_lower',
+    'post_cum_pred_upper',
+    'point_effects',
+    'point_effects_lower',
+    'point_effects_upper',
+    'post_cum_effects',
+    'post_cum_effects_lower',
+    'post_cum_effects_upper',
+]
+
+
+def inferences_table(
+        pre_index: pd.Index,
+        post_index: pd.Index,
+        y: np.ndarray,
+        preds: np.ndarray,
+        preds_lower: np.ndarray,
+        preds_upper: np.ndarray,
+        cum_pred_lower: np.ndarray,
+        cum_pred_upper: np.ndarray,
+    ) -> pd.DataFrame:
+    """
+    The Causal Impact library's inferences table, for backends that work
+    the numbers out themselves.
+
+    y and the preds arrays cover the pre and post periods, the cumulative
+    bounds just the post period. Like the library's, the cumulative columns
+    start with a 0 on the last pre-period row.
+    """
+    n_pre = len(pre_index)
+    index = pre_index.append(post_index)
+    cum_index = post_index.union([pre_index[-1]]).astype(post_index.dtype)
+
+    cum_y = np.concatenate([[0.0], np.cumsum(y[n_pre:])])
+    cum_pred = np.concatenate([[0.0], np.cumsum(preds[n_pre:])])
+    cum_pred_lower = np.concatenate([[0.0], cum_pred_lower])
+    cum_pred_upper = np.concatenate([[0.0], cum_pred_upper])
+
+    def post_only(values):
+        return pd.Series(values[n_pre:], index=post_index)
+
+    def cumulative(values):
+        return pd.Series(values, index=cum_index)
+
+    inferences = pd.concat([
+        cumulative(cum_y),
+        pd.Series(preds, index=index),
+        post_only(preds),
+        post_only(preds_lower),
+        post_only(preds_upper),
+        pd.Series(preds_lower, index=index),
+        pd.Series(preds_upper, index=index),
+        cumulative(cum_pred),
+        cumulative(cum_pred_lower),
+        cumulative(cum_pred_upper),
+        pd.Series(y - preds, index=index),
+        pd.Series(y - preds_upper, index=index),
+        pd.Series(y - preds_lower, index=index),
+        cumulative(cum_y - cum_pred),
+        cumulative(cum_y - cum_pred_upper),
+        cumulative(cum_y - cum_pred_lower),
+        ], axis=1)
+
+    inferences.columns = INFERENCES_COLUMNS
+    return inferences
+
+
+def summary_table(
+        post_y: np.ndarray,
+        post_preds: np.ndarray,
+        sum_pred_lower: float,
+        sum_pred_upper: float,
+    ) -> pd.DataFrame:
+    """
+    The Causal Impact library's summary table, from the post period and
+    the bounds on the predicted total
+    """
+    return summary_from_totals(len(post_y), post_y.sum(), post_preds.sum(), sum_pred_lower, sum_pred_upper)
+
+
+def summary_from_totals(
+        n_post: int,
+        sum_post_y: float,
+        sum_post_pred: float,
+        sum_pred_lower: float,
+        sum_pred_upper: float,
+    ) -> pd.DataFrame:
+    """
+    summary_table from running totals over the post period (so a fit that's
+    carried forward doesn't need to add the whole post period up again)
+    """
+    mean_post_y = sum_post_y / n_post
+    mean_post_pred = sum_post_pred / n_post
+    mean_post_pred_lower = sum_pred_lower / n_post
+    mean_post_pred_upper = sum_pred_upper / n_post
+
+    abs_effect = mean_post_y - mean_post_pred
+    abs_effect_lower = mean_post_y - mean_post_pred_upper
+    abs_effect_upper = mean_post_y - mean_post_pred_lower
+
+    sum_abs_effect = sum_post_y - sum_post_pred
+    sum_abs_effect_lower = sum_post_y - sum_pred_upper
+    sum_abs_effect_upper = sum_post_y - sum_pred_lower
+
+    return pd.DataFrame(
+        [
+            [mean_post_y, sum_post_y],
+            [mean_post_pred, sum_post_pred],
+            [mean_post_pred_lower, sum_pred_lower],
+            [mean_post_pred_upper, sum_pred_upper],
+            [abs_effect, sum_abs_effect],
+            [abs_effect_lower, sum_abs_effect_lower],
+            [abs_effect_upper, sum_abs_effect_upper],
+            [abs_effect / mean_post_pred, sum_abs_effect / sum_post_pred],
+            [abs_effect_lower / mean_post_pred, sum_abs_effect_lower / sum_post_pred],
+            [abs_effect_upper / mean_post_pred, sum_abs_effect_upper / sum_post_pred],
+        ],
+        columns=['average', 'cumulative'],
+        index=[
+            'actual',
+            'predicted',
+            'predicted_lower',
+            'predicted_upper',
+            'abs_effect',
+            'abs_effect_lower',
+            'abs_effect_upper',
+            'rel_effect',
+            'rel_effect_lower',
+            'rel_effect_upper',
+        ])
@@ -0,0 +1,358 @@
+"""
+Extending a fitted Causal Impact result when rows are added to the end of
+the post period.
+
+The model is only ever fitted on the pre-period. So when the pre-period and
+settings haven't changed and the only difference is some new rows on the end
+of the post period (e.g. re-uploading a monitoring series every morning with
+one more day in it) there's nothing to refit - forecasts for the new rows just
+carry on from where the old ones stopped.
+
+ForecastState keeps the model's state as it stands after the last post period
+row, and extend_result moves it on one row at a time, so an update costs
+O(new rows) rather than a full refit.
+
+- Predictions and their intervals for new rows are exactly what a refit
+    would give (they only depend on the fitted model and each row's regressors)
+- Cumulative bounds and the p-value come from simulating the post period
+    1000 times, like the library does. Each simulation carries on from where
+    it stopped, so they're as accurate as the library's - but they're separate
+    random draws, so won't match a refit to the last decimal place. The draws
+    are seeded from the fit's cache key, so extending the same fit with the
+    same rows always gives the same result
+- For fits from the lean backend (core.lean_impact) the cumulative bounds
+    are exact instead, and so is carrying them on - the variance of the
+    running total is carried forward along with the state
+"""
+import copy
+import hashlib
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core import impact_math
+
+
+# Same number of simulations as the library
+N_SIMULATIONS = 1000
+
+# State space matrices that have to stay the same over time for us to
+# carry the model forward ourselves (regressors come in through obs_intercept)
+TIME_INVARIANT_MATRICES = ["design", "transition", "selection", "state_cov", "obs_cov"]
+
+
+@dataclass
+class ForecastState:
+    # Model, in standardised units
+    transition: np.ndarray
+    design: np.ndarray
+    state_noise_cov: np.ndarray
+    obs_var: float
+    beta: np.ndarray
+
+    # Standardisation used when fitting (mean 0, sd 1 if there wasn't any)
+    y_mean: float
+    y_std: float
+    x_mean: np.ndarray
+    x_std: np.ndarray
+
+    alpha: float
+
+    # Forecast state for the next post period row
+    state_mean: np.ndarray
+    state_cov: np.ndarray
+
+    # Each simulation's state for the next row, and its running total so far
+    sim_states: np.ndarray
+    sim_sums: np.ndarray
+
+    # Running totals over the post period
+    n_post: int
+    sum_y: float
+    sum_pred: float
+
+    # Exact cumulative bounds rather than simulations - the running total's
+    # variance (standardised) and its covariance with the next row's state
+    exact: bool = False
+    sum_var: float = 0.0
+    state_sum_cov: Optional[np.ndarray] = None
+
+
+def _rng(key: str) -> np.random.Generator:
+    # Same draws every time for the same fit
+    return np.random.default_rng(int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "little"))
+
+
+def forecast_state_from_fit(ci, key: str = "") -> Optional[ForecastState]:
+    """
+    ForecastState at the end of a CausalImpact fit's post period, or None
+    for models we can't carry forward ourselves. key (the fit's cache key)
+    seeds the simulations.
+    """
+    fitted_model = getattr(ci.trained_model, "model", None)
+    if fitted_model is None:
+        print("Can't extend this model incrementally - it isn't a statsmodels state space model")
+        return None
+    ssm = fitted_model.ssm
+
+    for name in TIME_INVARIANT_MATRICES:
+        if ssm[name].ndim == 3 and ssm[name].shape[-1] > 1:
+            print(f"Can't extend this model incrementally - {name} changes over time")
+            return None
+
+    n_x = ci.pre_data.shape[1] - 1
+    if ci.mu_sig is None:
+        y_mean, y_std = 0.0, 1.0
+        x_mean, x_std = np.zeros(n_x), np.ones(n_x)
+    else:
+        # Same standardisation as the library - pre-period mean and (population) sd
+        means = ci.pre_data.mean(skipna=True).to_numpy(dtype="float64")
+        stds = ci.pre_data.std(skipna=True, ddof=0).to_numpy(dtype="float64")
+        y_mean, y_std = ci.mu_sig
+        x_mean, x_std = means[1:], stds[1:]
+
+    params = ci.trained_model.params
+    beta_names = [name for name in fitted_model.param_names if name.startswith("beta.")]
+
+    selection = ssm["selection"].reshape(ssm["selection"].shape[:2])
+    state_cov = ssm["state_cov"].reshape(ssm["state_cov"].shape[:2])
+
+    rng = _rng(key)
+    state_mean = np.array(ci.trained_model.predicted_state[..., -1], dtype="float64")
+    state_cov_next = np.array(ci.trained_model.predicted_state_cov[..., -1], dtype="float64")
+    exact = getattr(ci, "exact_intervals", False)
+
+    state = ForecastState(
+        transition = ssm["transition"].reshape(ssm["transition"].shape[:2]),
+        design = ssm["design"].reshape(-1),
+        state_noise_cov = selection @ state_cov @ selection.T,
+        obs_var = float(ssm["obs_cov"].reshape(-1)[0]),
+        beta = np.asarray(params[beta_names], dtype="float64"),
+        y_mean = float(y_mean),
+        y_std = float(y_std),
+        x_mean = x_mean,
+        x_std = x_std,
+        alpha = float(ci.alpha),
+        state_mean = state_mean,
+        state_cov = state_cov_next,
+        sim_states = np.empty((0, len(state_mean))) if exact else rng.multivariate_normal(state_mean, state_cov_next, N_SIMULATIONS),
+        sim_sums = np.zeros(0 if exact else N_SIMULATIONS),
+        n_post = 0,
+        sum_y = 0.0,
+        sum_pred = 0.0,
+        exact = exact,
+        state_sum_cov = np.zeros(len(state_mean)),
+        )
+
+    # Run the state (and simulations) through the post period we already have
+    _advance(state, ci.post_data, rng)
+
+    return state
+
+
+def _advance(state: ForecastState, post_rows: pd.DataFrame, rng: np.random.Generator) -> dict:
+    """
+    Moves state on through post_rows (y then regressors, unstandardised),
+    returning what's needed for their inferences rows. Updates state in place.
+    """
+    n_rows = len(post_rows)
+    values = post_rows.to_numpy(dtype="float64")
+    y = values[:, 0]
+
+    # Regressor effect for each row
+    if len(state.beta):
+        regression = ((values[:, 1:] - state.x_mean) / state.x_std) @ state.beta
+    else:
+        regression = np.zeros(n_rows)
+
+    lower_pct, upper_pct = state.alpha * 100 / 2, 100 - state.alpha * 100 / 2
+    critical_value = NormalDist().inv_cdf(1 - state.alpha / 2)
+
+    preds = np.empty(n_rows)
+    pred_sds = np.empty(n_rows)
+    cum_pred_lower = np.empty(n_rows)
+    cum_pred_upper = np.empty(n_rows)
+    cum_sds = np.empty(n_rows)
+
+    # Square root of the state noise covariance for simulating it (eigh
+    # rather than cholesky as some components can have no noise at all)
+    eigenvalues, eigenvectors = np.linalg.eigh(state.state_noise_cov)
+    state_noise_root = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    obs_sd = np.sqrt(state.obs_var)
+
+    for row in range(n_rows):
+        # Forecast and its variance
+        preds[row] = state.design @ state.state_mean + regression[row]
+        pred_sds[row] = np.sqrt(state.design @ state.state_cov @ state.design + state.obs_var)
+
+        if state.exact:
+            # Running total's variance, as in lean_impact._cumulative_forecast
+            state_design = state.state_cov @ state.design
+            state.sum_var += pred_sds[row] ** 2 + 2 * state.design @ state.state_sum_cov
+            cum_sds[row] = np.sqrt(state.sum_var) * state.y_std
+            state.state_sum_cov = state.transition @ (state.state_sum_cov + state_design)
+        else:
+            # Simulations, in original units
+            sims = state.sim_states @ state.design + regression[row] + rng.normal(0, obs_sd, N_SIMULATIONS)
+            state.sim_sums += sims * state.y_std + state.y_mean
+            cum_pred_lower[row], cum_pred_upper[row] = np.percentile(state.sim_sums, [lower_pct, upper_pct])
+
+        # Move everything on to the next row
+        state.state_mean = state.transition @ state.state_mean
+        state.state_cov = state.transition @ state.state_cov @ state.transition.T + state.state_noise_cov
+        state.sim_states = (
+            state.sim_states @ state.transition.T
+            + rng.standard_normal(state.sim_states.shape) @ state_noise_root.T
+            )
+
+    preds_original = preds * state.y_std + state.y_mean
+    if state.exact:
+        cum_preds = state.sum_pred + np.cumsum(preds_original)
+        cum_pred_lower = cum_preds - critical_value * cum_sds
+        cum_pred_upper = cum_preds + critical_value * cum_sds
+
+    state.n_post += n_rows
+    state.sum_y += float(y.sum())
+    state.sum_pred += float(preds_original.sum())
+
+    return {
+        "y": y,
+        "preds": preds_original,
+        "preds_lower": (preds - critical_value * pred_sds) * state.y_std + state.y_mean,
+        "preds_upper": (preds + critical_value * pred_sds) * state.y_std + state.y_mean,
+        "cum_pred_lower": cum_pred_lower,
+        "cum_pred_upper": cum_pred_upper,
+    }
+
+
+def _sum_pred_bounds(state: ForecastState) -> tuple:
+    """
+    Bounds on the predicted total for the post period so far
+    """
+    if state.exact:
+        sum_sd = np.sqrt(state.sum_var) * state.y_std
+        critical_value = NormalDist().inv_cdf(1 - state.alpha / 2)
+        return state.sum_pred - critical_value * sum_sd, state.sum_pred + critical_value * sum_sd
+
+    lower_pct, upper_pct = state.alpha * 100 / 2, 100 - state.alpha * 100 / 2
+    return tuple(np.percentile(state.sim_sums, [lower_pct, upper_pct]))
+
+
+def _p_value(state: ForecastState) -> float:
+    if state.exact:
+        sum_sd = np.sqrt(state.sum_var) * state.y_std
+        if sum_sd == 0:
+            return 0.0
+        below = NormalDist(state.sum_pred, sum_sd).cdf(state.sum_y)
+        return min(below, 1 - below)
+
+    # Same as the library - how often the simulations land on the
+    # other side of what actually happened
+    signal = min(np.sum(state.sim_sums > state.sum_y), np.sum(state.sim_sums < state.sum_y))
+    return signal / (N_SIMULATIONS + 1)
+
+
+def can_extend(result, data_for_ci: pd.DataFrame, post_dates: list) -> bool:
+    """
+    Whether data_for_ci is result's data with more rows added to the end
+    of the post period (and nothing else changed)
+    """
+    if getattr(result, "forecast_state", None) is None:
+        return False
+
+    old_rows = len(result.data)
+    if len(data_for_ci) <= old_rows:
+        return False
+    if pd.Timestamp(post_dates[0]) != pd.Timestamp(result.post_period[0]):
+        return False
+    # The post period has to run to the end of the data, like the app sets it
+    if pd.Timestamp(post_dates[1]) != data_for_ci.index[-1]:
+        return False
+    if list(data_for_ci.columns) != list(result.data.columns):
+        return False
+
+    existing = data_for_ci.iloc[:old_rows]
+    return (
+        existing.index.equals(result.data.index)
+        and np.array_equal(
+            existing.to_numpy(dtype="float64"),
+            result.data.to_numpy(dtype="float64"),
+            equal_nan=True)
+        )
+
+
+def extend_result(result, data_for_ci: pd.DataFrame, cache_key: str):
+    """
+    Copy of result (an ImpactResult) with the rows of data_for_ci after
+    result's data added on to its post period. Check can_extend first.
+    """
+    new_rows = data_for_ci.iloc[len(result.index):]
+
+    state = copy.deepcopy(result.forecast_state)
+    rows = _advance(state, new_rows, _rng(cache_key))
+
+    previous_sum_y = result.forecast_state.sum_y
+    previous_sum_pred = result.forecast_state.sum_pred
+    cum_y = previous_sum_y + np.cumsum(rows["y"])
+    cum_pred = previous_sum_pred + np.cumsum(rows["preds"])
+
+    new_inferences = {
+        'post_cum_y': cum_y,
+        'preds': rows["preds"],
+        'post_preds': rows["preds"],
+        'post_preds_lower': rows["preds_lower"],
+        'post_preds_upper': rows["preds_upper"],
+        'preds_lower': rows["preds_lower"],
+        'preds_upper': rows["preds_upper"],
+        'post_cum_pred': cum_pred,
+        'post_cum_pred_lower': rows["cum_pred_lower"],
+        'post_cum_pred_upper': rows["cum_pred_upper"],
+        'point_effects': rows["y"] - rows["preds"],
+        'point_effects_lower': rows["y"] - rows["preds_upper"],
+        'point_effects_upper': rows["y"] - rows["preds_lower"],
+        'post_cum_effects': cum_y - cum_pred,
+        # Percentiles of (actual - simulation) are actual - the opposite percentile of the simulations
+        'post_cum_effects_lower': cum_y - rows["cum_pred_upper"],
+        'post_cum_effects_upper': cum_y - rows["cum_pred_lower"],
+        }
+
+    # Only the new rows are worked out - the earlier ones are copied across as they are
+    inference_values = np.concatenate([
+        result._inference_values,
+        np.column_stack([np.asarray(new_inferences[col], dtype="float64") for col in result.inference_columns]),
+        ])
+    data_values = np.concatenate([result._data_values, new_rows.to_numpy(dtype="float64")])
+
+    # The running totals already cover the whole post period
+    summary_data = impact_math.summary_from_totals(
+        state.n_post, state.sum_y, state.sum_pred, *_sum_pred_bounds(state))
+
+    from core.result import ImpactResult
+    extended = ImpactResult(
+        index = data_for_ci.index,
+        data_values = data_values,
+        data_columns = result.data_columns,
+        inference_values = inference_values,
+        inference_columns = result.inference_columns,
+        pre_period = result.pre_period,
+        post_period = [result.post_period[0], new_rows.index[-1]],
+        alpha = result.alpha,
+        p_value = _p_value(state),
+        summary_data = summary_data,
+        loglikelihood_burn = result.loglikelihood_burn,
+        summary_text = {},
+        cache_key = cache_key,
+        backend = result.backend,
+        fit_info = result.fit_info,
+        forecast_state = state)
+
+    from causalimpact.summary import Summary
+    extended.summary_text = {
+        output: Summary.summary(extended, output=output)
+        for output in ["summary", "report"]
+    }
+
+    return extended
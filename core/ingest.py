@@ -0,0 +1,455 @@
+"""
+Reading uploaded files quickly.
+
+Supported formats:
+- CSV, optionally gzip (.csv.gz) or zstd (.csv.zst) compressed. Parsed with
+    pyarrow's multithreaded reader, which converts dates (YYYY-MM-DD) and numbers
+    as it parses. Numbers written with thousands separators ("1,234") are
+    converted with Arrow compute rather than string by string in pandas.
+- Parquet. Only the metadata and a preview are read up front, then only the
+    columns that are asked for.
+- Feather/ Arrow IPC. Memory mapped (or read straight out of the uploaded
+    bytes) without copying, so only the columns that are asked for are ever
+    copied into pandas.
+
+Files are opened as an UploadedData, which knows the column names and can show
+a preview, and only becomes a DataFrame (of just the chosen columns) when
+to_frame is called.
+"""
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from core import instrument
+from core.memory import PeakMemory
+
+
+# File extensions the uploader accepts
+SUPPORTED_UPLOAD_TYPES = ["csv", "gz", "zst", "parquet", "feather", "arrow", "ipc"]
+
+# Numbers with optional thousands separators, e.g. "1234", "-1,234.5"
+THOUSANDS_NUMBER_PATTERN = r"^\s*[-+]?(\d{1,3}(,\d{3})+|\d+)(\.\d+)?\s*$"
+
+PREVIEW_ROWS = 5
+
+
+@dataclass
+class IngestReport:
+    rows: int
+    columns: int
+    parse_seconds: float
+    # How far process memory rose while reading
+    peak_memory_bytes: int
+    # Size of what we're holding on to afterwards. 0 for memory mapped
+    # files, nothing has been copied out of them yet
+    data_bytes: int
+    engine: str
+
+    def describe(self) -> str:
+        return (
+            f"Read {self.rows:,} rows x {self.columns} columns in {self.parse_seconds:.2f}s "
+            f"({self.engine}), peak memory increase {self.peak_memory_bytes / 1024**2:,.1f} MB, "
+            f"data in memory {self.data_bytes / 1024**2:,.1f} MB"
+        )
+
+
+def file_format(name: str) -> str:
+    """
+    Works out the format from a file name - "csv", "parquet" or "arrow"
+    """
+    name = name.lower()
+    if name.endswith((".parquet", ".parq")):
+        return "parquet"
+    if name.endswith((".feather", ".arrow", ".ipc")):
+        return "arrow"
+    return "csv"
+
+
+def _csv_compression(name: str) -> Optional[str]:
+    name = name.lower()
+    if name.endswith(".gz"):
+        return "gzip"
+    if name.endswith((".zst", ".zstd")):
+        return "zstd"
+    return None
+
+
+def _source_name(source) -> str:
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    return getattr(source, "name", "") or ""
+
+
+def _as_arrow_input(source):
+    """
+    Paths are memory mapped, uploaded files (which are already in memory)
+    are wrapped without copying
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return pa.memory_map(str(source), "r")
+
+    if hasattr(source, "getbuffer"):
+        return pa.BufferReader(pa.py_buffer(source.getbuffer()))
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+
+def content_hash(source) -> str:
+    """
+    Hash of a file's bytes, so results worked out from it can be reused when
+    the same file is uploaded again (by anyone)
+    """
+    hasher = hashlib.sha256()
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+                hasher.update(chunk)
+    elif hasattr(source, "getbuffer"):
+        hasher.update(source.getbuffer())
+    else:
+        source.seek(0)
+        hasher.update(source.read())
+        source.seek(0)
+
+    return hasher.hexdigest()
+
+
+def _convert_thousands_separators(table: pa.Table) -> pa.Table:
+    """
+    Turns text columns that are really numbers with commas in them into
+    float columns. Blank cells become nulls like they would in a numeric column.
+    """
+    for index, field in enumerate(table.schema):
+        if not pa.types.is_string(field.type):
+            continue
+
+        column = table.column(index)
+        blank = pc.equal(pc.utf8_trim_whitespace(column), "")
+        looks_numeric = pc.match_substring_regex(column, THOUSANDS_NUMBER_PATTERN)
+
+        if not pc.all(pc.or_(blank, looks_numeric)).as_py():
+            continue
+        if pc.all(blank).as_py():
+            # Nothing but blanks - no reason to think it's a number column
+            continue
+
+        numbers = pc.cast(
+            pc.if_else(blank, None, pc.replace_substring(column, ",", "")),
+            pa.float64())
+        table = table.set_column(index, field.name, numbers)
+
+    return table
+
+
+def _compact_numbers(table: pa.Table, lossless_only: bool = False) -> pa.Table:
+    """
+    Stores number columns as float32. With lossless_only, only columns where
+    every value survives the trip to float32 unchanged (e.g. counts under
+    ~16 million, which is most marketing data) are converted.
+    """
+    for index, field in enumerate(table.schema):
+        if not (pa.types.is_floating(field.type) or pa.types.is_integer(field.type)):
+            continue
+        if field.type == pa.float32():
+            continue
+
+        column = table.column(index)
+        compact = pc.cast(column, pa.float32(), safe=False)
+
+        if lossless_only:
+            round_trip = pc.equal(pc.cast(compact, pa.float64()), pc.cast(column, pa.float64()))
+            # Nulls compare as null, which fill_null counts as fine
+            if not pc.all(pc.fill_null(round_trip, True)).as_py():
+                continue
+
+        table = table.set_column(index, field.name, compact)
+    return table
+
+
+def _to_pandas(
+        table: pa.Table,
+        float32: bool = False,
+        categorical_text: bool = True,
+        compact: bool = False,
+    ) -> pd.DataFrame:
+    table = _convert_thousands_separators(table)
+    if float32 or compact:
+        table = _compact_numbers(table, lossless_only = not float32)
+
+    return table.to_pandas(
+        strings_to_categorical=categorical_text,
+        date_as_object=False,
+        )
+
+
+class UploadedData:
+    """
+    An opened file that hasn't been turned into a DataFrame yet.
+
+    Holds the column names, row count and a small preview. Call to_frame with
+    the columns you need to get a DataFrame of just those.
+    """
+    def __init__(
+            self,
+            name: str,
+            schema: pa.Schema,
+            num_rows: int,
+            read_columns: Callable[[list], pa.Table],
+            head: pa.Table,
+            tail: pa.Table,
+            report: IngestReport,
+        ):
+        self.name = name
+        self.schema = schema
+        self.num_rows = num_rows
+        self._read_columns = read_columns
+        self._head = head
+        self._tail = tail
+        self.report = report
+        self.released = False
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index(self.schema.names)
+
+    @property
+    def numeric_columns(self) -> list:
+        """
+        Columns that hold numbers (including text numbers like "1,234"),
+        judging by the preview
+        """
+        preview = _convert_thousands_separators(self._head)
+        return [
+            field.name for field in preview.schema
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory this is holding on to (not counting memory mapped files)
+        """
+        preview_bytes = self._head.nbytes + self._tail.nbytes
+        if self.released:
+            return preview_bytes
+        return self.report.data_bytes + preview_bytes
+
+    def release(self) -> None:
+        """
+        Lets go of the file's data once we've read what we need from it.
+        The column names and preview are kept.
+        """
+        self._read_columns = None
+        self.released = True
+
+    def head(self) -> pd.DataFrame:
+        return _to_pandas(self._head, categorical_text=False)
+
+    def tail(self) -> pd.DataFrame:
+        return _to_pandas(self._tail, categorical_text=False)
+
+    @instrument.timed("upload_parse")
+    def to_frame(
+            self,
+            columns: Optional[list] = None,
+            float32: bool = False,
+            categorical_text: bool = True,
+            compact: bool = False,
+        ) -> pd.DataFrame:
+        """
+        DataFrame of just the given columns (all of them if columns is None)
+
+        Args:
+            columns (list): columns to read, in the order they should come back
+            float32 (bool): store numbers as float32 to halve their memory use
+            categorical_text (bool): store text columns as pandas categoricals
+            compact (bool): store numbers as float32 where it doesn't change any values
+        """
+        if self.released:
+            raise ValueError("""
+Sorry - the data from this file has already been cleared from memory.
+
+Please refresh the page and upload it again.
+""")
+
+        columns = list(self.schema.names) if columns is None else list(columns)
+        return _to_pandas(
+            self._read_columns(columns),
+            float32=float32,
+            categorical_text=categorical_text,
+            compact=compact)
+
+
+def _preview(table: pa.Table, start: int) -> pa.Table:
+    # take (unlike slice) copies the rows, so the preview doesn't keep
+    # the whole table alive after the UploadedData is released
+    return table.take(pa.array(range(start, min(start + PREVIEW_ROWS, table.num_rows))))
+
+
+def _from_table(name: str, table: pa.Table, engine: str, data_bytes: Optional[int] = None) -> UploadedData:
+    return UploadedData(
+        name=name,
+        schema=table.schema,
+        num_rows=table.num_rows,
+        read_columns=table.select,
+        head=_preview(table, 0),
+        tail=_preview(table, max(table.num_rows - PREVIEW_ROWS, 0)),
+        report=IngestReport(
+            rows=table.num_rows,
+            columns=table.num_columns,
+            parse_seconds=0,
+            peak_memory_bytes=0,
+            data_bytes=table.nbytes if data_bytes is None else data_bytes,
+            engine=engine,
+            ),
+        )
+
+
+def _open_csv(source, name: str) -> UploadedData:
+    compression = _csv_compression(name)
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+    stream = source
+    if compression is not None:
+        stream = pa.CompressedInputStream(_as_arrow_input(source), compression)
+
+    table = pa_csv.read_csv(
+        stream,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        convert_options=pa_csv.ConvertOptions(timestamp_parsers=["%Y-%m-%d"]),
+        )
+
+    return _from_table(name, table, engine=f"pyarrow csv, {compression}" if compression else "pyarrow csv")
+
+
+def _open_parquet(source, name: str) -> UploadedData:
+    parquet_file = pq.ParquetFile(_as_arrow_input(source))
+    metadata = parquet_file.metadata
+
+    # Preview from the first and last row groups only
+    if metadata.num_row_groups:
+        head = _preview(parquet_file.read_row_group(0), 0)
+        last_group = parquet_file.read_row_group(metadata.num_row_groups - 1)
+        tail = _preview(last_group, max(last_group.num_rows - PREVIEW_ROWS, 0))
+    else:
+        head = tail = parquet_file.schema_arrow.empty_table()
+
+    def read_columns(columns: list) -> pa.Table:
+        return parquet_file.read(columns=columns, use_threads=True)
+
+    return UploadedData(
+        name=name,
+        schema=parquet_file.schema_arrow,
+        num_rows=metadata.num_rows,
+        read_columns=read_columns,
+        head=head,
+        tail=tail,
+        report=IngestReport(
+            rows=metadata.num_rows,
+            columns=len(parquet_file.schema_arrow),
+            parse_seconds=0,
+            peak_memory_bytes=0,
+            data_bytes=0,
+            engine="parquet",
+            ),
+        )
+
+
+def _open_arrow(source, name: str) -> UploadedData:
+    # Uncompressed files are read without copying - the table points straight
+    # at the memory map/ uploaded bytes
+    table = feather.read_table(_as_arrow_input(source), memory_map=True)
+    return _from_table(name, table, engine="arrow ipc", data_bytes=0)
+
+
+def _open_with_pandas(source, name: str) -> UploadedData:
+    if hasattr(source, "seek"):
+        source.seek(0)
+    df = pd.read_csv(source, compression=_csv_compression(name))
+    return _from_table(name, pa.Table.from_pandas(df, preserve_index=False), engine="pandas")
+
+
+OPENERS = {
+    "csv": _open_csv,
+    "parquet": _open_parquet,
+    "arrow": _open_arrow,
+}
+
+
+@instrument.timed("upload_parse")
+def open_upload(source, name: Optional[str] = None) -> UploadedData:
+    """
+    Opens a path or file-like object (e.g. a Streamlit upload). The format
+    comes from the file name - pass name if source doesn't have one.
+
+    CSVs pyarrow can't parse fall back to plain pd.read_csv.
+    """
+    name = name or _source_name(source)
+    file_type = file_format(name)
+
+    start = time.perf_counter()
+
+    with PeakMemory() as peak:
+        try:
+            uploaded = OPENERS[file_type](source, name)
+        except pa.ArrowInvalid as e:
+            if file_type != "csv":
+                raise ValueError(f"""
+Sorry - we couldn't read {name}.
+
+Please check it's a valid {file_type} file and try again.
+
+Error: {e}
+""")
+            print(f"pyarrow couldn't read the file, falling back to pandas: {e}")
+            uploaded = _open_with_pandas(source, name)
+
+    uploaded.report.parse_seconds = time.perf_counter() - start
+    uploaded.report.peak_memory_bytes = peak.increase_bytes
+
+    return uploaded
+
+
+def read_csv(
+        source,
+        float32: bool = False,
+        categorical_text: bool = True,
+        columns: Optional[list] = None,
+    ) -> Tuple[pd.DataFrame, IngestReport]:
+    """
+    Reads a whole file into a DataFrame in one go. Any of the supported
+    formats work, despite the name.
+
+    Args:
+        source: path or file-like object
+        float32 (bool): store numbers as float32 to halve their memory use
+        categorical_text (bool): store text columns as pandas categoricals
+        columns (list): only read these columns
+
+    Returns the DataFrame and an IngestReport with timings and memory use.
+    """
+    start = time.perf_counter()
+
+    with PeakMemory() as peak:
+        uploaded = open_upload(source)
+        df = uploaded.to_frame(columns, float32=float32, categorical_text=categorical_text)
+
+    report = uploaded.report
+    report.parse_seconds = time.perf_counter() - start
+    report.peak_memory_bytes = peak.increase_bytes
+    report.data_bytes = int(df.memory_usage(deep=True).sum())
+
+    return df, report
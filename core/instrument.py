@@ -0,0 +1,327 @@
+"""
+Timing and memory use of each stage of the analysis.
+
+Switched on with CI_INSTRUMENT=1 when the app starts (set_enabled is for
+scripts - it changes recording for every session in the process).
+The app records upload_parse, validation, conversion, period_extraction,
+fit, chart_build and export, each with its wall time, CPU time and peak
+allocation:
+
+    with instrument.span("validation", step="ordering"):
+        ...
+
+    @instrument.timed("export")
+    def to_bytes(...):
+        ...
+
+Records are kept for the debug panel, written as one JSON line each to the
+"causal_impact.stages" logger and totalled per stage for prometheus_text().
+Set CI_METRICS_PORT to also serve those totals at http://host:port/metrics
+(start_metrics_server_from_env, called when the app starts). It only listens
+on 127.0.0.1 unless CI_METRICS_HOST says otherwise.
+
+When it's off a span is a shared do-nothing context manager and a timed
+function only checks a flag before calling straight through.
+
+Some things to know when reading the numbers:
+
+- CPU time is for the thread that ran the stage. Work handed to other
+    processes (fitting groups) isn't included
+- Peak allocation comes from tracemalloc, so it covers Python objects and
+    numpy/pandas arrays but not Arrow buffers, and it's process wide - stages
+    running in other sessions at the same time are counted too.
+    CI_INSTRUMENT_MEMORY=0 skips it (tracemalloc slows allocation down)
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+RECENT_SPANS = int(os.getenv("CI_INSTRUMENT_RECENT", 500))
+
+# Only this machine can read the metrics unless told otherwise (e.g. 0.0.0.0
+# for a scraper in another container)
+DEFAULT_METRICS_HOST = os.getenv("CI_METRICS_HOST", "127.0.0.1")
+
+logger = logging.getLogger("causal_impact.stages")
+
+# Which session the stages being run belong to (see set_session)
+_session: contextvars.ContextVar = contextvars.ContextVar("instrument_session", default=None)
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+@dataclass
+class SpanRecord:
+    stage: str
+    seconds: float
+    cpu_seconds: float
+    # None when memory isn't being traced
+    peak_bytes: Optional[int]
+    started: float
+    session: Optional[str] = None
+    error: Optional[str] = None
+    fields: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class StageTotals:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    max_peak_bytes: int = 0
+
+
+class _OpenSpan:
+    __slots__ = ("start_wall", "start_cpu", "start_bytes", "peak_seen")
+
+
+class Recorder:
+    """
+    Keeps the most recent spans and running totals for each stage
+    """
+    def __init__(self, enabled: bool = False, trace_memory: bool = True, recent: int = RECENT_SPANS):
+        self.enabled = False
+        self.trace_memory = trace_memory
+        self.recent: deque = deque(maxlen=recent)
+        self.totals: dict = {}
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+
+        self.set_enabled(enabled)
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+
+        if enabled and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        elif not enabled and self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        if enabled:
+            logger.setLevel(logging.INFO)
+            # Unless logging's already been set up (Streamlit does), print the lines as they are
+            if not logger.hasHandlers():
+                handler = logging.StreamHandler()
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def _span(self, stage: str, fields: dict):
+        stack = self._stack()
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+
+        opened = _OpenSpan()
+        opened.start_bytes = opened.peak_seen = 0
+        if tracing:
+            # Resetting the peak loses it for any span this one is inside,
+            # so hand it up to them first
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            for outer in stack:
+                outer.peak_seen = max(outer.peak_seen, peak_bytes)
+            tracemalloc.reset_peak()
+            opened.start_bytes = opened.peak_seen = current_bytes
+
+        stack.append(opened)
+        error = None
+        started = time.time()
+        opened.start_cpu = time.thread_time()
+        opened.start_wall = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - opened.start_wall
+            cpu_seconds = time.thread_time() - opened.start_cpu
+            stack.pop()
+
+            peak = None
+            if tracing and tracemalloc.is_tracing():
+                peak_bytes = max(tracemalloc.get_traced_memory()[1], opened.peak_seen)
+                for outer in stack:
+                    outer.peak_seen = max(outer.peak_seen, peak_bytes)
+                peak = max(peak_bytes - opened.start_bytes, 0)
+
+            self.record(SpanRecord(
+                stage = stage,
+                seconds = seconds,
+                cpu_seconds = cpu_seconds,
+                peak_bytes = peak,
+                started = started,
+                session = _session.get(),
+                error = error,
+                fields = fields))
+
+    def span(self, stage: str, **fields):
+        if not self.enabled:
+            return _NO_SPAN
+        return self._span(stage, fields)
+
+    def record(self, record: SpanRecord) -> None:
+        with self._lock:
+            self.recent.append(record)
+            totals = self.totals.setdefault(record.stage, StageTotals())
+            totals.calls += 1
+            totals.errors += record.error is not None
+            totals.seconds += record.seconds
+            totals.cpu_seconds += record.cpu_seconds
+            totals.max_peak_bytes = max(totals.max_peak_bytes, record.peak_bytes or 0)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"event": "stage", **record.to_dict()}, default=str))
+
+    def recent_spans(self, session: Optional[str] = None) -> list:
+        with self._lock:
+            records = list(self.recent)
+        return [r for r in records if session is None or r.session == session]
+
+    def prometheus_text(self) -> str:
+        """
+        Per stage totals in the Prometheus text format
+        """
+        with self._lock:
+            totals = {stage: StageTotals(**asdict(t)) for stage, t in self.totals.items()}
+
+        metrics = [
+            ("causal_impact_stage_calls_total", "counter", "Times each stage has run", "calls"),
+            ("causal_impact_stage_errors_total", "counter", "Times each stage has raised an error", "errors"),
+            ("causal_impact_stage_seconds_total", "counter", "Wall time spent in each stage", "seconds"),
+            ("causal_impact_stage_cpu_seconds_total", "counter", "CPU time spent in each stage", "cpu_seconds"),
+            ("causal_impact_stage_peak_bytes", "gauge", "Largest peak allocation seen in each stage", "max_peak_bytes"),
+        ]
+
+        lines = []
+        for name, kind, description, attribute in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, stage_totals in sorted(totals.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {getattr(stage_totals, attribute)}')
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every session in this process
+recorder = Recorder(
+    enabled = _env_flag("CI_INSTRUMENT", "0"),
+    trace_memory = _env_flag("CI_INSTRUMENT_MEMORY", "1"))
+
+
+def span(stage: str, **fields):
+    """
+    Context manager recording one run of a stage (does nothing when switched off)
+    """
+    return recorder.span(stage, **fields)
+
+
+def timed(stage: str):
+    """
+    Decorator recording every call of a function as a run of stage
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not recorder.enabled:
+                return function(*args, **kwargs)
+            with recorder._span(stage, {"function": function.__qualname__}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enabled() -> bool:
+    return recorder.enabled
+
+
+def set_enabled(on: bool) -> None:
+    recorder.set_enabled(on)
+
+
+def set_session(session_id: Optional[str]) -> None:
+    """
+    Marks stages run from here on (in this thread or anything it copies
+    its context to) as belonging to session_id
+    """
+    _session.set(session_id)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = recorder.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        # Scrapes every few seconds would drown out everything else
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: int, host: str = DEFAULT_METRICS_HOST) -> ThreadingHTTPServer:
+    """
+    Serves prometheus_text() at /metrics in a background thread (once per process)
+    """
+    global _metrics_server
+    if _metrics_server is None:
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        print(f"Serving stage metrics on {host}:{port}")
+    return _metrics_server
+
+
+_metrics_env_checked = False
+
+
+def start_metrics_server_from_env() -> Optional[ThreadingHTTPServer]:
+    """
+    Starts the metrics server if CI_METRICS_PORT is set. Streamlit calls
+    main() on every rerun so this only tries the first time.
+    """
+    global _metrics_env_checked
+    if _metrics_env_checked:
+        return _metrics_server
+    _metrics_env_checked = True
+    if not os.getenv("CI_METRICS_PORT"):
+        return None
+    try:
+        return start_metrics_server(int(os.environ["CI_METRICS_PORT"]))
+    except (OSError, ValueError) as e:
+        # Metrics are only ever extra - never stop the app over them
+        print(f"Couldn't serve stage metrics on CI_METRICS_PORT={os.environ['CI_METRICS_PORT']}: {e}")
+        return None
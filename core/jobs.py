@@ -0,0 +1,211 @@
+"""
+Fitting in the background, so a long fit doesn't freeze the page.
+
+Fits are submitted to a thread pool shared by every session and tracked as
+jobs. A job's id is the fit's cache key (cache.fingerprint), so submitting
+a fit that's already running - from the same session or any other - just
+adds another watcher to the running job instead of starting it again.
+
+The page polls get() for the job's status and progress. cancel() removes a
+watcher, and the job is cancelled once nobody is watching it. A job that's
+still queued is dropped straight away; a running one stops at its next
+progress update (the Bayesian backend reports progress while sampling) or
+between fit_impact's stages. The other backends can't stop part way through
+a fit, so the app only offers to cancel jobs that are queued or report
+progress.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from core import backends, cache, fitting
+from core.result import ImpactResult
+
+
+# How many fits run at once, across every session
+DEFAULT_FIT_WORKERS = int(os.getenv("CI_FIT_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Finished jobs are kept this long for sessions to collect them
+DEFAULT_KEEP_SECONDS = 15 * 60
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: str = QUEUED
+    # Share of the work done (None for backends that don't report it)
+    progress: Optional[float] = None
+    result: Optional[ImpactResult] = None
+    error: str = ""
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    watchers: set = field(default_factory=set)
+    cancel_requested: bool = False
+    future: Optional[Future] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+def job_id(
+        data_for_ci: pd.DataFrame,
+        pre_dates: list,
+        post_dates: list,
+        model_args: Optional[dict] = None,
+        backend: str = backends.DEFAULT_BACKEND,
+    ) -> str:
+    # Same key the fit is cached under
+    return cache.fingerprint(
+        data_for_ci = data_for_ci,
+        pre_dates = pre_dates,
+        post_dates = post_dates,
+        model_args = model_args or {},
+        backend = backend)
+
+
+class JobManager:
+    def __init__(self, workers: int = DEFAULT_FIT_WORKERS, keep_seconds: float = DEFAULT_KEEP_SECONDS):
+        self.keep_seconds = keep_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fit")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+            self,
+            data_for_ci: pd.DataFrame,
+            pre_dates: list,
+            post_dates: list,
+            model_args: Optional[dict] = None,
+            backend: str = backends.DEFAULT_BACKEND,
+            watcher: str = "",
+            key: Optional[str] = None,
+        ) -> str:
+        """
+        Starts fitting in the background (unless the same fit is already
+        running or finished) and returns the job id to poll. Pass key if
+        you already have job_id for these arguments.
+        """
+        if key is None:
+            key = job_id(data_for_ci, pre_dates, post_dates, model_args, backend)
+
+        with self._lock:
+            self._prune()
+
+            job = self._jobs.get(key)
+            # Anything but a cancelled or failed job can be shared
+            if job is not None and job.status not in (CANCELLED, FAILED):
+                job.watchers.add(watcher)
+                # Someone wants it again before a cancel took effect
+                job.cancel_requested = False
+                return key
+
+            job = Job(job_id=key, watchers={watcher})
+            self._jobs[key] = job
+            # Copy the context so the fit's stage timings know which session started it
+            job.future = self._executor.submit(
+                contextvars.copy_context().run,
+                self._run, job, data_for_ci, pre_dates, post_dates, model_args, backend)
+
+        return key
+
+    def _run(self, job: Job, data_for_ci, pre_dates, post_dates, model_args, backend) -> None:
+        with self._lock:
+            if job.cancel_requested:
+                job.status = CANCELLED
+                job.finished = time.time()
+                return
+            job.status = RUNNING
+            job.started = time.time()
+
+        def checkpoint() -> None:
+            if job.cancel_requested:
+                raise JobCancelled()
+
+        def progress(done: int, total: int) -> None:
+            job.progress = done / total
+            checkpoint()
+
+        try:
+            result = fitting.fit_impact(
+                data_for_ci = data_for_ci,
+                pre_dates = pre_dates,
+                post_dates = post_dates,
+                model_args = model_args,
+                backend = backend,
+                progress = progress,
+                cache_key = job.job_id,
+                checkpoint = checkpoint)
+        except JobCancelled:
+            status, result, error = CANCELLED, None, ""
+        except Exception as e:
+            status, result, error = FAILED, None, str(e).strip()
+        else:
+            status, error = (CANCELLED, "") if job.cancel_requested else (DONE, "")
+
+        with self._lock:
+            job.status = status
+            job.result = result if status == DONE else None
+            job.error = error
+            job.finished = time.time()
+            if status == DONE:
+                job.progress = 1.0
+
+    def get(self, key: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key: str, watcher: str = "") -> None:
+        """
+        Stops watching a job, and cancels it if nobody else is watching
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.is_finished:
+                return
+
+            job.watchers.discard(watcher)
+            if job.watchers:
+                return
+
+            job.cancel_requested = True
+            if job.future is not None and job.future.cancel():
+                # Never started
+                job.status = CANCELLED
+                job.finished = time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+
+    def _prune(self) -> None:
+        # Forget jobs that finished a while ago (the fits are still in the cache)
+        cutoff = time.time() - self.keep_seconds
+        for key in [key for key, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[key]
+
+
+# One per process so sessions share running fits
+job_manager = JobManager()
@@ -0,0 +1,99 @@
+"""
+Measuring how much memory the process is using.
+
+Resident memory (RSS) covers everything - pandas/numpy arrays and Arrow
+buffers alike - which tracemalloc can't see. It's process wide though, so
+when several sessions are busy at once the numbers include their work too.
+"""
+import os
+import resource
+import sys
+import threading
+from typing import Optional
+
+
+def current_rss_bytes() -> int:
+    """
+    Resident memory of this process right now
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not Linux - best we can do is the high water mark
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """
+    Most resident memory this process has used since it started
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class PeakMemory:
+    """
+    Context manager that samples resident memory in the background and
+    records how far it rose above where it was at the start.
+
+        with PeakMemory() as peak:
+            do_something()
+        print(peak.increase_bytes)
+    """
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval_seconds = interval_seconds
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        self.peak_bytes = max(self.peak_bytes, current_rss_bytes())
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self._sample()
+
+    def __enter__(self) -> "PeakMemory":
+        self.start_bytes = current_rss_bytes()
+        self.peak_bytes = self.start_bytes
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    @property
+    def increase_bytes(self) -> int:
+        return max(self.peak_bytes - self.start_bytes, 0)
+
+
+def object_bytes(obj) -> int:
+    """
+    Rough size of something we're keeping around - exact for DataFrames,
+    numpy arrays and Arrow tables, shallow for everything else
+    """
+    if obj is None:
+        return 0
+    if hasattr(obj, "memory_usage") and hasattr(obj, "columns"):
+        # DataFrame
+        return int(obj.memory_usage(deep=True).sum())
+    if hasattr(obj, "memory_usage"):
+        # Series/ Index
+        return int(obj.memory_usage(deep=True))
+    if hasattr(obj, "nbytes"):
+        # numpy arrays, Arrow tables, UploadedData
+        return int(obj.nbytes)
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if hasattr(obj, "getbuffer"):
+        # Uploaded files
+        with obj.getbuffer() as buffer:
+            return buffer.nbytes
+    return sys.getsizeof(obj)
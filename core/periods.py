@@ -0,0 +1,78 @@
+"""
+Splitting checked data into pre/post periods and shaping it for Causal Impact.
+"""
+import pandas as pd
+
+from core import instrument
+
+
+def split_test_period(data: pd.DataFrame, chosen_timestamp: pd.Timestamp) -> pd.DataFrame:
+    """
+    Flags every row on or after the chosen timestamp as part of the test
+    (post intervention) period. Works on a shallow copy so the checked
+    data passed in isn't changed.
+    """
+    data = data.copy(deep = False)
+    data["test_period"] = data["time"]>=chosen_timestamp
+    return data
+
+
+def extract_start_and_end(data_for_ci):
+    # Pull start and end dates at this point to be certain they match
+    pre_period = data_for_ci[~data_for_ci["test_period"]]
+    pre_data_start = pre_period["test_period"].index.min()
+    pre_data_end = pre_period["test_period"].index.max()
+    pre_dates = [pre_data_start, pre_data_end]
+
+    post_period = data_for_ci[data_for_ci["test_period"]]
+    post_data_start = post_period["test_period"].index.min()
+    post_data_end = post_period["test_period"].index.max()
+    post_dates = [post_data_start, post_data_end]
+
+    return pre_dates, post_dates
+
+
+def clean_columns(data_for_ci, regressor_col_list):
+
+    # Rename regressor columns to match expected format
+    rename_dictionary = {}
+    renamed_list = []
+    for index, col in enumerate(regressor_col_list):
+        name = "X"
+        if index != 0:
+            name = f"X{index}"
+        rename_dictionary[col] = name
+        renamed_list.append(name)
+    data_for_ci.rename(columns=rename_dictionary, inplace=True)
+
+    # Cut down to just the columns we need for the impact estimate
+    cols_to_keep = [c for c in data_for_ci.columns if c=="y" or c in renamed_list]
+
+    data_for_ci = data_for_ci[cols_to_keep]
+
+    # Ensure all info is numerical, no n/a. Numbers can be stored as
+    # float32 to save memory, but the model is always fitted in float64
+    data_for_ci = data_for_ci.apply(pd.to_numeric).astype("float64")
+    data_for_ci = data_for_ci.fillna(0)
+    return data_for_ci
+
+
+@instrument.timed("period_extraction")
+def prepare_data_for_ci(data, regressor_col_list):
+    """
+    Turns checked data (with "time", "y", "test_period" and regressor
+    columns) into the frame CausalImpact expects, plus the pre and post
+    periods to fit with
+    """
+    data_for_ci = data.copy(deep = True)
+
+    data_for_ci.set_index('time', inplace=True)
+
+    # Make sure data is always in the right order
+    data_for_ci.sort_index(inplace=True)
+
+    pre_dates, post_dates = extract_start_and_end(data_for_ci)
+
+    data_for_ci = clean_columns(data_for_ci, regressor_col_list = regressor_col_list)
+
+    return data_for_ci, pre_dates, post_dates
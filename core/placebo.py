@@ -0,0 +1,261 @@
+"""
+Placebo (in-time permutation) test.
+
+Pretends the change happened at a random date inside the pre-period, before
+anything actually changed, and fits Causal Impact to that. Do this a few
+hundred times and you get the spread of "effects" the model finds when there
+wasn't one. The empirical p-value is how often a placebo effect was at least
+as big as the real one - if that's often, the real effect isn't very
+convincing, whatever the library's own p-value says.
+
+Every placebo uses the same post period length as the real test and stops
+before the real change, so it only ever sees pre-period data.
+"""
+import os
+import time
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from core import backends, cache, fitting, shared_pool
+
+
+DEFAULT_PLACEBOS = 200
+
+# Placebo dates this far into the pre-period or later, so every placebo
+# fit still has a reasonable amount of history to learn from
+MIN_PRE_FRACTION = 0.25
+
+# Once this many placebos have beaten the real effect the p-value clearly
+# isn't going to be small, so we stop (Besag & Clifford's sequential test)
+DEFAULT_STOP_AFTER = 20
+
+RESULT_COLUMNS = [
+    "date", "post_rows",
+    "abs_effect", "cum_abs_effect", "rel_effect", "p_value",
+    "cached", "fit_seconds", "error",
+]
+
+# Only the numbers we need from each placebo, kept between runs so running
+# the test again (or with more placebos) only fits the new ones
+placebo_cache = cache.ImpactCache(
+    cache_dir = os.path.join(cache.DEFAULT_CACHE_DIR, "placebo"),
+    max_memory_entries = 2000,
+    max_disk_bytes = 50 * 1024 * 1024,
+    dumps = cache.outcome_to_bytes,
+    loads = cache.outcome_from_bytes,
+    suffix = ".json")
+
+# Placebo fits themselves aren't worth caching - they'd push real fits out
+_no_cache = cache.ImpactCache(cache_dir=None, max_memory_entries=0)
+
+
+@dataclass
+class PlaceboResult:
+    real_effect: float
+    placebos: pd.DataFrame
+    p_value: float
+    n_requested: int
+    stopped_early: bool
+
+    @property
+    def n_run(self) -> int:
+        return int((self.placebos["error"] == "").sum())
+
+    def describe(self) -> str:
+        text = f"{self.n_run} placebo(s)"
+        if self.stopped_early:
+            text += f" (stopped early out of {self.n_requested} - enough had beaten the real effect)"
+        return text
+
+
+def placebo_positions(n_pre_rows: int, post_rows: int, n_placebos: int, seed: int = 0) -> np.ndarray:
+    """
+    Row positions (within the pre-period) to start placebo post periods at,
+    in random order. The same seed always gives the same placebos, so
+    repeat runs are served from the cache.
+    """
+    first = max(3, int(n_pre_rows * MIN_PRE_FRACTION))
+    last = n_pre_rows - post_rows
+    if last < first:
+        return np.array([], dtype=int)
+
+    available = np.arange(first, last + 1)
+    rng = np.random.default_rng(seed)
+    return rng.permutation(available)[:n_placebos]
+
+
+def _placebo_window(pre_data: pd.DataFrame, position: int, post_rows: int):
+    window = pre_data.iloc[:position + post_rows]
+    index = window.index
+    return window, [index[0], index[position - 1]], [index[position], index[-1]]
+
+
+def _placebo_key(window: pd.DataFrame, pre_dates: list, post_dates: list, model_args: dict, backend: str) -> str:
+    return "placebo_" + cache.fingerprint(window, pre_dates, post_dates, model_args, backend)
+
+
+def _fit_placebo(position: int, post_rows: int, backend: str) -> dict:
+    """
+    Fits one placebo against the shared pre-period data. Never raises -
+    problems are returned in the "error" field.
+    """
+    return fit_placebo(shared_pool.worker_data(), position, post_rows, shared_pool.worker_model_args(), backend)
+
+
+def fit_placebo(
+        pre_data: pd.DataFrame,
+        position: int,
+        post_rows: int,
+        model_args: Optional[dict] = None,
+        backend: str = backends.DEFAULT_BACKEND,
+    ) -> dict:
+    start = time.perf_counter()
+    window, pre_dates, post_dates = _placebo_window(pre_data, position, post_rows)
+    outcome = {"date": post_dates[0], "post_rows": post_rows, "cached": False, "error": ""}
+
+    try:
+        ci = fitting.fit_impact(
+            data_for_ci = window,
+            pre_dates = pre_dates,
+            post_dates = post_dates,
+            model_args = model_args,
+            impact_cache = _no_cache,
+            backend = backend,
+            summary_only = True)
+
+        outcome.update({
+            "abs_effect": ci.summary_data["average"]["abs_effect"],
+            "cum_abs_effect": ci.summary_data["cumulative"]["abs_effect"],
+            "rel_effect": ci.summary_data["average"]["rel_effect"],
+            "p_value": ci.p_value,
+        })
+
+    except Exception as e:
+        outcome["error"] = str(e).strip()
+
+    outcome["fit_seconds"] = round(time.perf_counter() - start, 3)
+    return outcome
+
+
+def empirical_p_value(real_effect: float, placebo_effects: np.ndarray, stopped_early: bool = False) -> float:
+    """
+    Two-sided - the share of placebos with an effect at least as far from
+    zero as the real one (counting the real one, so it's never 0)
+    """
+    effects = np.asarray(placebo_effects, dtype="float64")
+    effects = effects[~np.isnan(effects)]
+    if len(effects) == 0:
+        return np.nan
+
+    beaten = int(np.count_nonzero(np.abs(effects) >= abs(real_effect)))
+    if stopped_early:
+        return beaten / len(effects)
+    return (beaten + 1) / (len(effects) + 1)
+
+
+def run_placebo_test(
+        ci,
+        n_placebos: int = DEFAULT_PLACEBOS,
+        model_args: Optional[dict] = None,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+        stop_after: Optional[int] = DEFAULT_STOP_AFTER,
+        seed: int = 0,
+        backend: Optional[str] = None,
+    ) -> PlaceboResult:
+    """
+    Runs up to n_placebos placebo fits for the fitted result ci and compares
+    their average effects to its real one.
+
+    Args:
+        ci: fitted result (from fitting.fit_impact)
+        n_placebos (int): how many placebo dates to try
+        model_args (dict): extra CausalImpact arguments - should match the real fit
+        workers (int): number of processes (defaults to shared_pool.DEFAULT_WORKERS)
+        progress: called with (number done, total) after each placebo
+        stop_after (int): stop once this many placebos beat the real effect
+            (None to always run them all)
+        seed (int): which random placebo dates to use
+        backend (str): backend to fit with (defaults to the one ci was fitted with)
+    """
+    model_args = model_args or {}
+    backend = backend or getattr(ci, "backend", backends.DEFAULT_BACKEND)
+    real_effect = float(ci.summary_data["average"]["abs_effect"])
+
+    pre_data = ci.data.loc[ci.pre_period[0]:ci.pre_period[1]]
+    post_rows = len(ci.data.loc[ci.post_period[0]:ci.post_period[1]])
+
+    positions = placebo_positions(len(pre_data), post_rows, n_placebos, seed = seed)
+    if len(positions) == 0:
+        raise ValueError(f"""
+The period before the change isn't long enough for a placebo test.
+
+Each placebo needs a post period as long as the real one ({post_rows} rows) and
+some history before it, all before the real change.
+""")
+
+    outcomes = []
+    beaten = 0
+    stopped_early = False
+
+    def record(outcome: dict) -> None:
+        nonlocal beaten
+        outcomes.append(outcome)
+        if not outcome["error"] and abs(outcome["abs_effect"]) >= abs(real_effect):
+            beaten += 1
+        if progress is not None:
+            progress(len(outcomes), len(positions))
+
+    def enough() -> bool:
+        return stop_after is not None and beaten >= stop_after
+
+    # Placebos we've already fitted don't need the pool
+    to_fit = {}
+    for position in positions:
+        window, pre_dates, post_dates = _placebo_window(pre_data, int(position), post_rows)
+        key = _placebo_key(window, pre_dates, post_dates, model_args, backend)
+        outcome = placebo_cache.get(key)
+        if outcome is None:
+            to_fit[int(position)] = key
+        else:
+            record({**outcome, "cached": True})
+        if enough():
+            stopped_early = True
+            break
+
+    if to_fit and not stopped_early:
+        with shared_pool.shared_frame_pool(pre_data, model_args, workers) as pool:
+            futures = {
+                pool.submit(_fit_placebo, position, post_rows, backend): key
+                for position, key in to_fit.items()
+            }
+
+            for future in as_completed(futures):
+                outcome = future.result()
+                if not outcome["error"]:
+                    placebo_cache.put(futures[future], outcome)
+                record(outcome)
+
+                if enough():
+                    stopped_early = len(outcomes) < len(positions)
+                    # Anything still queued won't run (ones already
+                    # running are left to finish)
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    placebos = pd.DataFrame(outcomes).reindex(columns=RESULT_COLUMNS)
+    placebos = placebos.sort_values("date").reset_index(drop=True)
+    placebos["error"] = placebos["error"].fillna("")
+
+    return PlaceboResult(
+        real_effect = real_effect,
+        placebos = placebos,
+        p_value = empirical_p_value(real_effect, placebos["abs_effect"].to_numpy(dtype="float64"), stopped_early),
+        n_requested = len(positions),
+        stopped_early = stopped_early,
+    )
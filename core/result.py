@@ -0,0 +1,378 @@
+"""
+What we keep from a fitted model.
+
+A fitted CausalImpact object carries the statsmodels model and results and
+several copies of the data. ImpactResult keeps only what the app uses - the
+charts, the download, the summary/report text and the library's own plot -
+with the numbers held as two contiguous float64 arrays (the data and the
+inferences) sharing one DatetimeIndex. .data, .inferences, .pre_data and
+.post_data are DataFrames built on top of those arrays when they're asked
+for, so they don't cost any more memory.
+
+Results can be written as Arrow (to_arrow/from_arrow) or NPZ (to_npz/from_npz)
+- both are just the arrays plus a small JSON header, so they're fast to read
+and write and don't depend on pickling any library's classes.
+"""
+import io
+import json
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+# Bump if the serialised layout changes, so old copies are ignored rather than misread
+FORMAT_VERSION = 1
+
+_HEADER_KEY = b"impact_result"
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    # Results are shared between sessions, so nobody should change them in place
+    values = np.ascontiguousarray(values, dtype="float64")
+    values.flags.writeable = False
+    return values
+
+
+class ImpactResult:
+    """
+    Drop-in for a fitted CausalImpact object in the app - .data, .pre_data,
+    .post_data, .post_period, .inferences, .summary_data, .p_value, .summary()
+    and .plot() all behave the same.
+
+    The inferences have to cover the same rows as the data (they always do
+    here - the pre and post periods run from the first row to the last).
+    """
+    def __init__(
+            self,
+            index: pd.DatetimeIndex,
+            data_values: np.ndarray,
+            data_columns: list,
+            inference_values: np.ndarray,
+            inference_columns: list,
+            pre_period: list,
+            post_period: list,
+            alpha: float,
+            p_value: float,
+            summary_data: pd.DataFrame,
+            loglikelihood_burn: int,
+            summary_text: dict,
+            cache_key: str,
+            backend: str = "causalimpact",
+            fit_info: Optional[dict] = None,
+            forecast_state = None,
+        ):
+        self.index = index
+        self._data_values = _read_only(data_values)
+        self.data_columns = list(data_columns)
+        self._inference_values = _read_only(inference_values)
+        self.inference_columns = list(inference_columns)
+
+        self.pre_period = list(pre_period)
+        self.post_period = list(post_period)
+        self.alpha = float(alpha)
+        self.p_value = float(p_value)
+        self.summary_data = summary_data
+        # Only thing the library's plot needs from the trained model
+        self.loglikelihood_burn = int(loglikelihood_burn)
+        self.summary_text = summary_text
+
+        self.cache_key = cache_key
+        self.backend = backend
+        # Timings etc. from backends that keep them
+        self.fit_info = fit_info
+        # Lets a later upload with more post period rows carry on from this
+        # fit rather than refitting (see core.incremental)
+        self.forecast_state = forecast_state
+
+    @classmethod
+    def from_fit(cls, ci, cache_key: str, backend: str = "causalimpact", summary_only: bool = False) -> "ImpactResult":
+        """
+        Keeps what we need from a fitted model (from any of core.backends).
+
+        summary_only skips the forecast state for incremental updates and the
+        report text (summary() still works, it's just worked out when asked)
+        - for the many fits that only have their numbers read.
+        """
+        inferences = ci.inferences.reindex(ci.data.index)
+
+        from core import incremental
+        forecast_state = None
+        if not summary_only:
+            try:
+                forecast_state = incremental.forecast_state_from_fit(ci, key=cache_key)
+            except Exception as e:
+                # Only ever a speed up - never fail a fit because of it
+                print(f"Couldn't keep forecast state for incremental updates: {e}")
+
+        return cls(
+            index = ci.data.index,
+            data_values = ci.data.to_numpy(dtype="float64"),
+            data_columns = ci.data.columns,
+            inference_values = inferences.to_numpy(dtype="float64"),
+            inference_columns = inferences.columns,
+            pre_period = ci.pre_period,
+            post_period = ci.post_period,
+            alpha = ci.alpha,
+            p_value = ci.p_value,
+            summary_data = ci.summary_data,
+            loglikelihood_burn = ci.trained_model.filter_results.loglikelihood_burn,
+            summary_text = {} if summary_only else {
+                "summary": ci.summary("summary"),
+                "report": ci.summary("report"),
+            },
+            cache_key = cache_key,
+            backend = backend,
+            fit_info = getattr(ci, "fit_info", None),
+            forecast_state = forecast_state)
+
+    @property
+    def data(self) -> pd.DataFrame:
+        return pd.DataFrame(self._data_values, index=self.index, columns=self.data_columns, copy=False)
+
+    @property
+    def inferences(self) -> pd.DataFrame:
+        return pd.DataFrame(self._inference_values, index=self.index, columns=self.inference_columns, copy=False)
+
+    @property
+    def pre_data(self) -> pd.DataFrame:
+        return self.data.loc[self.pre_period[0]:self.pre_period[1]]
+
+    @property
+    def post_data(self) -> pd.DataFrame:
+        return self.data.loc[self.post_period[0]:self.post_period[1]]
+
+    @property
+    def nbytes(self) -> int:
+        return int(
+            self._data_values.nbytes
+            + self._inference_values.nbytes
+            + self.index.nbytes
+            + self.summary_data.memory_usage(deep=True).sum()
+            + sum(len(text) for text in self.summary_text.values())
+            )
+
+    @property
+    def trained_model(self):
+        return SimpleNamespace(
+            filter_results=SimpleNamespace(loglikelihood_burn=self.loglikelihood_burn)
+            )
+
+    def summary(self, output="summary", digits=2):
+        if digits == 2 and output in self.summary_text:
+            return self.summary_text[output]
+
+        from causalimpact.summary import Summary
+        return Summary.summary(self, output=output, digits=digits)
+
+    def plot(self, *args, **kwargs):
+        # The library's own plotting, run against the values we kept
+        from causalimpact.plot import Plot
+        return Plot.plot(self, *args, **kwargs)
+
+    def _get_plotter(self):
+        import matplotlib.pyplot as plt
+        return plt
+
+    def plot_png(self, dpi: int = 100, **kwargs) -> bytes:
+        """
+        The library's chart as PNG bytes. Drawn onto a Figure we own rather
+        than through pyplot, so it's safe with several sessions drawing at
+        once and nothing is left open afterwards.
+        """
+        from causalimpact.plot import Plot
+
+        plotter = _FigurePlotter()
+        Plot.plot(_PlotView(self, plotter), **kwargs)
+
+        buffer = io.BytesIO()
+        try:
+            plotter.fig.savefig(buffer, format="png", dpi=dpi)
+        finally:
+            plotter.close()
+
+        return buffer.getvalue()
+
+    def _header(self) -> dict:
+        return {
+            "version": FORMAT_VERSION,
+            "data_columns": [str(c) for c in self.data_columns],
+            "inference_columns": [str(c) for c in self.inference_columns],
+            "index_name": self.index.name,
+            "tz": str(self.index.tz) if self.index.tz is not None else None,
+            "pre_period": [str(d) for d in self.pre_period],
+            "post_period": [str(d) for d in self.post_period],
+            "alpha": self.alpha,
+            "p_value": self.p_value,
+            "summary_data": self.summary_data.to_dict(),
+            "loglikelihood_burn": self.loglikelihood_burn,
+            "summary_text": self.summary_text,
+            "cache_key": self.cache_key,
+            "backend": self.backend,
+            "fit_info": self.fit_info,
+        }
+
+    @classmethod
+    def _from_header(cls, header: dict, index_values: np.ndarray, data_values: np.ndarray, inference_values: np.ndarray) -> Optional["ImpactResult"]:
+        if header.get("version") != FORMAT_VERSION:
+            return None
+
+        index = pd.DatetimeIndex(index_values.view("datetime64[ns]"), name=header["index_name"])
+        if header["tz"] is not None:
+            index = index.tz_localize("UTC").tz_convert(header["tz"])
+
+        return cls(
+            index = index,
+            data_values = data_values,
+            data_columns = header["data_columns"],
+            inference_values = inference_values,
+            inference_columns = header["inference_columns"],
+            pre_period = [pd.Timestamp(d) for d in header["pre_period"]],
+            post_period = [pd.Timestamp(d) for d in header["post_period"]],
+            alpha = header["alpha"],
+            p_value = header["p_value"],
+            summary_data = pd.DataFrame(header["summary_data"]),
+            loglikelihood_burn = header["loglikelihood_burn"],
+            summary_text = header["summary_text"],
+            cache_key = header["cache_key"],
+            backend = header["backend"],
+            fit_info = header["fit_info"])
+
+    def to_arrow(self) -> bytes:
+        """
+        Arrow stream with a column for the index and each data and
+        inference column, and everything else in the schema metadata.
+        Doesn't include the forecast state for incremental updates.
+        """
+        columns = {"index": pa.array(self.index.asi8)}
+        for position, name in enumerate(self.data_columns):
+            columns[f"data:{name}"] = pa.array(self._data_values[:, position])
+        for position, name in enumerate(self.inference_columns):
+            columns[f"inferences:{name}"] = pa.array(self._inference_values[:, position])
+
+        table = pa.table(columns).replace_schema_metadata({
+            _HEADER_KEY: json.dumps(self._header(), default=str).encode()})
+
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+    @classmethod
+    def from_arrow(cls, payload: bytes) -> Optional["ImpactResult"]:
+        """
+        Reads back to_arrow's bytes (None if they're from another version)
+        """
+        table = pa.ipc.open_stream(payload).read_all()
+        header = json.loads(table.schema.metadata[_HEADER_KEY])
+
+        def stack(prefix: str, names: list) -> np.ndarray:
+            if not names:
+                return np.empty((table.num_rows, 0))
+            return np.column_stack([table.column(f"{prefix}:{name}").to_numpy() for name in names])
+
+        return cls._from_header(
+            header,
+            index_values = table.column("index").to_numpy(),
+            data_values = stack("data", header["data_columns"]),
+            inference_values = stack("inferences", header["inference_columns"]))
+
+    def to_npz(self, include_forecast_state: bool = False) -> bytes:
+        """
+        Uncompressed NPZ of the index and the two arrays, with everything
+        else as JSON. The forecast state for incremental updates is only
+        included if asked for.
+        """
+        header = self._header()
+        arrays = {}
+
+        if include_forecast_state and self.forecast_state is not None:
+            # Arrays saved alongside the others, everything else in the header
+            header["forecast_state"] = {}
+            for name, value in vars(self.forecast_state).items():
+                if isinstance(value, np.ndarray):
+                    arrays[f"forecast_{name}"] = value
+                else:
+                    header["forecast_state"][name] = value.item() if isinstance(value, np.generic) else value
+
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            header = np.array(json.dumps(header, default=str)),
+            index = self.index.asi8,
+            data = self._data_values,
+            inferences = self._inference_values,
+            **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_npz(cls, payload: bytes) -> Optional["ImpactResult"]:
+        with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+            header = json.loads(str(arrays["header"]))
+            result = cls._from_header(
+                header,
+                index_values = arrays["index"],
+                data_values = arrays["data"],
+                inference_values = arrays["inferences"])
+
+            if result is not None and "forecast_state" in header:
+                from core.incremental import ForecastState
+                state = dict(header["forecast_state"])
+                for name in arrays.files:
+                    if name.startswith("forecast_"):
+                        state[name[len("forecast_"):]] = arrays[name]
+                result.forecast_state = ForecastState(**state)
+
+        return result
+
+
+class _FigurePlotter:
+    """
+    Just enough of pyplot for the library's Plot.plot, drawing onto a
+    single Figure with the Agg canvas instead of pyplot's global figures
+    """
+    def __init__(self):
+        self.fig = None
+
+    def figure(self, figsize=None):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        return self.fig
+
+    def subplot(self, *args, **kwargs):
+        return self.fig.add_subplot(*args, **kwargs)
+
+    @staticmethod
+    def setp(*args, **kwargs):
+        from matplotlib.artist import setp
+        return setp(*args, **kwargs)
+
+    def show(self):
+        # Nothing to show - the figure gets saved instead
+        pass
+
+    def close(self):
+        if self.fig is not None:
+            self.fig.clear()
+            self.fig = None
+
+
+class _PlotView:
+    """
+    A fitted result with its own plotter, so a result shared between
+    sessions never has the plotter swapped out from under it
+    """
+    def __init__(self, result, plotter):
+        self._result = result
+        self._plotter = plotter
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+    def _get_plotter(self):
+        return self._plotter
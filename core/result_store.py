@@ -0,0 +1,216 @@
+"""
+Fitted results shared between app replicas.
+
+core.cache keeps fits for one process (and its disk). When several copies of
+the app run behind a load balancer, a result store lets them reuse each
+other's fits. It's set with the CI_RESULT_STORE environment variable:
+
+    sqlite:///path/to/results.db    a SQLite file (e.g. on a shared volume)
+    redis://host:6379/0             Redis, or anything that speaks its protocol
+
+Results are stored compactly rather than pickled (ImpactResult.to_arrow - the
+data and inferences as Arrow columns, with the report text and settings as
+JSON) keyed by cache.fingerprint. Entries expire after CI_RESULT_STORE_TTL
+seconds, and the least recently used are removed once the store is over
+CI_RESULT_STORE_MAX_BYTES.
+
+Stores only ever speed things up - if one can't be reached the app just fits.
+"""
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from core.result import ImpactResult
+
+
+DEFAULT_TTL_SECONDS = int(os.getenv("CI_RESULT_STORE_TTL", 7 * 24 * 60 * 60))
+DEFAULT_MAX_BYTES = int(os.getenv("CI_RESULT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+class ResultStore:
+    """
+    Somewhere to keep serialised results by key. Subclasses provide
+    get_bytes and put_bytes and deal with expiry and eviction.
+    """
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, payload: bytes) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[ImpactResult]:
+        try:
+            payload = self.get_bytes(key)
+            return None if payload is None else ImpactResult.from_arrow(payload)
+        except Exception as e:
+            print(f"Couldn't read {key} from the result store: {e}")
+            return None
+
+    def put(self, key: str, result: ImpactResult) -> None:
+        try:
+            self.put_bytes(key, result.to_arrow())
+        except Exception as e:
+            print(f"Couldn't write {key} to the result store: {e}")
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    Results in a SQLite file. Safe to share between processes (and
+    machines, if the file's on a volume they can all lock).
+    """
+    def __init__(self, path: str, ttl_seconds: int = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection per call so it's safe from any thread
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT payload FROM results WHERE key = ? AND created > ?",
+                (key, now - self.ttl_seconds)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put_bytes(self, key: str, payload: bytes) -> None:
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, payload, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(payload), len(payload), now, now))
+            self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        connection.execute("DELETE FROM results WHERE created <= ?", (now - self.ttl_seconds,))
+
+        total_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Least recently used first
+        to_remove = []
+        for key, size in connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total_bytes <= self.max_bytes:
+                break
+            to_remove.append((key,))
+            total_bytes -= size
+        connection.executemany("DELETE FROM results WHERE key = ?", to_remove)
+
+
+class RedisResultStore(ResultStore):
+    """
+    Results in Redis (or anything with the same commands). client is a
+    redis.Redis - or a stand-in with the same methods.
+
+    Redis expires entries itself. A sorted set of when each entry was last
+    used and a hash of their sizes let us remove the least recently used
+    ones once the store's over max_bytes.
+    """
+    def __init__(self, client, prefix: str = "causal_impact:", ttl_seconds: int = DEFAULT_TTL_SECONDS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.client = client
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        self._last_used = f"{prefix}last_used"
+        self._sizes = f"{prefix}sizes"
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}result:{key}"
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        payload = self.client.get(self._key(key))
+        if payload is None:
+            # Expired - stop counting it
+            self._forget([key])
+            return None
+
+        self.client.zadd(self._last_used, {key: time.time()})
+        return payload
+
+    def put_bytes(self, key: str, payload: bytes) -> None:
+        self.client.set(self._key(key), payload, ex=self.ttl_seconds)
+        self.client.zadd(self._last_used, {key: time.time()})
+        self.client.hset(self._sizes, key, len(payload))
+        self._evict()
+
+    def _forget(self, keys: list) -> None:
+        if not keys:
+            return
+        self.client.zrem(self._last_used, *keys)
+        self.client.hdel(self._sizes, *keys)
+
+    def _evict(self) -> None:
+        # Anything not used for longer than the TTL has expired by now
+        expired = self.client.zrangebyscore(self._last_used, 0, time.time() - self.ttl_seconds)
+        self._forget([_text(key) for key in expired])
+
+        sizes = {_text(key): int(size) for key, size in self.client.hgetall(self._sizes).items()}
+        total_bytes = sum(sizes.values())
+
+        while total_bytes > self.max_bytes:
+            oldest = self.client.zrange(self._last_used, 0, 0)
+            if not oldest:
+                break
+            key = _text(oldest[0])
+            self.client.delete(self._key(key))
+            self._forget([key])
+            total_bytes -= sizes.get(key, 0)
+
+
+def _text(value) -> str:
+    # Redis hands back bytes
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def open_store(url: str) -> Optional[ResultStore]:
+    """
+    The store a CI_RESULT_STORE style url points at (None for "")
+    """
+    if not url:
+        return None
+
+    if url.startswith("sqlite:///"):
+        return SQLiteResultStore(url[len("sqlite:///"):])
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise ValueError(f"""
+CI_RESULT_STORE points at Redis but the redis package isn't installed ({e}).
+
+Install it with pip install redis, or unset CI_RESULT_STORE.
+""")
+        return RedisResultStore(redis.Redis.from_url(url))
+
+    raise ValueError(f"""
+Don't know what kind of result store CI_RESULT_STORE={url} is.
+
+Use sqlite:///path/to/results.db or redis://host:port/db
+""")
+
+
+# Shared by every session in this process (None unless CI_RESULT_STORE is set)
+result_store = open_store(os.getenv("CI_RESULT_STORE", ""))
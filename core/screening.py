@@ -0,0 +1,157 @@
+"""
+Ranking candidate regressor columns before fitting.
+
+Good regressors move with the target before the change (same day, or a few
+days ahead of it), actually vary, and aren't full of gaps. This works out
+all of that for every candidate column at once with a handful of matrix
+operations, so it stays quick even with hundreds of columns:
+
+- correlation with the target on the same day
+- the strongest correlation with the target up to max_lag days later
+- variance and share of missing values
+
+Only use rows from before the change - regressors are meant to be
+unaffected by it, and we can't check that with rows from after.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_MAX_LAG = 7
+DEFAULT_TOP_K = 5
+
+# More than this share of gaps and a column isn't suggested at all
+MAX_MISSING_SHARE = 0.2
+
+# Columns this close to the target are probably the target (or made from
+# it), not something that explains it
+MAX_ABS_CORRELATION = 0.999
+
+SCREENING_COLUMNS = [
+    "column", "correlation", "best_lag", "best_lag_correlation",
+    "variance", "missing_share", "score", "note",
+]
+
+
+def _standardise(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Centres and scales each column ignoring gaps, then fills the gaps with 0
+    (the column's mean) so they don't add to any correlation.
+    Returns the standardised values, the variances and the missing shares.
+    """
+    missing = np.isnan(values)
+    counts = (~missing).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.nansum(values, axis=0) / counts
+        centred = np.where(missing, 0.0, values - means)
+        variances = (centred ** 2).sum(axis=0) / counts
+        scaled = centred / np.sqrt(variances)
+
+    scaled[:, ~(variances > 0)] = 0.0
+    return scaled, variances, missing.mean(axis=0)
+
+
+def screen_regressors(
+        target: np.ndarray,
+        candidates: np.ndarray,
+        names: list,
+        max_lag: int = DEFAULT_MAX_LAG,
+    ) -> pd.DataFrame:
+    """
+    Scores every candidate column (one per column of candidates, in date
+    order) against the target, best first.
+
+    Lagged correlations are between a candidate and the target lag rows
+    later - a candidate that moves a few days ahead of the target is as
+    useful as one that moves with it. The score is the strongest absolute
+    correlation at any lag, scaled down by the share of missing values.
+    """
+    target = np.asarray(target, dtype="float64")
+    candidates = np.asarray(candidates, dtype="float64").reshape(len(target), -1)
+
+    # Rows without a target can't tell us anything
+    has_target = ~np.isnan(target)
+    target = target[has_target]
+    candidates = candidates[has_target]
+    n_rows = len(target)
+
+    max_lag = max(0, min(max_lag, n_rows - 2))
+
+    x, variances, missing_share = _standardise(candidates)
+    y, _, _ = _standardise(target[:, None])
+    y = y[:, 0]
+
+    # Column lag of this holds the target lag rows later (zero past the end),
+    # so one matrix product gives every column's correlation at every lag
+    shifted = np.zeros((n_rows, max_lag + 1))
+    for lag in range(max_lag + 1):
+        shifted[:n_rows - lag, lag] = y[lag:]
+
+    correlations = (x.T @ shifted) / (n_rows - np.arange(max_lag + 1))
+
+    best_lag = np.abs(correlations).argmax(axis=1)
+    best_lag_correlation = correlations[np.arange(len(names)), best_lag]
+    score = np.abs(best_lag_correlation) * (1 - missing_share)
+
+    results = pd.DataFrame({
+        "column": list(names),
+        "correlation": correlations[:, 0],
+        "best_lag": best_lag,
+        "best_lag_correlation": best_lag_correlation,
+        "variance": variances,
+        "missing_share": missing_share,
+        "score": score,
+    })
+
+    results["note"] = np.select(
+        [
+            ~(variances > 0),
+            missing_share > MAX_MISSING_SHARE,
+            np.abs(correlations[:, 0]) >= MAX_ABS_CORRELATION,
+        ],
+        [
+            "Doesn't change",
+            "Too many missing values",
+            "Identical to the target",
+        ],
+        default = "")
+
+    return results.sort_values("score", ascending=False).reset_index(drop=True)
+
+
+def screen_frame(
+        df: pd.DataFrame,
+        date_col: str,
+        target_col: str,
+        candidate_cols: list,
+        before = None,
+        max_lag: int = DEFAULT_MAX_LAG,
+    ) -> pd.DataFrame:
+    """
+    screen_regressors for a DataFrame straight from the upload - sorts it
+    by date and, if before is given, only uses rows from before that date
+    """
+    dates = pd.to_datetime(df[date_col], errors="coerce", utc=True)
+    order = np.argsort(dates.to_numpy(), kind="stable")
+
+    if before is not None:
+        keep = (dates < pd.Timestamp(before, tz="UTC")).to_numpy()[order]
+        order = order[keep]
+
+    candidate_cols = [col for col in candidate_cols if col not in (date_col, target_col)]
+    target = pd.to_numeric(df[target_col], errors="coerce").to_numpy(dtype="float64")[order]
+    candidates = np.empty((len(order), len(candidate_cols)))
+    for i, col in enumerate(candidate_cols):
+        candidates[:, i] = df[col].to_numpy(dtype="float64", na_value=np.nan)[order]
+
+    return screen_regressors(target, candidates, candidate_cols, max_lag = max_lag)
+
+
+def suggest_regressors(screening: pd.DataFrame, top_k: int = DEFAULT_TOP_K) -> list:
+    """
+    The top_k best scoring columns that don't have a problem noted
+    """
+    usable = screening[(screening["note"] == "") & (screening["score"] > 0)]
+    return list(usable["column"].head(top_k))
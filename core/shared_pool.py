@@ -0,0 +1,107 @@
+"""
+Process pools for running lots of fits against the same data.
+
+The data is put in shared memory once and each worker attaches to it when
+it starts, so tasks only need to send what's different about each fit
+(e.g. a date) rather than pickling the whole frame every time.
+
+    with shared_frame_pool(data_for_ci, model_args) as pool:
+        futures = [pool.submit(some_task, date) for date in dates]
+
+Tasks get the data and model arguments with worker_data() and worker_model_args().
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Processes per pool unless asked for - they're forked from the app's
+# server for every scan or placebo test, so don't take every CPU by default
+DEFAULT_WORKERS = int(os.getenv("CI_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Set in each worker by _attach
+_data: Optional[pd.DataFrame] = None
+_model_args: dict = {}
+_blocks: list = []
+
+
+def _to_shared_memory(array: np.ndarray) -> tuple[shared_memory.SharedMemory, tuple]:
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _from_shared_memory(description: tuple) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _attach(values_description, index_description, columns, tz, model_args) -> None:
+    """
+    Worker initializer - builds the data frame on top of the shared memory
+    without copying it
+    """
+    global _data, _model_args
+
+    values_block, values = _from_shared_memory(values_description)
+    index_block, index_values = _from_shared_memory(index_description)
+    # Keep the blocks open for as long as the worker lives
+    _blocks.extend([values_block, index_block])
+
+    index = pd.DatetimeIndex(index_values.view("datetime64[ns]"), name="time")
+    if tz is not None:
+        index = index.tz_localize("UTC").tz_convert(tz)
+
+    _data = pd.DataFrame(values, index=index, columns=columns, copy=False)
+    _model_args = model_args
+
+
+def worker_data() -> pd.DataFrame:
+    return _data
+
+
+def worker_model_args() -> dict:
+    return _model_args
+
+
+@contextmanager
+def shared_frame_pool(
+        data_for_ci: pd.DataFrame,
+        model_args: Optional[dict] = None,
+        workers: Optional[int] = None,
+    ):
+    """
+    ProcessPoolExecutor whose workers all see data_for_ci (numbers with a
+    DatetimeIndex) through shared memory. The memory is freed when the pool closes.
+    """
+    values = np.ascontiguousarray(data_for_ci.to_numpy(dtype="float64"))
+    index_values = np.ascontiguousarray(data_for_ci.index.asi8)
+
+    blocks = []
+    try:
+        values_block, values_description = _to_shared_memory(values)
+        blocks.append(values_block)
+        index_block, index_description = _to_shared_memory(index_values)
+        blocks.append(index_block)
+
+        with ProcessPoolExecutor(
+                max_workers = workers or DEFAULT_WORKERS,
+                initializer = _attach,
+                initargs = (
+                    values_description,
+                    index_description,
+                    list(data_for_ci.columns),
+                    str(data_for_ci.index.tz) if data_for_ci.index.tz is not None else None,
+                    model_args or {}),
+            ) as pool:
+            yield pool
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -0,0 +1,164 @@
+"""
+Scanning a range of candidate intervention dates.
+
+Fits a Causal Impact model for every candidate date (each one using the data
+before it as the pre-period and everything from it onwards as the post
+period) across a pool of processes, and returns one row of results per date.
+
+The data is the same for every fit, so it's shared with the workers through
+core.shared_pool - tasks only send a date.
+
+Each date's row of results is cached (sweep_cache), but not the fits
+themselves - hundreds of scan fits would push the user's real fits out of
+the main cache and the shared result store.
+"""
+import hashlib
+import os
+import time
+from concurrent.futures import as_completed
+from typing import Callable, Optional
+
+import pandas as pd
+
+from core import cache, fitting, periods, shared_pool
+
+
+# Fewer rows than this either side of a date and the fit isn't worth much
+MIN_ROWS_EACH_SIDE = 3
+
+RESULT_COLUMNS = [
+    "date",
+    "abs_effect", "abs_effect_lower", "abs_effect_upper",
+    "rel_effect", "rel_effect_lower", "rel_effect_upper",
+    "p_value", "post_rows", "fit_seconds", "error",
+]
+
+# Only the numbers we need from each date, kept between runs so scanning
+# again (or a wider range) only fits the new dates
+sweep_cache = cache.ImpactCache(
+    cache_dir = os.path.join(cache.DEFAULT_CACHE_DIR, "sweep"),
+    max_memory_entries = 2000,
+    max_disk_bytes = 20 * 1024 * 1024,
+    dumps = cache.outcome_to_bytes,
+    loads = cache.outcome_from_bytes,
+    suffix = ".json")
+
+# Scan fits themselves aren't worth caching - they'd push real fits out
+_no_cache = cache.ImpactCache(cache_dir=None, max_memory_entries=0)
+
+
+def _fit_date(date: pd.Timestamp) -> dict:
+    """
+    Fits one candidate date against the shared data. Never raises - problems
+    are returned in the "error" field so the rest of the scan carries on.
+    """
+    return fit_date(shared_pool.worker_data(), date, shared_pool.worker_model_args())
+
+
+def fit_date(data_for_ci: pd.DataFrame, date: pd.Timestamp, model_args: Optional[dict] = None) -> dict:
+    start = time.perf_counter()
+    outcome = {"date": date, "error": ""}
+
+    try:
+        position = data_for_ci.index.searchsorted(date)
+        if position < MIN_ROWS_EACH_SIDE or len(data_for_ci) - position < MIN_ROWS_EACH_SIDE:
+            raise ValueError(f"Needs at least {MIN_ROWS_EACH_SIDE} rows before and after the date")
+
+        index = data_for_ci.index
+        ci = fitting.fit_impact(
+            data_for_ci = data_for_ci,
+            pre_dates = [index[0], index[position - 1]],
+            post_dates = [index[position], index[-1]],
+            model_args = model_args,
+            impact_cache = _no_cache,
+            summary_only = True)
+
+        average = ci.summary_data["average"]
+        cumulative = ci.summary_data["cumulative"]
+        outcome.update({
+            "abs_effect": cumulative["abs_effect"],
+            "abs_effect_lower": cumulative["abs_effect_lower"],
+            "abs_effect_upper": cumulative["abs_effect_upper"],
+            "rel_effect": average["rel_effect"],
+            "rel_effect_lower": average["rel_effect_lower"],
+            "rel_effect_upper": average["rel_effect_upper"],
+            "p_value": ci.p_value,
+            "post_rows": len(index) - position,
+        })
+
+    except Exception as e:
+        outcome["error"] = str(e).strip()
+
+    outcome["fit_seconds"] = round(time.perf_counter() - start, 3)
+    return outcome
+
+
+def candidate_dates(data: pd.DataFrame, start, end, every: int = 1) -> list[pd.Timestamp]:
+    """
+    Dates in the data's "time" column between start and end (inclusive),
+    taking every nth one
+    """
+    times = pd.DatetimeIndex(data["time"])
+    start = pd.Timestamp(start, tz=times.tz)
+    end = pd.Timestamp(end, tz=times.tz)
+    return list(times[(times >= start) & (times <= end)][::every])
+
+
+def sweep_dates(
+        data: pd.DataFrame,
+        regressor_col_list: list,
+        dates: list,
+        model_args: Optional[dict] = None,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> pd.DataFrame:
+    """
+    Fits a model for every date in dates and returns a table with the
+    effect, its interval and the p-value for each one (in date order).
+
+    Args:
+        data: checked data (with "time", "y" and regressor columns)
+        regressor_col_list (list): regressor columns
+        dates (list): candidate intervention dates, e.g. from candidate_dates
+        model_args (dict): extra CausalImpact arguments
+        workers (int): number of processes (defaults to shared_pool.DEFAULT_WORKERS)
+        progress: called with (number done, total) after each fit
+    """
+    if not dates:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    # Same shaping as a normal run - where the test period starts
+    # doesn't matter here, each fit sets its own
+    data_for_ci, _, _ = periods.prepare_data_for_ci(
+        periods.split_test_period(data, dates[0]),
+        regressor_col_list = regressor_col_list)
+
+    # Dates already scanned against the same data and settings don't need the pool
+    data_key = cache.fingerprint(data_for_ci, [], [], model_args)
+    outcomes = []
+    to_fit = {}
+    for date in dates:
+        key = "sweep_" + hashlib.sha256(f"{data_key}{pd.Timestamp(date).isoformat()}".encode()).hexdigest()
+        outcome = sweep_cache.get(key)
+        if outcome is None:
+            to_fit[date] = key
+        else:
+            outcomes.append(outcome)
+
+    if progress is not None and outcomes:
+        progress(len(outcomes), len(dates))
+
+    if to_fit:
+        with shared_pool.shared_frame_pool(data_for_ci, model_args, workers) as pool:
+            futures = {pool.submit(_fit_date, date): key for date, key in to_fit.items()}
+
+            for future in as_completed(futures):
+                outcome = future.result()
+                if not outcome["error"]:
+                    sweep_cache.put(futures[future], outcome)
+                outcomes.append(outcome)
+                if progress is not None:
+                    progress(len(outcomes), len(dates))
+
+    results = pd.DataFrame(outcomes).reindex(columns=RESULT_COLUMNS)
+    return results.sort_values("date").reset_index(drop=True)
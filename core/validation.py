@@ -0,0 +1,453 @@
+"""
+Checking and converting uploaded data so it's ready for Causal Impact.
+
+Nothing in here touches Streamlit - anything that needs the user's input
+(like agreeing to reorder their data) is passed in.
+"""
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+from typing import Callable, Optional, Tuple
+from core import instrument
+
+
+# How many checked uploads to keep, shared by every session
+DEFAULT_MEMO_ENTRIES = int(os.getenv("CI_VALIDATION_MEMO_ENTRIES", 8))
+
+def check_time_series_continuity(df, freq='D'):
+    """
+    Checks if a DataFrame indexed by datetime is continuous without gaps larger than the given frequency.
+
+    Parameters:
+    - df: pd.DataFrame with DateTimeIndex.
+    - freq: str, frequency string in pandas offset alias (e.g., 'D' for daily, 'H' for hourly).
+
+    Returns:
+    - is_continuous: bool, True if the time series is continuous without gaps larger than the specified frequency.
+    - missing_periods: pd.DatetimeIndex, the start of missing periods if any.
+    """
+    expected_range = pd.date_range(start=df.index.min(), end=df.index.max(), freq=freq)
+    missing_periods = expected_range.difference(df.index)
+    
+    is_continuous = missing_periods.empty
+
+    if not is_continuous:
+        raise ValueError(f"""
+Your date column has gaps between dates, you need to include a row for every single date between the start and the end.
+                         
+Missing periods start at: {missing_periods}""")
+
+
+def check_columns(df):
+    """
+    Function to check if all of the column names are unique
+    """
+    check_column_names(df.columns)
+
+
+def check_column_names(df_cols):
+    """
+    Same as check_columns, but just needs the names - so we can check
+    files before reading any of the data out of them
+    """
+
+    if len(df_cols) != len(list(set(df_cols))):
+        # If the deduped list doesn't match the 
+        # non-deduped list some of the column names
+        # are identical and that will cause problems
+        raise ValueError("""
+                         
+Sorry - it looks like you've uploaded data which has duplicate column
+names, please check your csv, make sure each column has a unique name
+then refresh the page and try again. Thanks!                         
+                         
+""")
+
+
+def date_col_conversion(
+        df: pd.DataFrame, 
+        date_col: str
+        )-> pd.DataFrame:
+
+    try:
+        df["time"] = pd.to_datetime(df[date_col], format="%Y-%m-%d", utc=True)
+        df = df.rename(columns={date_col:"ds"}, inplace = False)
+    except Exception as e:
+        raise ValueError(f"There was a problem with reading your date column ({date_col}) - please make sure you've selected the right one, and that all the dates are in YYYY-MM-DD format")
+    
+    return df
+
+
+def check_for_data_blocks(
+        row,
+        target_column: str,
+        date_column: str,
+        list_of_empties: list,
+        regressor_column_list: list[str],
+    ):
+    """
+    check_for_data_blocks 
+
+    This function uses the mutable nature of a list so
+    we can loop through every row in a dataframe and count
+    the number of blanks but ALSO do some checks, i.e.
+    
+    - Make sure that there aren't gaps 
+        (essentially we should see ONLY filled 
+        rows until the first empty row, and then we 
+        should see ONLY empty rows from then until the end). 
+    - Check if there are at least a few empty 'target_column' 
+        rows at the end of our data, if so that's our forecast
+        window, if not we assume we have to generate the forecast window
+    - Check if there are any regressor columns with empty spaces
+        if so that'll cause Prophet to fail so we need to give a 
+        clear and direct error message now so people know what to fix
+    - Check if there are any empty cells in the date column
+        if so that'll cause Prophet to fail so again we need a 
+        clear and direct error message
+
+    Args:
+        row (DataFrame row): the row of the dataframe we're checking
+        target_column (str): the name of the column we're checking
+        date_column (str): the name of the column we'll record in the empty rows list
+        list_of_empties (list): a list of dates for the empty rows
+        regressor_column_list (list[str]): list of regressor columns to check to make sure they're not N/A
+    """
+
+
+
+    # Check if the date column is unexpectedly blank
+    if pd.isna(row[date_column]) or row[date_column]=="":
+        raise ValueError(_blank_date_message(row.name, date_column))
+
+    date_value = row[date_column]
+
+
+    # check if any of the regressor columns are unexpectedly blank
+    for c in regressor_column_list:
+        if pd.isna(row[c]) or row[c]=="":
+            raise ValueError(_blank_regressor_message(date_value, c))
+
+    value = row[target_column]
+    if value == "" or pd.isna(value):
+        raise ValueError(_blank_target_message(date_value, target_column))
+    
+    else:
+        # Check we haven't had any empties before now
+        if len(list_of_empties)> 0:
+            raise ValueError(_filled_after_empty_message(date_value, target_column, list_of_empties))
+
+
+def _blank_mask(series: pd.Series) -> np.ndarray:
+    """
+    Boolean mask of the cells in a column that count as blank,
+    i.e. N/A or an empty string
+    """
+    mask = series.isna().to_numpy()
+
+    # Numeric and date columns can't hold empty strings so only
+    # text-like columns need the (slower) string comparison
+    if not (
+        pd.api.types.is_numeric_dtype(series)
+        or pd.api.types.is_datetime64_any_dtype(series)
+        or pd.api.types.is_bool_dtype(series)
+        ):
+        mask |= (series == "").to_numpy()
+
+    return mask
+
+
+def check_data_blocks(
+        df: pd.DataFrame,
+        target_column: str,
+        date_column: str,
+        regressor_column_list: list[str],
+    ):
+    """
+    check_data_blocks
+
+    Column-at-a-time version of check_for_data_blocks. Rather than
+    calling Python for every cell we build one boolean "blank" mask
+    per column, combine them, and use argmax to jump straight to the
+    first row that has a problem. Which error is raised (and the row/
+    date it mentions) is exactly what the row-by-row version would
+    raise, because within a row the checks are applied in the same
+    order:
+
+    - Date column blank
+    - Any regressor column blank (in regressor_column_list order)
+    - Target column blank
+
+    The "filled-then-empty" block rule is covered by the last check -
+    the first empty target row raises before any later filled row
+    can be reached.
+
+    Args:
+        df (DataFrame): the dataframe we're checking
+        target_column (str): the name of the column we're checking
+        date_column (str): the name of the column we'll report dates from
+        regressor_column_list (list[str]): list of regressor columns to check to make sure they're not N/A
+    """
+
+    if len(df) == 0:
+        return
+
+    date_blank = _blank_mask(df[date_column])
+    target_blank = _blank_mask(df[target_column])
+
+    if regressor_column_list:
+        regressor_blanks = np.column_stack(
+            [_blank_mask(df[c]) for c in regressor_column_list]
+            )
+    else:
+        regressor_blanks = np.zeros((len(df), 0), dtype=bool)
+
+    any_regressor_blank = regressor_blanks.any(axis=1)
+
+    problem_rows = date_blank | any_regressor_blank | target_blank
+
+    if not problem_rows.any():
+        return
+
+    # Position of the first row with any problem in it
+    first_problem = int(problem_rows.argmax())
+
+    if date_blank[first_problem]:
+        raise ValueError(_blank_date_message(df.index[first_problem], date_column))
+
+    date_value = df[date_column].iloc[first_problem]
+
+    if any_regressor_blank[first_problem]:
+        first_blank_regressor = regressor_column_list[
+            int(regressor_blanks[first_problem].argmax())
+            ]
+        raise ValueError(_blank_regressor_message(date_value, first_blank_regressor))
+
+    raise ValueError(_blank_target_message(date_value, target_column))
+
+
+def _blank_date_message(row_label, date_column: str) -> str:
+    return f"""
+
+It looks like you have a row which has data in it but doesn't have a value
+in the date column ({date_column}). Try checking row {row_label} and make sure
+the date column is filled (and check the rest of the date column while you're at it!)                         
+
+Then refresh this page and try uploading your data again.
+                         
+"""
+
+
+def _blank_regressor_message(date_value, regressor_column: str) -> str:
+    return f"""
+When you're using regressor columns - you have to put a value in every single row
+for the regressors. In the row for {date_value} your regressor column {regressor_column} is empty. 
+Other rows and columns might have the same issue so please check your data, refresh this page
+and try again."""
+
+
+def _blank_target_message(date_value, target_column: str) -> str:
+    return f"""
+                             
+You have gaps in your data - when we checked your data, column: {target_column}
+has an empty row for {date_value} and may have more missing data.
+
+To avoid errors - fix your data (so you have a value in your target column for every
+historic date.
+
+"""
+
+
+def _filled_after_empty_message(date_value, target_column: str, list_of_empties: list) -> str:
+    return f"""
+                             
+You have gaps in your data - when we checked your data, column: {target_column}
+has an entry for date {date_value} but is missing values for {len(list_of_empties)} 
+preceding dates. Here are {min(10,len(list_of_empties))} examples of dates with missing data:
+{list_of_empties[:10]}.
+
+To avoid errors - fix your data (so you have a value in your target column for every
+historic date, and an empty row for every date you want to forecast), reload this page
+and reupload your data.
+
+"""
+
+
+UNORDERED_DATA_MESSAGE = """
+The data you uploaded isn't in date order. Do you want to continue?
+                              
+If you click 'yes' we'll automatically reorder your data for you. 
+
+If you want to start again - reload the page.
+
+"""
+
+
+def always_reorder(message: str) -> bool:
+    return True
+
+
+def check_ordering(
+        df: pd.DataFrame,
+        confirm_reorder: Callable[[str], Optional[bool]] = always_reorder,
+        ) -> Tuple[pd.DataFrame, bool]:
+    """
+    Makes sure the data is in date order. If it isn't, confirm_reorder is
+    called with a message explaining why - if it returns something truthy
+    the data is sorted, otherwise we report that we shouldn't continue.
+    """
+
+    should_continue = True # Default assumption is no issues
+
+    print(f"Available cols: {df.columns}")
+
+    
+    # Check the dataframe is ordered correctly
+    date_ordered = df["ds"].is_monotonic_increasing
+
+    if not date_ordered:
+        should_continue = confirm_reorder(UNORDERED_DATA_MESSAGE)
+        if should_continue:
+            df = df.sort_values("ds").reset_index().drop(columns=["index"])
+
+    print(f"Should continue: {should_continue}") 
+
+    return df, should_continue
+
+
+def columns_to_numbers(df, _col, col_name):
+    """
+    Function to convert columns to numbers to avoid unexpected errors later
+    """
+    # Already numbers (e.g. converted when the file was read) - keep
+    # the dtype so compact float32 columns stay compact
+    if pd.api.types.is_float_dtype(df[_col]):
+        return
+
+    # Convert Y and regressor cols to numbers to avoid errors
+    try:
+        df[_col] = df[_col].astype(float)
+    except Exception as e:
+
+        try:
+            # Try removing commas
+            df[_col] = df[_col].str.replace(',', '').astype(float)
+        except Exception as f:
+            print(f"Exception 1: {e}")
+            print(f"Exception 2: {f}")
+            raise ValueError(f"""
+Error converting the data in your target column '{col_name}' to numbers. 
+
+Please check your '{col_name}' column and make sure there's only numbers (or blank cells) in that column.""")
+
+def convert_and_check_data(
+        df: pd.DataFrame, 
+        date_col: str, 
+        target_col: str,
+        regressor_cols: list,
+        confirm_reorder: Callable[[str], Optional[bool]] = always_reorder,
+        ) -> Tuple[pd.DataFrame, bool]:
+    """
+    Converts the date, target and regressor columns and runs all of the
+    checks on them.
+
+    Returns the converted data and whether we should continue with it
+    (False if confirm_reorder didn't agree to us reordering the data).
+    """
+
+    # First convert date column and create expected ds column
+    with instrument.span("conversion", step="dates", rows=len(df)):
+        df = date_col_conversion(df = df, date_col = date_col)
+
+
+    # Then check ordering
+    with instrument.span("validation", step="ordering", rows=len(df)):
+        df, ordering_should_continue = check_ordering(
+            df=df,
+            confirm_reorder=confirm_reorder)
+    
+
+    # Only do the rest of this if we should continue
+    if not ordering_should_continue:
+        return df, False
+
+
+    # Create expected "y" column
+    if target_col!= "y":
+        df = df.rename(columns={target_col:"y"})
+
+    new_target_col = "y"
+    new_date_col = "time"
+
+    # Check that there are some rows in the uploaded data to
+    # make room for a forecast
+    with instrument.span("validation", step="blanks", rows=len(df)):
+        check_data_blocks(
+            df = df,
+            target_column = new_target_col,
+            date_column = new_date_col,
+            regressor_column_list=regressor_cols
+            )
+    
+    # Convert the columns to numbers to make sure we don't hit confusing errors later
+    with instrument.span("conversion", step="numbers", rows=len(df), columns=len(regressor_cols) + 1):
+        columns_to_numbers(df, "y", target_col)
+        for _col in regressor_cols:
+            columns_to_numbers(df, _col, _col)
+
+    return df, True
+
+
+class ValidationMemo:
+    """
+    Checked and converted data, keyed by the uploaded file's hash, the
+    columns chosen from it and whether numbers were read as float32. Kept
+    for the whole process, so rerunning the page, or someone else
+    uploading the same file, skips all of the checks.
+
+    Entries are (checked data, whether it had to be reordered) - the data is
+    shared, so anything using it has to copy before changing it.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_hash: str, date_col: str, target_col: str, regressor_cols: list, float32: bool = False) -> tuple:
+        return (file_hash, date_col, target_col, tuple(regressor_cols), float32)
+
+    def get(self, key: tuple) -> Optional[Tuple[pd.DataFrame, bool]]:
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, df: pd.DataFrame, reordered: bool) -> None:
+        with self._lock:
+            self._entries[key] = (df, reordered)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+# One per process so every session can reuse each other's checks
+validation_memo = ValidationMemo()
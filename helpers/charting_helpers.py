@@ -1,29 +1,109 @@
-import plotly.graph_objects as go # type: ignore
 import pandas as pd
 import numpy as np
 import streamlit as st
+from typing import TYPE_CHECKING
+from core import downsample, impact_math, instrument
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go # type: ignore
+
+
+# Long series are cut down to about this many points per pixel of chart width
+POINTS_PER_PIXEL = 2
+DEFAULT_CHART_WIDTH = 1200
+
+DOWNSAMPLING_OPTIONS = {
+    "Keep overall shape (LTTB)": "lttb",
+    "Keep every spike (min/max)": "minmax",
+    "Show every point": "none",
+}
+
+
+def chart_settings() -> tuple[int, str, bool]:
+    """
+    Controls for how long series are drawn. Returns the chart width, the
+    downsampling method and whether to use WebGL
+    """
+    settings_expander = st.expander(label = "Chart settings", expanded=False)
+    with settings_expander:
+        width = st.slider(
+            "Chart detail (width in pixels to draw for)",
+            min_value=400, max_value=4000, value=DEFAULT_CHART_WIDTH, step=200,
+            key="chart_width")
+        method_label = st.selectbox(
+            "How to simplify long series",
+            options=list(DOWNSAMPLING_OPTIONS.keys()),
+            key="chart_downsampling")
+        webgl = st.checkbox(
+            "Draw with WebGL (faster for very long series)",
+            value=False,
+            key="chart_webgl")
+
+    return width, DOWNSAMPLING_OPTIONS[method_label], webgl
+
+
+def current_chart_settings() -> tuple[int, str, bool]:
+    """
+    Chart settings as last chosen, for charts drawn before the settings are shown
+    """
+    return (
+        st.session_state.get("chart_width", DEFAULT_CHART_WIDTH),
+        DOWNSAMPLING_OPTIONS[st.session_state.get("chart_downsampling", list(DOWNSAMPLING_OPTIONS.keys())[0])],
+        st.session_state.get("chart_webgl", False),
+    )
+
+
+def _scatter_type(webgl: bool):
+    import plotly.graph_objects as go # type: ignore
+    return go.Scattergl if webgl else go.Scatter
+
+
+def _downsampled(df: pd.DataFrame, x, columns: list[str], width: int, method: str) -> pd.DataFrame:
+    """
+    Rows of df to draw - the same rows for every column so lines and
+    shaded areas still line up
+    """
+    keep = downsample.shared_indices(
+        x,
+        [df[col].to_numpy(dtype="float64", na_value=np.nan) for col in columns],
+        n_out = width * POINTS_PER_PIXEL,
+        method = method)
+    return df.iloc[keep]
+
 
 def line_plot_highlighting_missing_sections(
         df: pd.DataFrame,
         future_df: pd.DataFrame,
         date_col: str,
-        target_col: str) -> go.Figure:
+        target_col: str,
+        width: int = DEFAULT_CHART_WIDTH,
+        method: str = "lttb",
+        webgl: bool = False) -> "go.Figure":
+
+    # Plotly is only imported when we first draw a chart
+    import plotly.graph_objects as go # type: ignore
+    scatter = _scatter_type(webgl)
+
+    # Share the points between the two lines based on how long they are
+    total_rows = max(len(df) + len(future_df), 1)
+    df_points = df if df.empty else _downsampled(df, df["time"], ["y"], max(int(width * len(df) / total_rows), 2), method)
+    future_points = future_df if future_df.empty else _downsampled(future_df, future_df["time"], ["y"], max(int(width * len(future_df) / total_rows), 2), method)
 
     # Create a line chart
     fig = go.Figure()
 
     # Add line trace for pre-change data
-    fig.add_trace(go.Scatter(
-        x=df["ds"], 
-        y=df['y'], 
+    fig.add_trace(scatter(
+        x=df_points["ds"], 
+        y=df_points['y'], 
         mode='lines', 
         name='before test period')
         )
 
     # Add line trace for post-change data
-    fig.add_trace(go.Scatter(
-        x=future_df["ds"], 
-        y=future_df['y'], 
+    fig.add_trace(scatter(
+        x=future_points["ds"], 
+        y=future_points['y'], 
         mode='lines', 
         name='test period')
         )
@@ -59,6 +139,8 @@ def visualise_forecast(
         df: pd.DataFrame,
         target_col: str,
         date_col: str):
+
+    import plotly.graph_objects as go # type: ignore
     
     # Create a line chart
     fig = go.Figure()
@@ -110,4 +192,164 @@ def visualise_forecast(
 
 
     # Return the figure
-    return fig
\ No newline at end of file
+    return fig
+
+
+@st.experimental_memo(max_entries=32)
+@instrument.timed("chart_build")
+def impact_comparison_chart(
+        cache_key: str,
+        width: int,
+        method: str,
+        webgl: bool,
+        _ci) -> "go.Figure":
+    """
+    Observed vs. predicted with confidence intervals. Cached per fit
+    (cache_key) and settings - _ci isn't hashed, cache_key stands in for it
+    """
+    import plotly.graph_objects as go # type: ignore
+    scatter = _scatter_type(webgl)
+
+    intervention_start = pd.to_datetime(_ci.post_period[0])
+
+    # Dropping the first few rows from inferences, the model is still settling in
+    inferences = _ci.inferences.iloc[5:].copy()
+    inferences["observed"] = _ci.data['y'].reindex(inferences.index)
+
+    points = _downsampled(
+        inferences,
+        inferences.index,
+        ["observed", "preds", "preds_lower", "preds_upper"],
+        width = width,
+        method = method)
+
+    fig = go.Figure()
+    fig.add_trace(scatter(x=points.index, y=points["observed"], mode='lines', name='Observed'))
+    fig.add_trace(scatter(x=points.index, y=points["preds"], mode='lines', name='Predicted'))
+    fig.add_trace(scatter(x=points.index, y=points["preds_lower"], mode='lines', name='CI Lower', line=dict(width=0)))
+    fig.add_trace(scatter(x=points.index, y=points["preds_upper"], mode='lines', name='CI Upper', line=dict(width=0), fill='tonexty'))
+    fig.add_vline(x=intervention_start, line=dict(color="red", width=2, dash="dot"), name="Intervention")
+    fig.update_layout(title='Observed vs. Predicted with Confidence Intervals', xaxis_title='Time', yaxis_title='Value', legend_title='Legend')
+
+    return fig
+
+
+@st.experimental_memo(max_entries=32)
+@instrument.timed("chart_build")
+def cumulative_difference_chart(
+        cache_key: str,
+        width: int,
+        method: str,
+        webgl: bool,
+        _ci) -> "go.Figure":
+    """
+    Post-intervention cumulative impact and confidence intervals, cached
+    the same way as impact_comparison_chart
+    """
+    import plotly.graph_objects as go # type: ignore
+    scatter = _scatter_type(webgl)
+
+    cumulative = impact_math.cumulative_difference(
+        inferences = _ci.inferences.iloc[5:],
+        intervention_start = pd.to_datetime(_ci.post_period[0]))
+
+    points = _downsampled(
+        cumulative,
+        cumulative.index,
+        ["cumulative_difference", "lower", "upper"],
+        width = width,
+        method = method)
+
+    fig = go.Figure()
+
+    # Adding trace for the cumulative difference (Impact)
+    fig.add_trace(scatter(x=points.index, y=points["cumulative_difference"], mode='lines', name='Cumulative Difference'))
+
+    # Adding traces for the adjusted confidence intervals
+    fig.add_trace(scatter(x=points.index, y=points["lower"], mode='lines', name='CI Lower', line=dict(width=0)))
+    fig.add_trace(scatter(x=points.index, y=points["upper"], mode='lines', name='CI Upper', line=dict(width=0), fill='tonexty'))
+
+    fig.update_layout(title='Post-Intervention Cumulative Difference', xaxis_title='Time', yaxis_title='Cumulative Difference', legend_title='Legend')
+
+    return fig
+
+
+
+@st.experimental_memo(max_entries=32)
+@instrument.timed("chart_build")
+def legacy_impact_plot(cache_key: str, _ci) -> bytes:
+    """
+    The library's original matplotlib charts as PNG bytes, cached per fit
+    """
+    return _ci.plot_png()
+
+
+def date_sweep_heatmap(results: pd.DataFrame) -> "go.Figure":
+    """
+    Calendar heatmap of the relative effect estimated for each candidate
+    date in a date scan (weeks across, days of the week down)
+    """
+    import plotly.graph_objects as go # type: ignore
+
+    fitted = results[results["error"] == ""].copy()
+    dates = pd.DatetimeIndex(fitted["date"])
+    fitted["week"] = (dates - pd.to_timedelta(dates.weekday, unit="D")).strftime("%Y-%m-%d")
+    fitted["weekday"] = dates.day_name()
+    fitted["label"] = np.where(fitted["p_value"] < 0.05, "*", "")
+
+    weekdays = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+    def grid(column):
+        return fitted.pivot(index="weekday", columns="week", values=column).reindex(weekdays)
+
+    relative_effect = grid("rel_effect") * 100
+
+    fig = go.Figure(go.Heatmap(
+        z=relative_effect.values,
+        x=relative_effect.columns,
+        y=relative_effect.index,
+        customdata=grid("p_value").values,
+        text=grid("label").values,
+        texttemplate="%{text}",
+        colorscale="RdBu",
+        zmid=0,
+        colorbar=dict(title="Relative effect %"),
+        hovertemplate="Week of %{x}, %{y}<br>Relative effect: %{z:.1f}%<br>p-value: %{customdata:.3f}<extra></extra>",
+        ))
+
+    fig.update_layout(
+        title="Estimated relative effect by intervention date (* = p-value under 0.05)",
+        xaxis_title="Week starting",
+        yaxis_title="",
+        yaxis_autorange="reversed",
+        )
+
+    return fig
+
+
+def placebo_histogram(placebos: pd.DataFrame, real_effect: float) -> "go.Figure":
+    """
+    Spread of the average effects found by a placebo test, with a line
+    where the real effect is
+    """
+    import plotly.graph_objects as go # type: ignore
+
+    fitted = placebos[placebos["error"] == ""]
+
+    fig = go.Figure(go.Histogram(
+        x=fitted["abs_effect"],
+        name="Placebo effects",
+        marker_color="rgba(0,0,255,0.5)",
+        ))
+
+    fig.add_vline(x=real_effect, line_color="red", line_width=2,
+                  annotation_text="Real effect", annotation_position="top")
+
+    fig.update_layout(
+        title="Average effect found at placebo dates vs. the real effect",
+        xaxis_title="Average effect per period",
+        yaxis_title="Number of placebos",
+        showlegend=False,
+        )
+
+    return fig
@@ -1,86 +1,176 @@
+import os
+import time
 import streamlit as st
-from causalimpact import CausalImpact
-import pandas as pd
-from helpers import st_helpers as sth
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
+from helpers import st_helpers as sth, charting_helpers as ch
+from core import periods, backends, jobs
 import ga4py.add_tracker as add_tracker
 from ga4py.custom_arguments import MeasurementArguments
 
-def extract_start_and_end(data_for_ci):
-    # Pull start and end dates at this point to be certain they match
-    pre_period = data_for_ci[~data_for_ci["test_period"]]
-    pre_data_start = pre_period["test_period"].index.min()
-    pre_data_end = pre_period["test_period"].index.max()
-    pre_dates = [pre_data_start, pre_data_end]
-
-    post_period = data_for_ci[data_for_ci["test_period"]]
-    post_data_start = post_period["test_period"].index.min()
-    post_data_end = post_period["test_period"].index.max()
-    post_dates = [post_data_start, post_data_end]
-
-    return pre_dates, post_dates
-
-def clean_columns(data_for_ci):
-
-    # Rename regressor columns to match expected format
-    rename_dictionary = {}
-    renamed_list = []
-    for index, col in enumerate(st.session_state.regressor_col_list):
-        name = "X"
-        if index != 0:
-            name = f"X{index}"
-        rename_dictionary[col] = name
-        renamed_list.append(name)
-    data_for_ci.rename(columns=rename_dictionary, inplace=True)
-
-    # Cut down to just the columns we need for the impact estimate
-    cols_to_keep = [c for c in data_for_ci.columns if c=="y" or c in renamed_list]
-
-    data_for_ci = data_for_ci[cols_to_keep]
-
-    # Ensure all info is numerical, no n/a
-    data_for_ci = data_for_ci.apply(pd.to_numeric)
-    data_for_ci = data_for_ci.fillna(0)
-    return data_for_ci
+# How often the page checks on a fit running in the background
+FIT_POLL_SECONDS = 0.5
 
 @add_tracker.analytics_hit_decorator
-def get_ci(data_for_ci, pre_dates, post_dates) -> None:
-    # Only run if haven't run before
-    ci = CausalImpact(
-        data_for_ci, 
-        pre_dates, 
-        post_dates, 
-        )
-    st.session_state.ci = ci
+def get_ci(data_for_ci, pre_dates, post_dates, model_args = None, backend = backends.DEFAULT_BACKEND, job_id = None) -> None:
+    """
+    Starts the fit in the background - wait_for_ci picks it up when it's done
+    """
+    st.session_state.fit_job_id = jobs.job_manager.submit(
+        data_for_ci = data_for_ci,
+        pre_dates = pre_dates,
+        post_dates = post_dates,
+        model_args = model_args,
+        backend = backend,
+        watcher = st.session_state.session_id,
+        key = job_id)
+
+def fit_inputs(backend, model_args) -> dict:
+    """
+    The data to fit and its job id, only worked out again when the data or
+    settings change (the page reruns every FIT_POLL_SECONDS while fitting,
+    and hashing all the data each time adds up)
+    """
+    settings = (st.session_state.cleaned_data, tuple(st.session_state.regressor_col_list), backend, model_args)
+    inputs = st.session_state.fit_inputs
+
+    # The data's compared by identity - it's replaced, not changed, when new dates are confirmed
+    if inputs is None or inputs["settings"][0] is not settings[0] or inputs["settings"][1:] != settings[1:]:
+        data_for_ci, pre_dates, post_dates = periods.prepare_data_for_ci(
+            st.session_state.cleaned_data,
+            regressor_col_list = st.session_state.regressor_col_list)
+
+        inputs = {
+            "settings": settings,
+            "data_for_ci": data_for_ci,
+            "pre_dates": pre_dates,
+            "post_dates": post_dates,
+            "job_id": jobs.job_id(data_for_ci, pre_dates, post_dates, model_args, backend),
+        }
+        st.session_state.fit_inputs = inputs
+
+    return inputs
+
+def cancel_fit() -> None:
+    jobs.job_manager.cancel(st.session_state.fit_job_id, watcher = st.session_state.session_id)
+    st.session_state.cancelled_fit_job_id = st.session_state.fit_job_id
+    st.session_state.fit_job_id = None
+
+def wait_for_ci() -> None:
+    """
+    Checks on the background fit. Once it's finished the result goes into
+    st.session_state.ci. Until then it shows how far
+    along it is (with a cancel button, if the fit can be stopped) and
+    reruns the page every FIT_POLL_SECONDS.
+    """
+    job = jobs.job_manager.get(st.session_state.fit_job_id)
+
+    if job is None:
+        # Forgotten about (e.g. the app was restarted) - start again
+        st.session_state.fit_job_id = None
+        st.experimental_rerun()
+
+    if job.status == jobs.DONE:
+        st.session_state.ci = job.result
+        st.session_state.fit_job_id = None
+        return
+
+    if job.status == jobs.FAILED:
+        # Kept so the same failing fit isn't run again on every rerun
+        st.session_state.failed_fit = (job.job_id, job.error)
+        st.session_state.fit_job_id = None
+        st.experimental_rerun()
+
+    if job.status == jobs.CANCELLED:
+        st.session_state.cancelled_fit_job_id = job.job_id
+        st.session_state.fit_job_id = None
+        st.experimental_rerun()
+
+    if job.status == jobs.QUEUED:
+        st.write("Waiting for other fits to finish...")
+    elif job.progress is not None:
+        st.progress(job.progress)
+    else:
+        st.write(f"Fitting the model... ({job.seconds:.0f}s so far)")
+
+    # Only backends that report progress can stop part way through a fit
+    if job.status == jobs.QUEUED or job.progress is not None:
+        if st.button("Cancel", key = "cancel-fit"):
+            cancel_fit()
+            st.experimental_rerun()
+
+    time.sleep(FIT_POLL_SECONDS)
+    st.experimental_rerun()
+
+def bayesian_settings() -> dict:
+    """
+    Sampling settings for the Bayesian model
+    """
+    draws, chains, cores = st.columns(3)
+    model_args = {
+        "draws": draws.number_input("Draws per chain", min_value = 100, max_value = 10000, value = 1000, step = 100),
+        "chains": chains.number_input("Chains", min_value = 1, max_value = 16, value = 4),
+    }
+    model_args["cores"] = cores.number_input(
+        "Chains to run at once",
+        min_value = 1,
+        max_value = 16,
+        value = min(model_args["chains"], os.cpu_count() or 1))
+    return model_args
 
 def run_causal_impact():
-    data = st.session_state.cleaned_data
-    data_for_ci = data.copy(deep = True)
-    data_for_ci["time"] = data_for_ci["time"]
-
-    data_for_ci.set_index('time', inplace=True)
-
-    # Make sure data is always in the right order
-    data_for_ci.sort_index(inplace=True)
-
-    pre_dates, post_dates = extract_start_and_end(data_for_ci)
-
-    data_for_ci = clean_columns(data_for_ci)
+    # Both fit the same model - the fast one works out the intervals directly
+    # rather than simulating them, so it's quicker and gives the same answer every time
+    backend = st.selectbox(
+        "Model",
+        options = list(backends.BACKENDS),
+        format_func = lambda name: backends.BACKEND_LABELS[name],
+        key = "backend")
 
+    model_args = bayesian_settings() if backend == "bayesian" else None
 
     # Run Causal Impact analysis including the holiday indicators as part of the data
 
-    if st.session_state.ci == None:
-        tracking_args_dict = st.session_state.basic_tracking_info
-        tracking_args_dict["skip_stage"] = ["start", "end"]
-        tracking_args_dict["stage"] = "measure_impact"
-
-        get_ci(
-            data_for_ci = data_for_ci, 
-            pre_dates = pre_dates, 
-            post_dates = post_dates,
-            ga4py_args_remove = tracking_args_dict)
+    if (
+        st.session_state.ci == None
+        or getattr(st.session_state.ci, "backend", backends.DEFAULT_BACKEND) != backend
+        or (model_args is not None and st.session_state.ci_model_args != model_args)
+        ):
+        inputs = fit_inputs(backend, model_args)
+        wanted_job_id = inputs["job_id"]
+
+        if st.session_state.failed_fit is not None and wanted_job_id == st.session_state.failed_fit[0]:
+            st.error(st.session_state.failed_fit[1])
+            if st.button("Try again"):
+                st.session_state.failed_fit = None
+                st.experimental_rerun()
+            return None
+
+        if wanted_job_id == st.session_state.cancelled_fit_job_id:
+            st.info("You cancelled fitting the model.")
+            if st.button("Fit the model"):
+                st.session_state.cancelled_fit_job_id = None
+                st.experimental_rerun()
+            return None
+
+        if st.session_state.fit_job_id != wanted_job_id:
+            # Settings changed while another fit was running - we don't want that one any more
+            if st.session_state.fit_job_id is not None:
+                cancel_fit()
+
+            tracking_args_dict = st.session_state.basic_tracking_info
+            tracking_args_dict["skip_stage"] = ["start", "end"]
+            tracking_args_dict["stage"] = "measure_impact"
+
+            get_ci(
+                data_for_ci = inputs["data_for_ci"], 
+                pre_dates = inputs["pre_dates"], 
+                post_dates = inputs["post_dates"],
+                model_args = model_args,
+                backend = backend,
+                job_id = wanted_job_id,
+                ga4py_args_remove = tracking_args_dict)
+
+        wait_for_ci()
+        st.session_state.ci_model_args = model_args
     
     ci = st.session_state.ci
     
@@ -89,12 +179,16 @@ def run_causal_impact():
     else:
         print("CausalImpact model initialized.")
 
+    fit_info = getattr(ci, "fit_info", None)
+    if fit_info is not None and fit_info.get("backend") == "bayesian":
+        compiling = "reused a compiled model" if fit_info["compiled_model_reused"] else f"compiling {fit_info['compile_seconds']}s"
+        st.caption(
+            f"Fitted in {fit_info['total_seconds']}s ({compiling}, sampling {fit_info['sampling_seconds']}s "
+            f"for {fit_info['chains']} chains of {fit_info['draws']} draws on {fit_info['cores']} core(s))")
+
     # Add in Plotly charts
     show_charts_with_plotly(ci)
 
-    # Add download button to download 
-    csv = sth.convert_df(ci.inferences, index = True)
-
     st.markdown(f"""
 -------------
                         
@@ -110,59 +204,48 @@ Or you can use [Dave Westby's blog post here to create your own chart with this
 """)
 
 
-    st.download_button(
-    f"Download data",
-    csv,
-    f"causal impact data%.csv",
-    f"causal impact data%/csv",
-    key='download-csv'
-    )
+    # Only built when asked for
+    sth.lazy_download(
+        ci.inferences,
+        "Download data",
+        "causal impact data",
+        key = "download-csv",
+        index = True,
+        cache_key = ci.cache_key)
 
     more_detail = st.expander(label= "More detail", expanded=False)
     with more_detail:
 
-        fig = ci.plot()
+        # Drawing the library's charts is slow, so only do it when asked
+        # (expanders still run their contents when they're collapsed)
+        show_more_detail = st.checkbox("Show the original Causal Impact charts and report", value=False)
 
-        st.markdown("## Original Causal Impact charts generated by library")
+        if show_more_detail:
+            st.markdown("## Original Causal Impact charts generated by library")
 
-        # Capture the current Matplotlib figure generated by CausalImpact
-        fig = plt.gcf()
+            # Drawn once per fit and kept as a PNG
+            st.image(ch.legacy_impact_plot(cache_key = ci.cache_key, _ci = ci))
 
-        # Display the plot in Streamlit
-        st.pyplot(fig)
 
+            st.markdown("## Summary report generated by Causal Impact")
+            st.write(ci.summary('report'))
 
-        st.markdown("## Summary report generated by Causal Impact")
-        st.write(ci.summary('report'))
+    return ci
 
 
 def show_charts_with_plotly(ci):
-    # Ensure observed_data is defined before referencing it
-    observed_data = ci.data['y']  # Assuming 'y' is your observed column in the original dataset
-    
-    # Adjusting the approach to determine the intervention date
-    # Convert the start of the post-period to a Timestamp, if not already one
-    intervention_start = pd.to_datetime(ci.post_period[0])
-    
-    # Dropping the first few rows from inferences as needed
-    inferences = ci.inferences.iloc[5:]  # Assuming dropping rows doesn't affect the intervention date calculation
-    
-    # For observed and predicted values during the entire period
-    predicted_data = inferences['preds']
-    preds_lower = inferences['preds_lower']
-    preds_upper = inferences['preds_upper']
-    
-    # Adjust indices for plotting, if necessary
-    observed_index_adjusted = observed_data.index[5:]  # Adjust index if you've dropped rows from observed_data
-    
+
+    # Long series are simplified before they're sent to the browser, and the
+    # figures are cached per fit and chart settings so reruns don't rebuild them
+    width, method, webgl = ch.chart_settings()
+
     # Chart 1: Entire Period - Observed vs. Predicted with Confidence Intervals
-    fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(x=observed_index_adjusted, y=observed_data.iloc[5:], mode='lines', name='Observed'))
-    fig1.add_trace(go.Scatter(x=predicted_data.index, y=predicted_data, mode='lines', name='Predicted'))
-    fig1.add_trace(go.Scatter(x=preds_lower.index, y=preds_lower, mode='lines', name='CI Lower', line=dict(width=0)))
-    fig1.add_trace(go.Scatter(x=preds_upper.index, y=preds_upper, mode='lines', name='CI Upper', line=dict(width=0), fill='tonexty'))
-    fig1.add_vline(x=intervention_start, line=dict(color="red", width=2, dash="dot"), name="Intervention")
-    fig1.update_layout(title='Observed vs. Predicted with Confidence Intervals', xaxis_title='Time', yaxis_title='Value', legend_title='Legend')
+    fig1 = ch.impact_comparison_chart(
+        cache_key = ci.cache_key,
+        width = width,
+        method = method,
+        webgl = webgl,
+        _ci = ci)
 
     st.markdown("""
 # Causal Impact output
@@ -183,16 +266,6 @@ However, if the confidence intervals (the shaded area) is **very** big before th
     # Display Chart 1
     st.plotly_chart(fig1)
 
-    # Or adjust the DataFrame to focus on post-intervention data
-    post_intervention_inferences = inferences.loc[intervention_start:]
-
-    # Calculate the cumulative difference (Impact) starting from the intervention date
-    cumulative_difference = (post_intervention_inferences['post_cum_y'] - post_intervention_inferences['post_cum_pred'])
-
-    # Calculate adjusted confidence intervals for the cumulative difference
-    cumulative_difference_lower = cumulative_difference + post_intervention_inferences['post_cum_pred_lower'] - post_intervention_inferences['post_cum_pred']
-    cumulative_difference_upper = cumulative_difference + post_intervention_inferences['post_cum_pred_upper'] - post_intervention_inferences['post_cum_pred']
-
     st.markdown("""
 ## Cumulative difference chart
                                 
@@ -205,16 +278,12 @@ If the actual performance is lower than expected, then the line will be going do
                 """)
 
     # Chart 2: Post-Intervention Cumulative Impact and Confidence Intervals
-    fig2 = go.Figure()
-
-    # Adding trace for the cumulative difference (Impact)
-    fig2.add_trace(go.Scatter(x=post_intervention_inferences.index, y=cumulative_difference, mode='lines', name='Cumulative Difference'))
-
-    # Adding traces for the adjusted confidence intervals
-    fig2.add_trace(go.Scatter(x=post_intervention_inferences.index, y=cumulative_difference_lower, mode='lines', name='CI Lower', line=dict(width=0)))
-    fig2.add_trace(go.Scatter(x=post_intervention_inferences.index, y=cumulative_difference_upper, mode='lines', name='CI Upper', line=dict(width=0), fill='tonexty'))
-
-    fig2.update_layout(title='Post-Intervention Cumulative Difference', xaxis_title='Time', yaxis_title='Cumulative Difference', legend_title='Legend')
+    fig2 = ch.cumulative_difference_chart(
+        cache_key = ci.cache_key,
+        width = width,
+        method = method,
+        webgl = webgl,
+        _ci = ci)
 
     # Display Chart 2
     st.plotly_chart(fig2)
@@ -0,0 +1,46 @@
+import streamlit as st
+import os
+from contextlib import contextmanager
+from core import memory
+
+
+def debug_enabled_by_env() -> bool:
+    """
+    Whoever runs the app asked for debug info with CI_DEBUG=1 (rather than
+    anyone adding ?debug=1 to the url)
+    """
+    return os.getenv("CI_DEBUG", "").lower() in ("1", "true", "yes")
+
+
+def debug_enabled() -> bool:
+    """
+    Debug info is hidden unless the app is run with CI_DEBUG=1
+    or opened with ?debug=1 on the end of the url
+    """
+    if debug_enabled_by_env():
+        return True
+
+    query_debug = st.experimental_get_query_params().get("debug", [""])[0]
+    return query_debug.lower() in ("1", "true", "yes")
+
+
+@contextmanager
+def record_peak_memory(stage: str):
+    """
+    Records how far memory rose while this session ran a stage, for the debug panel
+    """
+    with memory.PeakMemory() as peak:
+        yield
+
+    st.session_state.memory_peaks[stage] = peak.increase_bytes
+
+
+def session_memory() -> dict[str, int]:
+    """
+    Size of everything this session is holding on to, biggest first
+    """
+    sizes = {
+        key: memory.object_bytes(value)
+        for key, value in st.session_state.items()
+    }
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
@@ -1,6 +1,6 @@
-import holidays
-
-
 def return_available_countries():
+    # Only import holidays when someone actually wants to choose a country
+    import holidays
+
     # Get the list of available countries
     return ["None"]+[country for country in holidays.list_supported_countries()]
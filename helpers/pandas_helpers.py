@@ -1,257 +1,57 @@
 import streamlit as st
 from helpers import st_helpers as sth
+from core import validation
 import pandas as pd
-import numpy as np
-from typing import Tuple
-
-def check_time_series_continuity(df, freq='D'):
-    """
-    Checks if a DataFrame indexed by datetime is continuous without gaps larger than the given frequency.
-
-    Parameters:
-    - df: pd.DataFrame with DateTimeIndex.
-    - freq: str, frequency string in pandas offset alias (e.g., 'D' for daily, 'H' for hourly).
-
-    Returns:
-    - is_continuous: bool, True if the time series is continuous without gaps larger than the specified frequency.
-    - missing_periods: pd.DatetimeIndex, the start of missing periods if any.
-    """
-    expected_range = pd.date_range(start=df.index.min(), end=df.index.max(), freq=freq)
-    missing_periods = expected_range.difference(df.index)
-    
-    is_continuous = missing_periods.empty
-
-    if not is_continuous:
-        raise ValueError(f"""
-Your date column has gaps between dates, you need to include a row for every single date between the start and the end.
-                         
-Missing periods start at: {missing_periods}""")
-
-
-def check_columns(df):
-    """
-    Function to check if all of the column names are unique
-    """
-
-
-    df_cols = df.columns
-
-    if len(df_cols) != len(list(set(df_cols))):
-        # If the deduped list doesn't match the 
-        # non-deduped list some of the column names
-        # are identical and that will cause problems
-        raise ValueError("""
-                         
-Sorry - it looks like you've uploaded data which has duplicate column
-names, please check your csv, make sure each column has a unique name
-then refresh the page and try again. Thanks!                         
-                         
-""")
-
-
-def date_col_conversion(
-        df: pd.DataFrame, 
-        date_col: str
-        )-> pd.DataFrame:
-
-    try:
-        df["time"] = pd.to_datetime(df[date_col], format="%Y-%m-%d", utc=True)
-        df = df.rename(columns={date_col:"ds"}, inplace = False)
-    except Exception as e:
-        raise ValueError(f"There was a problem with reading your date column ({date_col}) - please make sure you've selected the right one, and that all the dates are in YYYY-MM-DD format")
-    
-    return df
-
-
-def check_for_data_blocks(
-        row,
-        target_column: str,
-        date_column: str,
-        list_of_empties: list,
-        regressor_column_list: list[str],
-    ):
-    """
-    check_for_data_blocks 
-
-    This function uses the mutable nature of a list so
-    we can loop through every row in a dataframe and count
-    the number of blanks but ALSO do some checks, i.e.
-    
-    - Make sure that there aren't gaps 
-        (essentially we should see ONLY filled 
-        rows until the first empty row, and then we 
-        should see ONLY empty rows from then until the end). 
-    - Check if there are at least a few empty 'target_column' 
-        rows at the end of our data, if so that's our forecast
-        window, if not we assume we have to generate the forecast window
-    - Check if there are any regressor columns with empty spaces
-        if so that'll cause Prophet to fail so we need to give a 
-        clear and direct error message now so people know what to fix
-    - Check if there are any empty cells in the date column
-        if so that'll cause Prophet to fail so again we need a 
-        clear and direct error message
-
-    Args:
-        row (DataFrame row): the row of the dataframe we're checking
-        target_column (str): the name of the column we're checking
-        date_column (str): the name of the column we'll record in the empty rows list
-        list_of_empties (list): a list of dates for the empty rows
-        regressor_column_list (list[str]): list of regressor columns to check to make sure they're not N/A
-    """
-
-
-
-    # Check if the date column is unexpectedly blank
-    if pd.isna(row[date_column]) or row[date_column]=="":
-        raise ValueError(f"""
-
-It looks like you have a row which has data in it but doesn't have a value
-in the date column ({date_column}). Try checking row {row.name} and make sure
-the date column is filled (and check the rest of the date column while you're at it!)                         
-
-Then refresh this page and try uploading your data again.
-                         
-""")
-
-    date_value = row[date_column]
-
-
-    # check if any of the regressor columns are unexpectedly blank
-    for c in regressor_column_list:
-        if pd.isna(row[c]) or row[c]=="":
-            raise ValueError(f"""
-When you're using regressor columns - you have to put a value in every single row
-for the regressors. In the row for {date_value} your regressor column {c} is empty. 
-Other rows and columns might have the same issue so please check your data, refresh this page
-and try again.""")
-
-    value = row[target_column]
-    if value == "" or pd.isna(value):
-        raise ValueError(f"""
-                             
-You have gaps in your data - when we checked your data, column: {target_column}
-has an empty row for {date_value} and may have more missing data.
-
-To avoid errors - fix your data (so you have a value in your target column for every
-historic date.
-
-""")
-    
-    else:
-        # Check we haven't had any empties before now
-        if len(list_of_empties)> 0:
-            raise ValueError(f"""
-                             
-You have gaps in your data - when we checked your data, column: {target_column}
-has an entry for date {date_value} but is missing values for {len(list_of_empties)} 
-preceding dates. Here are {min(10,len(list_of_empties))} examples of dates with missing data:
-{list_of_empties[:10]}.
-
-To avoid errors - fix your data (so you have a value in your target column for every
-historic date, and an empty row for every date you want to forecast), reload this page
-and reupload your data.
-
-""")
-
-
-def check_ordering(
-        df: pd.DataFrame) -> Tuple[pd.DataFrame, bool]:
-    
-
-    should_continue = True # Default assumption is no issues
-
-    print(f"Available cols: {df.columns}")
-
-    
-    # Check the dataframe is ordered correctly
-    date_ordered = df["ds"].is_monotonic_increasing
-
-    if not date_ordered:
-        should_continue = sth.continue_or_reset("""
-The data you uploaded isn't in date order. Do you want to continue?
-                              
-If you click 'yes' we'll automatically reorder your data for you. 
-
-If you want to start again - reload the page.
-
-""")    
-        if should_continue:
-            df = df.sort_values("ds").reset_index().drop(columns=["index"])
-
-    print(f"Should continue: {should_continue}") 
-
-    return df, should_continue
-
-
-def columns_to_numbers(df, _col, col_name):
-    """
-    Function to convert columns to numbers to avoid unexpected errors later
-    """
-    # Convert Y and regressor cols to numbers to avoid errors
-    try:
-        df[_col] = df[_col].astype(float)
-    except Exception as e:
-
-        try:
-            # Try removing commas
-            df[_col] = df[_col].str.replace(',', '').astype(float)
-        except Exception as f:
-            print(f"Exception 1: {e}")
-            print(f"Exception 2: {f}")
-            raise ValueError(f"""
-Error converting the data in your target column '{col_name}' to numbers. 
-
-Please check your '{col_name}' column and make sure there's only numbers (or blank cells) in that column.""")
+from typing import Optional, Tuple
 
 def check_and_convert_data(
         df: pd.DataFrame, 
         date_col: str, 
         target_col: str,
-        regressor_cols: list
+        regressor_cols: list,
+        file_hash: Optional[str] = None,
+        float32: bool = False,
         ) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
 
+    # Same file and columns as something already checked (in any session)
+    # means the checks would come out the same, so reuse what they made
+    memo_key = None
+    memoised = None
+    if file_hash is not None:
+        memo_key = validation.validation_memo.key(file_hash, date_col, target_col, regressor_cols, float32)
+        memoised = validation.validation_memo.get(memo_key)
+
+    if memoised is not None:
+        current, reordered = memoised
+        # Still ask before using a reordered version of their data
+        should_continue = sth.continue_or_reset(validation.UNORDERED_DATA_MESSAGE) if reordered else True
+        print(f"Reusing checked data for {memo_key[1:4]}")
+    else:
+        reordered = False
 
-    # First convert date column and create expected ds column
-    df = date_col_conversion(df = df, date_col = date_col)
+        def confirm_reorder(message: str):
+            nonlocal reordered
+            reordered = True
+            # Ask the user before reordering their data
+            return sth.continue_or_reset(message)
 
+        current, should_continue = validation.convert_and_check_data(
+            df = df,
+            date_col = date_col,
+            target_col = target_col,
+            regressor_cols = regressor_cols,
+            confirm_reorder = confirm_reorder
+            )
 
-    # Then check ordering
-    df, ordering_should_continue = check_ordering(
-        df=df)
-    
+        if should_continue and memo_key is not None:
+            validation.validation_memo.put(memo_key, current, reordered)
 
     # Only do the rest of this if we should continue
-    if not ordering_should_continue:
-        return df, df, df # Just returning data, but we shouldn't use it
+    if not should_continue:
+        return current, current, current # Just returning data, but we shouldn't use it
 
-
-    # Create expected "y" column
-    if target_col!= "y":
-        df = df.rename(columns={target_col:"y"})
-
-    new_target_col = "y"
     new_date_col = "time"
 
-    # Check that there are some rows in the uploaded data to
-    # make room for a forecast
-    list_of_empty_dates: list = []
-
-    df.apply(lambda x: check_for_data_blocks(
-        row = x,
-        target_column = new_target_col,
-        date_column = new_date_col,
-        list_of_empties = list_of_empty_dates,
-        regressor_column_list=regressor_cols
-        ), axis = 1)
-    
-    # Convert the columns to numbers to make sure we don't hit confusing errors later
-    columns_to_numbers(df, "y", target_col)
-    for _col in regressor_cols:
-        columns_to_numbers(df, _col, _col)
-    
-    
-    current = df
-
     first_date = current[new_date_col].iloc[0]
     last_date = current[new_date_col].iloc[-1]
 
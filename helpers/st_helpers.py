@@ -1,5 +1,8 @@
 import streamlit as st
 import os
+import pandas as pd
+from typing import Optional
+from core import export
 import ga4py.add_tracker as add_tracker
 from ga4py.custom_arguments import MeasurementArguments
 
@@ -35,7 +38,72 @@ def continue_or_reset(message = ""):
         raise ValueError("You selected 'no' meaning you don't want to continue - please refresh the page")
     
 
-@st.experimental_memo
+# Exports are kept for a while in case the download is clicked again, but
+# only so many and not for ever, so long running servers don't fill up
+EXPORT_MEMO_ENTRIES = int(os.getenv("CI_EXPORT_MEMO_ENTRIES", 16))
+EXPORT_MEMO_SECONDS = int(os.getenv("CI_EXPORT_MEMO_SECONDS", 30 * 60))
+
+
+@st.experimental_memo(max_entries = EXPORT_MEMO_ENTRIES, ttl = EXPORT_MEMO_SECONDS)
 def convert_df(df, index = False):
    return df.to_csv(index=index).encode('utf-8')
 
+
+@st.experimental_memo(max_entries = EXPORT_MEMO_ENTRIES, ttl = EXPORT_MEMO_SECONDS)
+def export_file(cache_key: str, file_format: str, index: bool, _df: pd.DataFrame) -> bytes:
+    # _df isn't hashed by streamlit - cache_key identifies it
+    return export.to_bytes(_df, file_format, index = index)
+
+
+def lazy_download(
+        df: pd.DataFrame,
+        label: str,
+        file_name: str,
+        key: str,
+        index: bool = False,
+        cache_key: Optional[str] = None,
+    ):
+    """
+    Format picker and a button that only builds the file when it's asked
+    for, then the download button for it. file_name is without an extension.
+    cache_key identifies df's contents (worked out from df if not given).
+    A new fit (or new results) needs Prepare clicking again.
+    """
+    file_format = st.selectbox(
+        "File format",
+        options = list(export.FORMATS),
+        format_func = lambda name: export.FORMATS[name][0],
+        key = f"{key}-format")
+
+    # What was last prepared - without a cache_key, the frame itself (the
+    # ones passed in are kept in session state, so a new result is a new frame)
+    ready_key = f"{key}-ready"
+    prepared_for = cache_key if cache_key is not None else df
+    if st.button(f"Prepare {label.lower()}", key = f"{key}-prepare"):
+        st.session_state[ready_key] = (file_format, prepared_for)
+
+    # Only build the file once someone's asked for this format, for these results
+    ready = st.session_state.get(ready_key)
+    if ready is None or ready[0] != file_format:
+        return
+    same_results = ready[1] == cache_key if cache_key is not None else ready[1] is df
+    if not same_results:
+        # Something new to download - wait to be asked again
+        del st.session_state[ready_key]
+        return
+
+    _, extension, mime = export.FORMATS[file_format]
+    data = export_file(
+        cache_key or export.frame_key(df, index = index),
+        file_format,
+        index,
+        _df = df)
+
+    st.download_button(
+        f"{label} ({len(data) / 1024**2:,.1f} MB)",
+        data,
+        f"{file_name}.{extension}",
+        mime,
+        key = key
+        )
+
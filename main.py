@@ -1,6 +1,7 @@
 import css_and_styling
 import streamlit as st
-from content_blocks import initial, file_upload, choose_columns, choose_dates, show_impact_estimate
+from content_blocks import initial, file_upload, debug_panel
+from core import instrument
 import logging
 
 import ga4py.add_tracker as add_tracker
@@ -9,8 +10,13 @@ from ga4py.custom_arguments import MeasurementArguments
 @add_tracker.analytics_hit_decorator
 def main() -> None:
 
+    # Serve stage metrics if CI_METRICS_PORT is set (only starts once per process)
+    instrument.start_metrics_server_from_env()
+
     # Handle initial variable setup
     initial.set_variables()
+    # So stage timings can be shown for this session
+    instrument.set_session(st.session_state.session_id)
 
     # Add styling and initial content above accordions
     css_and_styling.add_custom_css()
@@ -19,18 +25,31 @@ def main() -> None:
     # Add tool to upload data
     file_upload.add_accordion()
 
+    # Later steps are only imported once they're reached so heavy libraries
+    # (plotly, causalimpact, matplotlib) don't slow down the first page load
+
     # Handle uploaded data
     if st.session_state.uploaded_file is not None:
+        from content_blocks import choose_columns
         file_upload.display_uploaded_file()
         choose_columns.show_column_choosers()
 
     if "columns_chosen" in st.session_state:
-        choose_dates.handle_dates_checks()
+        if st.session_state.group_col is not None:
+            # Several series in one file - fitted separately, all at once
+            from content_blocks import group_impact
+            group_impact.show_group_impact()
+        else:
+            from content_blocks import choose_dates
+            choose_dates.handle_dates_checks()
 
     if "cleaned_data" in st.session_state:
-
+        from content_blocks import show_impact_estimate
         show_impact_estimate.display_impact_estimate()
 
+    # Hidden unless debugging is switched on
+    debug_panel.show_debug_panel()
+
     
 
 
@@ -5,5 +5,5 @@ setup(
     version="1.0.0",
     description="A simple Causal Impact implementation to let people run the code without having to write Python themselves",
     author="Robin Lord",
-    packages=["content_blocks"],
+    packages=["content_blocks", "core"],
 )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# So the tests can import core/ and helpers/ however pytest is started
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
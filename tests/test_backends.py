@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import backends
+
+
+# Columns that don't depend on simulations - the lean backend should
+# give the library's numbers to floating point precision
+EXACT_COLUMNS = [
+    "post_cum_y", "preds", "post_preds", "post_preds_lower", "post_preds_upper",
+    "preds_lower", "preds_upper", "post_cum_pred",
+    "point_effects", "point_effects_lower", "point_effects_upper", "post_cum_effects",
+]
+EXACT_TOLERANCE = 1e-8
+
+# The library simulates these (lean works them out exactly), so they only
+# agree to within its simulation noise - a few tenths of a percent of the
+# cumulative total
+SIMULATED_COLUMNS = [
+    "post_cum_pred_lower", "post_cum_pred_upper",
+    "post_cum_effects_lower", "post_cum_effects_upper",
+]
+SIMULATED_TOLERANCE = 0.005
+P_VALUE_TOLERANCE = 0.02
+
+
+def synthetic_data(n_rows: int = 200, n_regressors: int = 2):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2015-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, (n_rows, n_regressors)).cumsum(axis=0) / 10 + 500
+    y = x @ rng.uniform(0.5, 1.5, n_regressors) + rng.normal(0, 20, n_rows).cumsum() / 5
+    post_start = int(n_rows * 0.8)
+    y[post_start:] += 50
+
+    data = pd.DataFrame(x, index=index, columns=[f"x{i}" for i in range(n_regressors)])
+    data.insert(0, "y", y)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+@pytest.fixture(scope="module")
+def fits():
+    data, pre_dates, post_dates = synthetic_data()
+    # The library's simulations use the global random state
+    np.random.seed(0)
+    library = backends.fit("causalimpact", data, pre_dates, post_dates, {})
+    lean = backends.fit("lean", data, pre_dates, post_dates, {})
+    return library, lean
+
+
+def relative_difference(a: pd.Series, b: pd.Series, scale: float) -> float:
+    return float(np.nanmax(np.abs(a.to_numpy(dtype="float64") - b.to_numpy(dtype="float64"))) / scale)
+
+
+@pytest.mark.parametrize("col", EXACT_COLUMNS)
+def test_deterministic_columns_match_the_library(fits, col):
+    library, lean = fits
+    scale = np.nanmax(np.abs(library.inferences[col].to_numpy(dtype="float64"))) or 1.0
+    assert relative_difference(lean.inferences[col], library.inferences[col], scale) < EXACT_TOLERANCE
+
+
+@pytest.mark.parametrize("col", SIMULATED_COLUMNS)
+def test_simulated_columns_are_within_the_library_noise(fits, col):
+    library, lean = fits
+    # Effect bounds are actual minus the predicted total's bounds, so they
+    # share its noise - measure both against the size of the total
+    scale = np.nanmax(np.abs(library.inferences["post_cum_pred"].to_numpy(dtype="float64")))
+    assert relative_difference(lean.inferences[col], library.inferences[col], scale) < SIMULATED_TOLERANCE
+
+
+def test_summary_and_p_value_match_the_library(fits):
+    library, lean = fits
+    assert list(lean.summary_data.index) == list(library.summary_data.index)
+
+    for column in ["average", "cumulative"]:
+        scale = abs(library.summary_data.loc["predicted", column])
+        difference = relative_difference(lean.summary_data[column], library.summary_data[column], scale)
+        assert difference < SIMULATED_TOLERANCE, column
+
+    assert abs(lean.p_value - library.p_value) < P_VALUE_TOLERANCE
+
+
+def test_bayesian_backend_reuses_its_compiled_model():
+    pytest.importorskip("pymc")
+
+    data, pre_dates, post_dates = synthetic_data(60, 1)
+    # Just enough sampling to exercise the path, not to be accurate
+    model_args = {"draws": 50, "tune": 50, "chains": 1, "cores": 1, "random_seed": 0}
+
+    first = backends.fit("bayesian", data, pre_dates, post_dates, model_args)
+    # Same shape with different numbers goes through set_data on the compiled model
+    shifted = data.copy()
+    shifted["y"] += 10
+    second = backends.fit("bayesian", shifted, pre_dates, post_dates, model_args)
+
+    assert second.fit_info["compiled_model_reused"]
+    assert second.fit_info["compile_seconds"] == 0
+    for fitted in [first, second]:
+        assert set(EXACT_COLUMNS + SIMULATED_COLUMNS) <= set(fitted.inferences.columns)
+        assert len(fitted.inferences) == len(data)
+        assert not fitted.inferences["post_cum_pred"].loc[post_dates[0]:].isna().any()
+        assert 0 <= fitted.p_value <= 1
+    # The later fit saw the shifted numbers rather than the first fit's
+    assert second.inferences["preds"].mean() > first.inferences["preds"].mean()
+
+
+def test_bayesian_fits_of_the_same_shape_dont_wait_for_each_other():
+    pytest.importorskip("pymc")
+    from core import bayesian_impact
+
+    with bayesian_impact._compiled_model(30, 1) as (first_model, _, _):
+        # One fit is using the compiled model, so another gets its own
+        with bayesian_impact._compiled_model(30, 1) as (second_model, _, compile_seconds):
+            assert second_model is not first_model
+            assert compile_seconds > 0
+
+    # Both free again - the next fit reuses one of them
+    with bayesian_impact._compiled_model(30, 1) as (model, _, compile_seconds):
+        assert model in (first_model, second_model)
+        assert compile_seconds == 0
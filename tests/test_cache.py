@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core import cache, fitting
+
+
+def synthetic_data(n_rows: int = 120):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    y = 1.2 * x + rng.normal(0, 5, n_rows)
+    post_start = int(n_rows * 0.8)
+    y[post_start:] += 30
+    data = pd.DataFrame({"y": y, "X": x}, index=index)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+def test_fits_are_read_back_from_disk_without_pickle(tmp_path):
+    data, pre_dates, post_dates = synthetic_data()
+    first = cache.ImpactCache(cache_dir=str(tmp_path))
+    fitted = fitting.fit_impact(data, pre_dates, post_dates, impact_cache=first, backend="lean")
+
+    files = os.listdir(tmp_path)
+    assert files and all(name.endswith(".npz") for name in files)
+
+    # A new cache (like after a restart) only has the disk to go on
+    second = cache.ImpactCache(cache_dir=str(tmp_path))
+    back = second.get(fitted.cache_key)
+
+    assert back is not None
+    assert back.inferences.equals(fitted.inferences)
+    assert back.summary_data.equals(fitted.summary_data)
+    assert back.summary() == fitted.summary()
+
+    # The forecast state comes back too, so later uploads can still be extended
+    state, back_state = fitted.forecast_state, back.forecast_state
+    assert back_state is not None
+    for name, value in vars(state).items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(getattr(back_state, name), value)
+        else:
+            assert getattr(back_state, name) == value
+
+
+def test_pickles_and_unreadable_files_are_removed(tmp_path):
+    (tmp_path / "old.pkl").write_bytes(b"not read")
+    (tmp_path / "broken.npz").write_bytes(b"half written")
+    impact_cache = cache.ImpactCache(cache_dir=str(tmp_path))
+
+    assert impact_cache.get("broken") is None
+    assert not (tmp_path / "broken.npz").exists()
+
+    data, pre_dates, post_dates = synthetic_data()
+    fitting.fit_impact(data, pre_dates, post_dates, impact_cache=impact_cache, backend="lean")
+    assert not (tmp_path / "old.pkl").exists()
+
+
+def test_outcomes_round_trip_as_json():
+    outcome = {"date": pd.Timestamp("2021-03-01", tz="UTC"), "post_rows": 10, "abs_effect": 1.5, "error": ""}
+    back = cache.outcome_from_bytes(cache.outcome_to_bytes(outcome))
+    assert back == outcome
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import downsample
+
+
+def noisy_series(n_points: int = 10_000):
+    rng = np.random.default_rng(0)
+    x = pd.date_range("2020-01-01", periods=n_points, freq="H")
+    y = rng.normal(0, 1, n_points).cumsum()
+    # A spike that a chart should never lose
+    y[n_points // 3] = 500
+    return x, y
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 500, 2000])
+def test_lttb_keeps_first_and_last_and_exactly_n_out(n_out):
+    x, y = noisy_series()
+    kept = downsample.lttb_indices(x, y, n_out)
+
+    assert len(kept) == n_out
+    assert kept[0] == 0 and kept[-1] == len(y) - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+@pytest.mark.parametrize("n_buckets", [1, 10, 250])
+def test_minmax_keeps_first_last_and_every_spike(n_buckets):
+    x, y = noisy_series()
+    kept = downsample.minmax_indices(y, n_buckets)
+
+    assert kept[0] == 0 and kept[-1] == len(y) - 1
+    assert len(kept) <= 2 * n_buckets + 2
+    assert len(y) // 3 in kept
+    assert np.argmin(y) in kept
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("n_out", [9, 100, 2400])
+def test_shared_indices_stay_within_n_out(method, n_out):
+    x, y = noisy_series()
+    ys = [y, y + 10, y - 10]
+    kept = downsample.shared_indices(x, ys, n_out, method)
+
+    assert len(kept) <= n_out
+    assert kept[0] == 0 and kept[-1] == len(y) - 1
+
+
+def test_short_series_and_none_keep_everything():
+    x, y = noisy_series(100)
+    assert len(downsample.shared_indices(x, [y], 1000, "lttb")) == 100
+    assert len(downsample.shared_indices(x, [y], 10, "none")) == 100
+
+
+def test_gaps_are_never_picked_as_extremes():
+    y = np.array([1.0, np.nan, 5.0, np.nan, -3.0, 2.0, 0.0, np.nan, 1.0, 4.0])
+    kept = downsample.minmax_indices(y, 2)
+    assert not np.isnan(y[kept[1:-1]]).any()
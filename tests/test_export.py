@@ -0,0 +1,34 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import export
+
+
+def frame(n_rows: int = 1000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="H", name="time")
+    return pd.DataFrame({"y": rng.normal(100, 10, n_rows), "X": rng.integers(0, 50, n_rows)}, index=index)
+
+
+@pytest.mark.parametrize("index", [False, True])
+def test_csv_matches_pandas(index):
+    df = frame()
+    expected = df.to_csv(index=index).encode("utf-8")
+
+    assert export.to_bytes(df, "csv", index=index) == expected
+    assert gzip.decompress(export.to_bytes(df, "csv.gz", index=index)) == expected
+
+
+def test_parquet_round_trips():
+    df = frame()
+    back = pd.read_parquet(io.BytesIO(export.to_bytes(df, "parquet", index=True)))
+    pd.testing.assert_frame_equal(back, df, check_freq=False)
+
+
+def test_unknown_formats_are_refused():
+    with pytest.raises(ValueError):
+        export.to_bytes(frame(), "xlsx")
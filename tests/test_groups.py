@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import cache, groups, result_store, validation
+
+
+def weekly_long_data(n_weeks: int = 30) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2021-01-04", periods=n_weeks, freq="W-MON").strftime("%Y-%m-%d")
+
+    frames = []
+    for group in ["a", "b", "c", "d"]:
+        frames.append(pd.DataFrame({
+            "date": dates,
+            "market": group,
+            "sessions": rng.normal(1000, 50, n_weeks).round(),
+            "spend": rng.normal(200, 10, n_weeks).round(2),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+
+    # c is missing a week, which neither set of checks minds
+    df = df.drop(df[(df["market"] == "c") & (df["date"] == dates[10])].index)
+    # d has a blank regressor, which both should reject
+    df.loc[df[(df["market"] == "d") & (df["date"] == dates[5])].index, "spend"] = np.nan
+
+    return df.reset_index(drop=True)
+
+
+def single_series_error(frame: pd.DataFrame) -> str:
+    try:
+        validation.convert_and_check_data(
+            df = frame.drop(columns=["market"]).reset_index(drop=True),
+            date_col = "date",
+            target_col = "sessions",
+            regressor_cols = ["spend"])
+    except ValueError as e:
+        return str(e)
+    return ""
+
+
+@pytest.fixture(scope="module")
+def checks():
+    df = weekly_long_data()
+    checks = groups.check_groups(
+        df,
+        group_col = "market",
+        date_col = "date",
+        target_col = "sessions",
+        regressor_cols = ["spend"],
+        intervention = pd.Timestamp("2021-05-03", tz="UTC"))
+    return df, checks.set_index("group")
+
+
+def test_weekly_groups_pass_like_a_single_weekly_series(checks):
+    df, checks = checks
+
+    for group, frame in df.groupby("market"):
+        single_passes = single_series_error(frame) == ""
+        group_passes = checks.loc[group, "error"] == ""
+        assert single_passes == group_passes, group
+
+    assert list(checks.index[checks["error"] == ""]) == ["a", "b", "c"]
+
+
+def test_gaps_are_counted_against_each_groups_own_step(checks):
+    _, checks = checks
+
+    assert checks.loc["a", "missing_dates"] == 0
+    assert checks.loc["c", "missing_dates"] == 1
+    assert checks.loc["c", "error"] == ""
+
+
+def test_group_fits_stay_out_of_the_shared_caches(tmp_path, monkeypatch):
+    main_cache = cache.ImpactCache(cache_dir=str(tmp_path / "fits"))
+    store = result_store.SQLiteResultStore(str(tmp_path / "store.db"))
+    monkeypatch.setattr(cache, "impact_cache", main_cache)
+    monkeypatch.setattr(result_store, "result_store", store)
+
+    df = weekly_long_data()
+    outcome, inferences = groups.fit_group(
+        "a",
+        df[df["market"] == "a"].drop(columns=["market"]),
+        date_col = "date",
+        target_col = "sessions",
+        regressor_cols = ["spend"],
+        intervention = pd.Timestamp("2021-05-03", tz="UTC"),
+        backend = "lean")
+
+    assert outcome["error"] == ""
+    assert inferences is not None and (inferences["group"] == "a").all()
+    assert os.listdir(tmp_path / "fits") == []
+    with store._connect() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import cache, fitting, incremental
+
+
+# Only depend on the fitted model and each row's regressors, so an
+# extension should match a refit to rounding error
+DETERMINISTIC_COLUMNS = ["preds", "preds_lower", "preds_upper", "post_cum_y", "post_cum_pred", "point_effects"]
+
+HELD_BACK = 10
+
+
+def synthetic_data(n_rows: int = 150):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    y = 1.2 * x + rng.normal(0, 5, n_rows)
+    post_start = int(n_rows * 0.7)
+    y[post_start:] += 20
+    data = pd.DataFrame({"y": y, "X": x}, index=index)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+def fit(data, pre_dates, post_dates, backend):
+    return fitting.fit_impact(
+        data, pre_dates, [post_dates[0], data.index[-1]],
+        impact_cache = cache.ImpactCache(cache_dir=None),
+        backend = backend)
+
+
+@pytest.fixture(scope="module", params=["causalimpact", "lean"])
+def fits(request):
+    backend = request.param
+    data, pre_dates, post_dates = synthetic_data()
+    first = fit(data.iloc[:-HELD_BACK], pre_dates, post_dates, backend)
+    refit = fit(data, pre_dates, post_dates, backend)
+    return backend, data, post_dates, first, refit
+
+
+def test_extended_fit_matches_a_full_refit(fits):
+    backend, data, post_dates, first, refit = fits
+    assert incremental.can_extend(first, data, post_dates)
+
+    extended = incremental.extend_result(first, data, cache_key="extended")
+
+    assert extended.data.equals(refit.data)
+    assert extended.post_period == refit.post_period
+    for col in DETERMINISTIC_COLUMNS:
+        np.testing.assert_allclose(
+            extended.inferences[col].to_numpy(), refit.inferences[col].to_numpy(),
+            rtol=1e-6, atol=1e-6, err_msg=col)
+
+    summary, refit_summary = extended.summary_data, refit.summary_data
+    np.testing.assert_allclose(
+        summary.loc[["actual", "predicted"]].to_numpy(),
+        refit_summary.loc[["actual", "predicted"]].to_numpy(),
+        rtol=1e-6)
+
+    # Cumulative bounds are exact for lean fits and simulated for the library's
+    width = refit_summary.loc["predicted_upper", "cumulative"] - refit_summary.loc["predicted_lower", "cumulative"]
+    tolerance = 1e-6 * width if backend == "lean" else 0.1 * width
+    for row in ["predicted_lower", "predicted_upper"]:
+        assert abs(summary.loc[row, "cumulative"] - refit_summary.loc[row, "cumulative"]) <= tolerance
+
+
+def test_extending_is_reproducible(fits):
+    _, data, _, first, _ = fits
+    once = incremental.extend_result(first, data, cache_key="same")
+    again = incremental.extend_result(first, data, cache_key="same")
+
+    assert once.inferences.equals(again.inferences)
+    assert once.summary_data.equals(again.summary_data)
+    assert once.p_value == again.p_value
+
+
+def test_changed_history_is_not_extended(fits):
+    _, data, post_dates, first, _ = fits
+    changed = data.copy()
+    changed.iloc[3, 0] += 1
+    assert not incremental.can_extend(first, changed, post_dates)
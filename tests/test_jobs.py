@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import backends, cache, jobs
+
+
+def synthetic_data(n_rows: int = 80):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    y = 1.2 * x + rng.normal(0, 5, n_rows)
+    post_start = int(n_rows * 0.8)
+    data = pd.DataFrame({"y": y, "X": x}, index=index)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+def wait_for(manager: jobs.JobManager, key: str, timeout: float = 60) -> jobs.Job:
+    start = time.time()
+    while not manager.get(key).is_finished:
+        assert time.time() - start < timeout
+        time.sleep(0.05)
+    return manager.get(key)
+
+
+def test_a_precomputed_key_isnt_hashed_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "impact_cache", cache.ImpactCache(cache_dir=str(tmp_path)))
+    data, pre_dates, post_dates = synthetic_data()
+    key = jobs.job_id(data, pre_dates, post_dates, backend="lean")
+
+    real_fingerprint = cache.fingerprint
+
+    def fingerprint(data_for_ci, *args, **kwargs):
+        # Hashing just the pre-period (for incremental updates) is fine
+        assert len(data_for_ci) < len(data), "hashed all the data again"
+        return real_fingerprint(data_for_ci, *args, **kwargs)
+    monkeypatch.setattr(cache, "fingerprint", fingerprint)
+
+    manager = jobs.JobManager(workers=1)
+    assert manager.submit(data, pre_dates, post_dates, backend="lean", key=key) == key
+
+    job = wait_for(manager, key)
+    assert job.status == jobs.DONE, job.error
+    assert job.result.cache_key == key
+
+
+def test_cancelling_a_fit_without_progress_stops_after_the_fit(tmp_path, monkeypatch):
+    impact_cache = cache.ImpactCache(cache_dir=str(tmp_path))
+    monkeypatch.setattr(cache, "impact_cache", impact_cache)
+
+    started, release = threading.Event(), threading.Event()
+    real_fit = backends.fit
+
+    def slow_fit(*args, **kwargs):
+        started.set()
+        release.wait(10)
+        return real_fit(*args, **kwargs)
+    monkeypatch.setattr(backends, "fit", slow_fit)
+
+    data, pre_dates, post_dates = synthetic_data()
+    manager = jobs.JobManager(workers=1)
+    key = manager.submit(data, pre_dates, post_dates, backend="lean", watcher="me")
+    assert started.wait(10)
+
+    manager.cancel(key, watcher="me")
+    release.set()
+
+    assert wait_for(manager, key).status == jobs.CANCELLED
+    # Stopped before keeping the result
+    assert impact_cache.get(key) is None
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,113 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import backends, result
+from core.result import ImpactResult
+
+
+def synthetic_data(n_rows: int = 80):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="D", tz="Europe/London", name="time")
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    y = 1.2 * x + rng.normal(0, 5, n_rows)
+    post_start = int(n_rows * 0.8)
+    y[post_start:] += 30
+    data = pd.DataFrame({"y": y, "X": x}, index=index)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+@pytest.fixture(scope="module", params=["lean", "causalimpact"])
+def fitted(request):
+    data, pre_dates, post_dates = synthetic_data()
+    np.random.seed(0)
+    ci = backends.fit(request.param, data, pre_dates, post_dates, {})
+    return ImpactResult.from_fit(ci, cache_key="fit", backend=request.param)
+
+
+def round_trip(fitted: ImpactResult, serialiser: str) -> ImpactResult:
+    if serialiser == "arrow":
+        return ImpactResult.from_arrow(fitted.to_arrow())
+    return ImpactResult.from_npz(fitted.to_npz())
+
+
+@pytest.mark.parametrize("serialiser", ["arrow", "npz"])
+def test_results_round_trip(fitted, serialiser):
+    back = round_trip(fitted, serialiser)
+
+    assert back is not None
+    pd.testing.assert_frame_equal(back.data, fitted.data, check_freq=False)
+    pd.testing.assert_frame_equal(back.inferences, fitted.inferences, check_freq=False)
+    pd.testing.assert_frame_equal(back.summary_data, fitted.summary_data)
+    assert back.index.tz is not None and str(back.index.tz) == str(fitted.index.tz)
+    assert back.index.name == fitted.index.name
+    assert back.pre_period == [pd.Timestamp(d) for d in fitted.pre_period]
+    assert back.post_period == [pd.Timestamp(d) for d in fitted.post_period]
+    assert back.post_data.equals(fitted.post_data)
+
+    for attribute in ["alpha", "p_value", "loglikelihood_burn", "cache_key", "backend", "fit_info"]:
+        assert getattr(back, attribute) == getattr(fitted, attribute), attribute
+    assert back.summary() == fitted.summary()
+    assert back.summary("report") == fitted.summary("report")
+
+
+@pytest.mark.parametrize("serialiser", ["arrow", "npz"])
+def test_read_back_arrays_are_read_only(fitted, serialiser):
+    back = round_trip(fitted, serialiser)
+
+    with pytest.raises(ValueError):
+        back.inferences.to_numpy()[0, 0] = 1.0
+    with pytest.raises(ValueError):
+        back.data.to_numpy()[0, 0] = 1.0
+
+
+def test_forecast_state_is_only_kept_in_npz_when_asked(fitted):
+    state = fitted.forecast_state
+    assert state is not None
+
+    assert ImpactResult.from_arrow(fitted.to_arrow()).forecast_state is None
+    assert ImpactResult.from_npz(fitted.to_npz()).forecast_state is None
+
+    back_state = ImpactResult.from_npz(fitted.to_npz(include_forecast_state=True)).forecast_state
+    assert back_state is not None
+    for name, value in vars(state).items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(getattr(back_state, name), value)
+        else:
+            assert getattr(back_state, name) == value, name
+
+
+def test_other_versions_are_ignored(fitted, monkeypatch):
+    arrow, npz = fitted.to_arrow(), fitted.to_npz()
+    monkeypatch.setattr(result, "FORMAT_VERSION", result.FORMAT_VERSION + 1)
+
+    assert ImpactResult.from_arrow(arrow) is None
+    assert ImpactResult.from_npz(npz) is None
+
+
+def test_npz_never_needs_pickle(fitted):
+    payload = fitted.to_npz(include_forecast_state=True)
+
+    # from_npz loads with allow_pickle=False, so this would raise if
+    # anything had been saved as an object array
+    with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+        header = json.loads(str(arrays["header"]))
+        assert all(arrays[name].dtype != object for name in arrays.files)
+    assert header["version"] == result.FORMAT_VERSION
+
+
+def test_summary_only_skips_the_forecast_state_and_report(fitted):
+    data, pre_dates, post_dates = synthetic_data()
+    np.random.seed(0)
+    ci = backends.fit(fitted.backend, data, pre_dates, post_dates, {})
+    summary_only = ImpactResult.from_fit(ci, cache_key="fit", backend=fitted.backend, summary_only=True)
+
+    assert summary_only.forecast_state is None
+    assert summary_only.summary_text == {}
+    pd.testing.assert_frame_equal(summary_only.summary_data, ci.summary_data)
+    assert summary_only.p_value == ci.p_value
+    # The report's still there if anything asks for it
+    assert summary_only.summary() == ci.summary()
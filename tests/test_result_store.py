@@ -0,0 +1,187 @@
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import backends, result_store
+from core.result import ImpactResult
+
+
+class Clock:
+    """
+    Stands in for the time module so expiry can be tested without waiting
+    """
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """
+    The Redis commands the store uses, over dicts. Like redis.Redis it
+    hands back bytes, and keys set with ex= vanish once they're that old.
+    """
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.values = {}
+        self.expires = {}
+        self.sorted_sets = {}
+        self.hashes = {}
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def get(self, name):
+        if name in self.expires and self.expires[name] <= self.clock.time():
+            self.delete(name)
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.values[name] = self._bytes(value)
+        self.expires.pop(name, None)
+        if ex is not None:
+            self.expires[name] = self.clock.time() + ex
+
+    def delete(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+            self.expires.pop(name, None)
+
+    def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update(
+            {self._bytes(member): float(score) for member, score in mapping.items()})
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.sorted_sets.get(name, {}).pop(self._bytes(member), None)
+
+    def _by_score(self, name) -> list:
+        return sorted(self.sorted_sets.get(name, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def zrange(self, name, start, end):
+        members = [member for member, _ in self._by_score(name)]
+        return members[start:] if end == -1 else members[start:end + 1]
+
+    def zrangebyscore(self, name, min, max):
+        return [member for member, score in self._by_score(name) if min <= score <= max]
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[self._bytes(key)] = self._bytes(value)
+
+    def hdel(self, name, *keys):
+        for key in keys:
+            self.hashes.get(name, {}).pop(self._bytes(key), None)
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_store, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_store(request, tmp_path, clock):
+    def make(ttl_seconds: int = 60, max_bytes: int = 10_000):
+        if request.param == "sqlite":
+            return result_store.SQLiteResultStore(str(tmp_path / "results.db"), ttl_seconds, max_bytes)
+        return result_store.RedisResultStore(FakeRedis(clock), ttl_seconds=ttl_seconds, max_bytes=max_bytes)
+    return make
+
+
+def synthetic_data(n_rows: int = 80):
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=n_rows, freq="D", tz="UTC", name="time")
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    y = 1.2 * x + rng.normal(0, 5, n_rows)
+    post_start = int(n_rows * 0.8)
+    y[post_start:] += 30
+    data = pd.DataFrame({"y": y, "X": x}, index=index)
+    return data, [index[0], index[post_start - 1]], [index[post_start], index[-1]]
+
+
+def test_results_round_trip(make_store):
+    data, pre_dates, post_dates = synthetic_data()
+    result = ImpactResult.from_fit(backends.fit("lean", data, pre_dates, post_dates, {}), cache_key="fit")
+    store = make_store(max_bytes=100 * 1024 * 1024)
+
+    assert store.get("fit") is None
+    store.put("fit", result)
+    back = store.get("fit")
+
+    assert back is not None
+    pd.testing.assert_frame_equal(back.inferences, result.inferences, check_freq=False)
+    pd.testing.assert_frame_equal(back.summary_data, result.summary_data)
+    assert back.p_value == result.p_value
+    assert back.summary() == result.summary()
+
+
+def test_entries_expire_after_the_ttl(make_store, clock):
+    store = make_store(ttl_seconds=60)
+    store.put_bytes("a", b"first")
+
+    clock.now += 59
+    assert store.get_bytes("a") == b"first"
+
+    clock.now += 2
+    assert store.get_bytes("a") is None
+
+
+def test_least_recently_used_are_evicted_over_max_bytes(make_store, clock):
+    store = make_store(max_bytes=250)
+
+    for key in ["a", "b"]:
+        store.put_bytes(key, key.encode() * 100)
+        clock.now += 1
+    # Reading a makes b the least recently used
+    assert store.get_bytes("a") is not None
+    clock.now += 1
+
+    store.put_bytes("c", b"c" * 100)
+
+    assert store.get_bytes("b") is None
+    assert store.get_bytes("a") == b"a" * 100
+    assert store.get_bytes("c") == b"c" * 100
+
+
+def test_redis_store_stops_tracking_expired_entries(clock):
+    client = FakeRedis(clock)
+    store = result_store.RedisResultStore(client, ttl_seconds=60, max_bytes=10_000)
+    store.put_bytes("a", b"a" * 10)
+
+    clock.now += 61
+    store.put_bytes("b", b"b" * 10)
+
+    assert client.zrange(store._last_used, 0, -1) == [b"b"]
+    assert list(client.hgetall(store._sizes)) == [b"b"]
+
+
+def test_open_store_reads_the_url(tmp_path):
+    assert result_store.open_store("") is None
+
+    path = tmp_path / "shared" / "results.db"
+    store = result_store.open_store(f"sqlite:///{path}")
+    assert isinstance(store, result_store.SQLiteResultStore)
+    assert store.path == str(path)
+    assert path.exists()
+
+    with pytest.raises(ValueError):
+        result_store.open_store("memcached://localhost:11211")
+
+
+@pytest.mark.parametrize("url", ["redis://localhost:6379/0", "rediss://localhost:6380/1", "unix:///tmp/redis.sock"])
+def test_open_store_redis_urls(url):
+    if importlib.util.find_spec("redis") is None:
+        # Without the package the app should say what to install
+        with pytest.raises(ValueError, match="redis"):
+            result_store.open_store(url)
+    else:
+        # from_url doesn't connect until the first command
+        assert isinstance(result_store.open_store(url), result_store.RedisResultStore)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core import cache, result_store, sweep
+
+
+def checked_data(n_rows: int = 60) -> pd.DataFrame:
+    rng = np.random.default_rng(2)
+    x = rng.normal(100, 10, n_rows).cumsum() / 10 + 500
+    return pd.DataFrame({
+        "time": pd.date_range("2022-01-01", periods=n_rows, freq="D", tz="UTC"),
+        "y": 1.1 * x + rng.normal(0, 3, n_rows),
+        "X": x,
+    })
+
+
+def test_scan_keeps_its_fits_out_of_the_shared_caches(tmp_path, monkeypatch):
+    main_cache = cache.ImpactCache(cache_dir=str(tmp_path / "fits"))
+    store = result_store.SQLiteResultStore(str(tmp_path / "store.db"))
+    scan_cache = cache.ImpactCache(
+        cache_dir=str(tmp_path / "sweep"),
+        dumps=cache.outcome_to_bytes, loads=cache.outcome_from_bytes, suffix=".json")
+    monkeypatch.setattr(cache, "impact_cache", main_cache)
+    monkeypatch.setattr(result_store, "result_store", store)
+    monkeypatch.setattr(sweep, "sweep_cache", scan_cache)
+
+    data = checked_data()
+    dates = list(data["time"].iloc[[40, 45, 50]])
+    results = sweep.sweep_dates(data, ["X"], dates, workers=1)
+
+    assert (results["error"] == "").all()
+    assert os.listdir(tmp_path / "fits") == []
+    with store._connect() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+    # Scanning again only reads back the results table
+    assert len(os.listdir(tmp_path / "sweep")) == len(dates)
+    progress = []
+    again = sweep.sweep_dates(data, ["X"], dates, workers=1, progress=lambda done, total: progress.append(done))
+    pd.testing.assert_frame_equal(again.drop(columns="fit_seconds"), results.drop(columns="fit_seconds"))
+    assert progress == [len(dates)]
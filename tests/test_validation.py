@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import validation
+
+
+REGRESSORS = ["x1", "x2"]
+
+
+def checked_shape(n_rows: int = 50) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "time": pd.date_range("2022-01-01", periods=n_rows, freq="D", tz="UTC"),
+        "y": rng.normal(100, 5, n_rows),
+        "x1": rng.normal(50, 2, n_rows),
+        "x2": rng.normal(20, 1, n_rows),
+    })
+
+
+def row_by_row_error(df: pd.DataFrame):
+    empties: list = []
+    try:
+        df.apply(lambda row: validation.check_for_data_blocks(
+            row = row,
+            target_column = "y",
+            date_column = "time",
+            list_of_empties = empties,
+            regressor_column_list = REGRESSORS), axis = 1)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def column_wise_error(df: pd.DataFrame):
+    try:
+        validation.check_data_blocks(
+            df = df,
+            target_column = "y",
+            date_column = "time",
+            regressor_column_list = REGRESSORS)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def _blank_date(df):
+    df.loc[20, "time"] = pd.NaT
+
+
+def _blank_regressor(df):
+    df.loc[30, "x2"] = np.nan
+    df.loc[35, "x1"] = np.nan
+
+
+def _empty_string_regressor(df):
+    df["x1"] = df["x1"].astype(str)
+    df.loc[10, "x1"] = ""
+
+
+def _blank_target_block(df):
+    df.loc[40:, "y"] = np.nan
+
+
+def _several_in_one_row(df):
+    df.loc[15, ["y", "x2"]] = np.nan
+    df.loc[15, "time"] = pd.NaT
+
+
+@pytest.mark.parametrize("break_data", [
+    _blank_date,
+    _blank_regressor,
+    _empty_string_regressor,
+    _blank_target_block,
+    _several_in_one_row,
+])
+def test_column_wise_checks_raise_the_same_error_as_row_by_row(break_data):
+    df = checked_shape()
+    break_data(df)
+
+    expected = row_by_row_error(df)
+    assert expected is not None
+    assert column_wise_error(df) == expected
+
+
+def test_clean_data_passes_both_checks():
+    df = checked_shape()
+    assert row_by_row_error(df) is None
+    assert column_wise_error(df) is None